@@ -0,0 +1,68 @@
+'''
+the grammar of example_math.py, built by a function so every test gets its own parsers.
+split is passed to its leftassoc() rules, scanners makes whitespace and integers
+take_while() terminals instead of regexes. with full=False the grammar doesnt have to
+reach the end of the input.
+'''
+import random
+from yapcl.combinators import regex, either, RecursionContainer, eof, take_while
+from yapcl.context import ignore
+
+
+def build(split=False, scanners=False, full=True):
+    if scanners:
+        whitespace = take_while(' \t\n', 1)
+        integer = take_while('0123456789', 1) == 'int'
+    else:
+        whitespace = regex(r'\s+')
+        integer = regex(r'\d+') == 'int'
+    float_val = regex(r'\d+\.\d+') == 'float'
+    id = regex('[a-zA-Z_]+[a-zA-Z_0-9]*') == 'id'
+
+    r = RecursionContainer()
+    value = either(float_val, integer, r.funccall, id, r.parenthesis)
+
+    with ignore(whitespace):
+        value = ('-' >> value == 'negate') | value
+        factor = value.leftassoc('*' >> value == 'mul', '/' >> value == 'div', split=split)
+        term = factor.leftassoc('+' >> factor == 'add', '-' >> factor == 'sub', split=split)
+        r.parenthesis = '(' >> term << ')'
+        paramlist = id.sepby(',') == 'paramlist'
+        funcdef = id << '(' >> paramlist << ')' << '=' >> term == 'funcdef'
+        arglist = term.sepby(',') == 'arglist'
+        r.funccall = id << '(' >> arglist << ')' == 'funccall'
+
+    if not full:
+        return either(funcdef, term)
+    return either(funcdef, term) << eof.error_message('unexpected token')
+
+
+def expressions(count, seed=0, broken=0.0, depth=4):
+    '''
+    count distinct expressions of the grammar, the given fraction of them cut short
+    so that they fail to parse
+    '''
+    rand = random.Random(seed)
+
+    def expression(depth):
+        choice = rand.random()
+        if depth == 0 or choice < 0.3:
+            return rand.choice([str(rand.randint(0, 999)), f'{rand.randint(0, 99)}.5', 'x', 'y'])
+        if choice < 0.5:
+            return f'({expression(depth - 1)})'
+        if choice < 0.6:
+            args = ', '.join(expression(depth - 1) for _ in range(rand.randint(1, 3)))
+            return f'f({args})'
+        operator = rand.choice(['+', '-', '*', '/'])
+        return f'{expression(depth - 1)} {operator} {expression(depth - 1)}'
+
+    found = []
+    seen = set()
+    while len(found) < count:
+        text = expression(depth)
+        if rand.random() < broken:
+            text = text[:rand.randint(1, len(text))] + rand.choice(['+', '(', ',', ')'])
+        if text not in seen:
+            seen.add(text)
+            found.append(text)
+    return found
@@ -0,0 +1,31 @@
+'''
+columns of parse_batch() on the fused regex against the ones of plain parses
+'''
+import pytest
+from yapcl.combinators import regex, either, seq, success
+from yapcl.context import ignore
+
+digits = regex(r'\d+')
+number = either(regex(r'\d+\.\d+') == 'float', digits == 'int')
+with ignore(regex(r'\s+')):
+    listing = '[' >> number.sepby(',') << ']' == 'list'
+stamp = seq(digits, '-', digits, 'T', digits, either(seq(':', digits), success(None))) == 'stamp'
+words = regex('[a-z]+').many(1)
+
+STRINGS = ['2024-01T10', '2024-01T10:11', '12.5', '7', '[1, 2 ,3.5]', '[ ]', 'abc', 'x-1', '', '[1,', ' 5'] * 3
+
+
+@pytest.mark.parametrize('parser', [number, listing, stamp, words, either(stamp, listing, digits)])
+@pytest.mark.parametrize('full', [False, True])
+def test_fused_columns_match_parses(parser, full):
+    fast = parser.parse_batch(STRINGS, full=full)
+    slow = parser.parse_batch(STRINGS, values=True, full=full)
+    assert fast.values is None and slow.values is not None
+    assert fast.ends == slow.ends
+    assert fast.tags == slow.tags
+
+
+def test_tags_can_be_required():
+    parser = either(number, listing, words)
+    assert parser.parse_batch(STRINGS).tags is None
+    assert parser.parse_batch(STRINGS, tags=True).tags == parser.parse_batch(STRINGS, values=True).tags
@@ -0,0 +1,77 @@
+'''
+cache eviction policies and per rule statistics
+'''
+import pytest
+from yapcl.cache import cache_size, policies, LRUCache, LFUCache, ByteBoundedCache
+from yapcl.errors import ParserError
+from . grammar import build, expressions
+
+INPUTS = expressions(150, seed=9, broken=0.2)
+
+
+def parse_all(parser):
+    results = []
+    for text in INPUTS:
+        try:
+            results.append(parser.parse(text))
+        except ParserError as e:
+            results.append(('error', str(e)))
+    return results
+
+
+@pytest.mark.parametrize('policy', sorted(policies))
+def test_policies_dont_change_results(policy):
+    expected = parse_all(build())
+    with cache_size(1 << 14 if policy == 'bytes' else 16, policy=policy) as cache:
+        parser = build()
+    assert parse_all(parser) == expected
+
+    stats = cache.stats
+    assert stats['hits'] > 0 and stats['misses'] > 0
+    if policy == 'all':
+        assert stats['evictions'] == 0
+
+
+@pytest.mark.parametrize('policy', ['lru', 'lfu', 'random'])
+def test_rule_stats_add_up(policy):
+    with cache_size(8, policy=policy, measure_bytes=True) as cache:
+        parser = build()
+    parse_all(parser)
+
+    rules = cache.rules
+    assert rules
+    for name in ('hits', 'misses', 'evictions'):
+        assert sum(rule[name] for rule in rules.values()) == cache.stats[name]
+    for rule in rules.values():
+        assert 0 <= rule['entries'] <= 8
+        assert 0.0 <= rule['hit_rate'] <= 1.0
+    assert any(rule['bytes'] > 0 for rule in rules.values())
+
+
+def fill(cache, keys):
+    for key in keys:
+        if key in cache.mapping:
+            cache.hit(key)
+        else:
+            cache.miss(key, key, False)
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(2)
+    fill(cache, [(0, 1), (1, 1), (0, 1), (2, 1)])
+    assert set(cache.mapping) == {(0, 1), (2, 1)}
+    assert cache.evictions == 1
+
+
+def test_lfu_evicts_least_frequently_used():
+    cache = LFUCache(2)
+    fill(cache, [(0, 1), (0, 1), (1, 1), (2, 1), (3, 1)])
+    assert (0, 1) in cache.mapping
+    assert cache.evictions == 2
+
+
+def test_byte_bound():
+    cache = ByteBoundedCache(2000, measure_bytes=True)
+    fill(cache, [(i, 1) for i in range(100)])
+    assert cache.nbytes <= 2000
+    assert 1 < len(cache.mapping) < 100
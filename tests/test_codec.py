@@ -0,0 +1,54 @@
+'''
+encode() and decode() round trips
+'''
+import pickle
+import pytest
+from yapcl.codec import encode, decode, LazyTree
+from yapcl.combinators import Discarded
+from . grammar import build, expressions
+
+
+@pytest.fixture(scope='module')
+def trees():
+    parser = build()
+    return [(parser.parse(text), text) for text in expressions(100, seed=8)]
+
+
+def test_round_trip(trees):
+    for data, text in trees:
+        assert decode(encode(data, text), text) == data
+        # without the source, results are written as strings
+        assert decode(encode(data)) == data
+
+
+def test_lazy_tree(trees):
+    for data, text in trees:
+        tree = LazyTree(encode(data, text), text)
+        assert tree.materialize() == data
+        assert tree.root.materialize() == data
+        assert tree.root[2] == data[2]
+
+
+def test_smaller_than_pickle(trees):
+    encoded = sum(len(encode(data, text)) for data, text in trees)
+    pickled = sum(len(pickle.dumps(data)) for data, _ in trees)
+    assert encoded < pickled
+
+
+@pytest.mark.parametrize('value', [
+    ([1, -2, 2 ** 70, 1.5, True, False, None, Discarded, 'é\ud800', ()], None, 4),
+    ((('a', 'x', 1), {'k': 1}, (1, 2, 3)), 'tag', 0),
+])
+def test_other_values(value):
+    assert decode(encode(value, 'abcd'), 'abcd') == value
+    assert decode(encode(value)) == value
+
+
+def test_deeper_than_the_recursion_limit():
+    parser = build()
+    text = ' + '.join(['1'] * 5000)
+    data = parser.parse_vm(text)
+    encoded = encode(data, text)
+    # == on the trees would recurse as well
+    assert encode(decode(encoded, text), text) == encoded
+    assert decode(encoded, text)[2] == len(text)
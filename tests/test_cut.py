@@ -0,0 +1,73 @@
+'''
+cut inside either(), many() and the predicates, with the combinators and the vm
+'''
+import pytest
+from yapcl.combinators import regex, seq, cut, either, followed_by, not_followed_by, lookahead
+from yapcl.errors import ParserError, CutError
+from yapcl.recognize import recognizer, predicate
+
+number = regex(r'\d+')
+# after '(' the group is committed, a missing ')' doesnt let either() try the others
+group = seq('(', cut, number, ')')
+
+
+def outcome(parse, text):
+    try:
+        return repr(parse(text))
+    except ParserError as e:
+        return (type(e).__name__, e.index)
+
+
+def both(parser, text):
+    result = outcome(parser.parse, text)
+    assert outcome(parser.parse_vm, text) == result
+    return result
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('(1)', None),
+    ('7', None),
+    ('(x', ('CutError', 1)),
+    ('(1', ('CutError', 2)),
+])
+def test_cut_in_either(text, expected):
+    parser = either(group, number, regex(r'\(.*'))
+    result = both(parser, text)
+    if expected is not None:
+        assert result == expected
+
+
+def test_cut_in_many():
+    parser = group.many()
+    assert parser.parse_vm('(1)(2)')[2] == parser.parse('(1)(2)')[2] == 6
+    assert both(parser, '(1)(2') == ('CutError', 5)
+    # nothing was committed to, the repetition just stops
+    rest = parser + regex('.*')
+    assert both(rest, '(1)x') == repr(rest.parse('(1)x'))
+    assert rest.parse('(1)x')[2] == 4
+
+
+@pytest.mark.parametrize('make', [followed_by, not_followed_by])
+@pytest.mark.parametrize('text', ['(1)', '(x', '(1', '1', ''])
+def test_cut_in_predicates(make, text):
+    parser = make(group) + regex('.*')
+    result = both(parser, text)
+    assert not isinstance(result, tuple) or result[0] == 'ParserError'
+
+
+@pytest.mark.parametrize('text', ['a(1)', 'a(x', 'a(1', 'a'])
+def test_cut_in_lookahead(text):
+    parser = lookahead('a', group) + regex('.*')
+    result = both(parser, text)
+    assert not isinstance(result, tuple) or result[0] == 'ParserError'
+
+
+def test_recognizer_boundaries():
+    # the bare recognizer lets the CutError out, the predicates dont
+    with pytest.raises(CutError):
+        recognizer(group)('(x', 0)
+    assert predicate(group)('(x', 0) == -1
+    assert predicate(group)('(1)', 0) == 3
+    assert recognizer(followed_by(group))('(x', 0) == -1
+    assert recognizer(not_followed_by(group))('(x', 0) == 0
+    assert recognizer(lookahead('a', group))('a(x', 0) == -1
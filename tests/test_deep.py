@@ -0,0 +1,71 @@
+'''
+trees nested deeper than the recursion limit: parse_vm() and the tree helpers
+'''
+import sys
+import pytest
+from yapcl.combinators import _join
+from yapcl.debug import ANSI, pretty_print, deep_sizeof
+from . grammar import build, expressions
+
+
+def recursive_pretty_print(data, indent, lines):
+    # what pretty_print did before it was made iterative
+    green, cyan, reset = ANSI.green, ANSI.cyan, ANSI.reset
+    if isinstance(data, list):
+        for item in data:
+            recursive_pretty_print(item, indent + '│   ', lines)
+        lines.append(indent + '└─────')
+    elif isinstance(data, tuple) and len(data) == 3:
+        result, tag, index = data
+        head = ''.join((indent, green, repr(tag), ' [', cyan, repr(index), green, ']:'))
+        if isinstance(result, list):
+            lines.append(head + reset)
+            recursive_pretty_print(result, indent, lines)
+        elif isinstance(result, tuple) and len(result) == 3:
+            lines.append(head + reset)
+            recursive_pretty_print(result, indent + '    ', lines)
+        else:
+            lines.append(''.join((head, cyan, repr(result), reset)))
+    else:
+        lines.append(''.join((indent, cyan, repr(data), reset)))
+
+
+def printed(data):
+    lines = []
+    pretty_print(data, print_fn=lines.append)
+    return lines
+
+
+def test_pretty_print_output():
+    parser = build()
+    for text in expressions(50, seed=10):
+        data = parser.parse(text)
+        expected = []
+        recursive_pretty_print(data, '', expected)
+        assert printed(data) == expected
+
+
+@pytest.fixture(scope='module')
+def deep():
+    depth = sys.getrecursionlimit() * 2
+    text = 'f(' * depth + '1' + ')' * depth
+    return build().parse_vm(text), depth
+
+
+def test_parse_vm_nesting(deep):
+    data, depth = deep
+    for _ in range(depth):
+        assert data[1] == 'funccall'
+        name, arglist = data[0]
+        assert name[0] == 'f'
+        data, = arglist[0]
+    assert data == ('1', 'int', 2 * depth + 1)
+
+
+def test_helpers_on_deep_trees(deep):
+    data, depth = deep
+    assert _join(data) == 'f' * depth + '1'
+    lines = printed(data)
+    # per level: funccall, id, arglist, the end of both lists
+    assert len(lines) == 5 * depth + 1
+    assert deep_sizeof(data) > depth * sys.getsizeof([])
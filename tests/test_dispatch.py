@@ -0,0 +1,66 @@
+'''
+EitherProfile: profile guided dispatch for either()
+'''
+import pytest
+from yapcl.combinators import either
+from yapcl.dispatch import EitherProfile
+from yapcl.errors import ParserError
+from . grammar import build, expressions
+
+TRAINING = expressions(100, seed=17)
+INPUTS = expressions(200, seed=18, broken=0.3)
+
+
+def outcome(parser, text):
+    try:
+        return parser.parse(text)
+    except ParserError as e:
+        return ('error', type(e).__name__, e.index, str(e))
+
+
+def trained(parser):
+    profile = EitherProfile(parser)
+    with profile.training():
+        for text in TRAINING:
+            outcome(parser, text)
+    return profile
+
+
+@pytest.mark.parametrize('split', [False, True])
+def test_same_results_and_errors(split):
+    expected = [outcome(build(split=split), text) for text in INPUTS]
+    parser = build(split=split)
+    profile = trained(parser)
+    assert [outcome(parser, text) for text in INPUTS] == expected
+
+    profile.apply()
+    assert any(table for table in profile.tables())
+    assert [outcome(parser, text) for text in INPUTS] == expected
+
+    profile.remove()
+    assert [outcome(parser, text) for text in INPUTS] == expected
+
+
+def test_save_and_load(tmp_path):
+    parser = build()
+    profile = trained(parser)
+    path = tmp_path / 'profile.json'
+    profile.save(path)
+
+    other = build()
+    loaded = EitherProfile.load(path, other)
+    assert loaded.wins == profile.wins
+    assert loaded.tables() == profile.tables()
+    loaded.apply()
+    assert [outcome(other, text) for text in INPUTS] == [outcome(build(), text) for text in INPUTS]
+
+
+def test_other_grammar():
+    profile = trained(build())
+    with pytest.raises(ValueError):
+        EitherProfile.from_dict(profile.to_dict(), either('x', build()))
+
+
+def test_min_count():
+    profile = trained(build())
+    assert sum(map(len, filter(None, profile.tables(min_count=10 ** 6)))) == 0
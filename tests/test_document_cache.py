@@ -0,0 +1,91 @@
+'''
+DocumentCache, whole parse results shared between calls
+'''
+import gc
+from yapcl.cache import DocumentCache
+from yapcl.errors import ParserError
+from . grammar import build, expressions
+
+INPUTS = expressions(80, seed=15, broken=0.3)
+
+
+def outcome(parser, text, cache=None, index=0):
+    try:
+        return parser.parse(text, index, cache=cache)
+    except ParserError as e:
+        return (type(e).__name__, e.index, str(e))
+
+
+def test_same_results_as_parsing():
+    parser = build()
+    cache = DocumentCache()
+    expected = [outcome(parser, text) for text in INPUTS]
+    for _ in range(2):
+        # copies, the key is the content of the string, not the object
+        assert [outcome(parser, ''.join(list(text)), cache) for text in INPUTS] == expected
+    assert cache.stats['hits'] == cache.stats['misses'] == len(INPUTS)
+
+
+def test_keyed_by_parser_and_index():
+    first, second = build(), build()
+    cache = DocumentCache()
+    text = '1 + 2'
+    outcome(first, text, cache)
+    outcome(second, text, cache)
+    outcome(first, text, cache, index=1)
+    assert cache.stats['misses'] == 3
+    assert outcome(first, text, cache, index=4) == outcome(first, text, index=4)
+
+
+def test_hits_skip_the_parse():
+    calls = []
+    parser = build().map(lambda result: calls.append(result) or result)
+    cache = DocumentCache()
+    for _ in range(3):
+        parser.parse('f(1, 2)', cache=cache)
+    assert len(calls) == 1
+
+
+def test_failure_hits_raise_new_errors():
+    parser = build()
+    cache = DocumentCache()
+    errors = []
+    for _ in range(2):
+        try:
+            parser.parse('1 +', cache=cache)
+        except ParserError as e:
+            errors.append(e)
+    assert errors[0] is not errors[1]
+    assert (errors[0].expected, errors[0].index, errors[0].line) == (errors[1].expected, errors[1].index, errors[1].line)
+
+
+def test_bounds():
+    parser = build()
+    by_entries = DocumentCache(max_entries=10)
+    by_bytes = DocumentCache(max_bytes=20000)
+    for text in INPUTS:
+        outcome(parser, text, by_entries)
+        outcome(parser, text, by_bytes)
+    assert len(by_entries) == 10 and by_entries.stats['evictions'] == len(INPUTS) - 10
+    assert 0 < by_bytes.stats['bytes'] <= 20000 and by_bytes.stats['evictions'] > 0
+
+
+def test_copies():
+    parser = build()
+    cache = DocumentCache(copy=True)
+    first = parser.parse('f(1, 2)', cache=cache)
+    first[0][1][0].append('changed')
+    assert parser.parse('f(1, 2)', cache=cache) == parser.parse('f(1, 2)')
+
+
+def test_collected_parser():
+    cache = DocumentCache()
+    parser = build()
+    outcome(parser, '1 + 2', cache)
+    del parser
+    gc.collect()
+    # a new parser reusing the id doesnt get the old entry
+    for _ in range(20):
+        parser = build()
+        outcome(parser, '1 + 2', cache)
+    assert cache.stats['hits'] == 0
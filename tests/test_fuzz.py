@@ -0,0 +1,85 @@
+'''
+the grammar walking input generator and the scaling benchmark
+'''
+import random
+import re
+import pytest
+from yapcl.combinators import take_while, seq
+from yapcl.errors import ParserError
+from yapcl.fuzz import InputGenerator, sample_regex, mutate, scaling
+from . grammar import build
+
+
+@pytest.fixture(scope='module')
+def parser():
+    return build()
+
+
+def accepts(parser, text):
+    try:
+        return parser.parse(text)[2] == len(text)
+    except ParserError:
+        return False
+
+
+def test_generated_inputs_parse(parser):
+    generator = InputGenerator(parser, seed=1, max_length=300)
+    texts = [generator.generate() for _ in range(100)]
+    assert sum(accepts(parser, text) for text in texts) >= 90
+    assert len(set(texts)) > 50
+
+
+def test_seeded(parser):
+    first = [InputGenerator(parser, seed=5, max_length=300).generate() for _ in range(2)]
+    assert first[0] == first[1]
+
+
+def test_valid_and_invalid(parser):
+    generator = InputGenerator(parser, seed=2, max_length=300)
+    for _ in range(20):
+        assert accepts(parser, generator.valid())
+        assert not accepts(parser, generator.invalid())
+
+
+@pytest.mark.parametrize('length', [100, 1000, 5000])
+def test_length(parser, length):
+    text = InputGenerator(parser, seed=3).valid(length)
+    assert length <= len(text) < 3 * length
+
+
+def test_depth(parser):
+    shallow = InputGenerator(parser, seed=4, breadth=0, depth=2, deepen=1.0).generate()
+    deep = InputGenerator(parser, seed=4, breadth=0, depth=30, deepen=1.0).generate()
+    assert deep.count('(') > shallow.count('(')
+    assert accepts(parser, deep)
+
+
+@pytest.mark.parametrize('pattern', [r'\d+\.\d+', '[a-zA-Z_]+[a-zA-Z_0-9]*', r'(ab|c){2,4}x?', r'[^a-y]\w\s'])
+def test_sample_regex(pattern):
+    compiled = re.compile(pattern)
+    rand = random.Random(0)
+    for _ in range(50):
+        assert compiled.fullmatch(sample_regex(compiled, rand))
+
+
+def test_predicate_terminals():
+    word = seq(take_while(str.isupper, 1), take_while('xyz', 2, 4))
+    generator = InputGenerator(word, seed=6)
+    for _ in range(20):
+        assert accepts(word, generator.generate())
+
+
+def test_mutate(parser):
+    rand = random.Random(7)
+    texts = {mutate('f(1, 2) + 3', rand) for _ in range(50)}
+    assert len(texts) > 20
+    assert any(not accepts(parser, text) for text in texts)
+    assert mutate('', rand)
+
+
+def test_scaling(parser):
+    rows = scaling(parser, sizes=(200, 2000), depths=(4, 16), repeat=1)
+    assert [row['depth'] for row in rows] == [None, None, 4, 16]
+    assert rows[1]['chars'] > rows[0]['chars']
+    assert all(row['error'] is None and row['seconds'] > 0 for row in rows)
+    assert rows[1]['exponent'] is not None
@@ -0,0 +1,68 @@
+'''
+lazy() blocks and Deferred.force()
+'''
+import pytest
+from yapcl.combinators import regex, seq, lazy, Deferred
+from yapcl.errors import ParserError
+from . grammar import build, expressions
+
+
+def document(expression):
+    name = regex('[a-z]+')
+    return seq(name, '=', lazy(expression), ';').many()
+
+
+@pytest.fixture(scope='module')
+def text():
+    return ''.join(f'v={"(" + e + ")"};' for e in expressions(30, seed=16))
+
+
+def test_force_matches_the_parser(text):
+    expression = build(full=False)
+    items = document(expression).parse(text)[0]
+    assert len(items) == 30
+    for parts, _, _ in items:
+        deferred = parts[2][0]
+        assert isinstance(deferred, Deferred) and not deferred.forced
+        assert text[deferred.end] == ';'
+        assert deferred.force() == expression.parse(text, deferred.start)
+        assert deferred.forced and deferred.force() is deferred.force()
+
+
+def test_nothing_parsed_until_forced(text):
+    calls = []
+    expression = build(full=False).map(lambda result: calls.append(result) or result)
+    items = document(expression).parse(text)[0]
+    assert not calls
+    items[3][0][2][0].force()
+    assert len(calls) == 1
+
+
+def test_bad_block_fails_when_forced():
+    items = document(build(full=False)).parse('a=(1 +);b=(2);')[0]
+    with pytest.raises(ParserError):
+        items[0][0][2][0].force()
+    assert items[1][0][2][0].force()[:2] == ('2', 'int')
+
+
+def test_parse_shorter_than_the_block():
+    parser = lazy(regex(r'\d+'), skip=regex(r'[\d+]+')) << ';'
+    deferred = parser.parse('1+2;')[0]
+    with pytest.raises(ParserError) as error:
+        deferred.force()
+    assert error.value.index == 1
+
+
+def test_actions():
+    class Values:
+        def on_int(self, result):
+            return int(result)
+
+        def on_add(self, result):
+            return result[0] + result[1]
+
+    expression = build(full=False)
+    parser = document(expression)
+    block = '(1 + 2 + 30)'
+    (_, _, deferred, _), = parser.parse(f'v={block};', actions=Values())
+    assert deferred.force() == 33
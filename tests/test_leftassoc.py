@@ -0,0 +1,42 @@
+'''
+leftassoc(split=True) against the plain leftassoc()
+'''
+import pytest
+from yapcl.combinators import regex, leftassoc
+from yapcl.context import ignore
+from yapcl.errors import ParserError
+from . grammar import build, expressions
+
+
+def outcome(parser, text):
+    try:
+        return parser.parse(text)
+    except ParserError as e:
+        return ('error', str(e))
+
+
+def test_split_math_grammar():
+    plain = build()
+    split = build(split=True)
+    for text in expressions(300, seed=3, broken=0.3):
+        assert outcome(split, text) == outcome(plain, text)
+
+
+@pytest.mark.parametrize('text', ['1* 2', '1 * 2/3', '1*2/3', '1 *2', '1/', '1*x'])
+def test_alternatives_built_outside_the_ignore(text):
+    number = regex(r'\d+') == 'n'
+    alternatives = ['*' >> number == 'mul', '/' >> number == 'div']
+    with ignore(regex(' +')):
+        plain = number.leftassoc(*alternatives)
+        split = number.leftassoc(*alternatives, split=True)
+    assert outcome(split, text) == outcome(plain, text)
+
+
+def test_split_with_other_alternatives():
+    number = regex(r'\d+') == 'n'
+    with ignore(regex(r'\s*')):
+        operations = ['+' >> number == 'add', regex('[a-z]+') == 'word', '++' >> number == 'inc']
+        plain = leftassoc(number, operations)
+        split = leftassoc(number, operations, split=True)
+    for text in ['1 + 2 ab ++3', '1++2', '1 +', '3 x + 4']:
+        assert outcome(split, text) == outcome(plain, text)
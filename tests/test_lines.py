@@ -0,0 +1,46 @@
+'''
+LineIndex, and the line and column of parse errors
+'''
+import pytest
+from yapcl.errors import ParserError
+from yapcl.lines import LineIndex
+from . grammar import build, expressions
+
+
+def naive_linecol(string, index):
+    before = string[:index]
+    return before.count('\n') + 1, index - (before.rfind('\n') + 1) + 1
+
+
+@pytest.mark.parametrize('text', ['', 'a', '\n', 'ab\ncd\n', '\n\nx\n\ny', 'é\n日本\n😀'])
+def test_positions(text):
+    lines = LineIndex(text)
+    for index in range(len(text) + 1):
+        line, column = lines.pos_to_linecol(index)
+        assert (line, column) == naive_linecol(text, index)
+        assert lines.linecol_to_pos(line, column) == index
+    assert [lines.line_text(n) for n in range(1, len(lines) + 1)] == text.split('\n')
+
+
+def test_built_once():
+    lines = LineIndex('a\nb\nc')
+    starts = lines.starts
+    lines.pos_to_linecol(4)
+    assert lines.starts is starts
+    assert lines.span_to_linecol(0, 4) == ((1, 1), (3, 1))
+
+
+def test_parse_errors():
+    parser = build()
+    # expressions on lines of their own, the parse fails at the second one or earlier
+    texts = expressions(40, seed=13, broken=0.5)
+    located = 0
+    for n in range(len(texts) - 1):
+        text = '\n'.join(texts[n:n + 3])
+        with pytest.raises(ParserError) as error:
+            parser.parse(text)
+        line, column = naive_linecol(text, error.value.index)
+        assert (error.value.line, error.value.column) == (line, column)
+        assert f'line {line}, column {column}' in str(error.value)
+        located += line > 1
+    assert located
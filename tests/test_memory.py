@@ -0,0 +1,124 @@
+'''
+memory held by memoized parses, failures included
+'''
+import gc
+import os
+import tracemalloc
+import weakref
+import pytest
+from yapcl.cache import cache_size
+from yapcl.combinators import regex
+from yapcl.context import ParseContext
+from yapcl.errors import ParserError
+from . grammar import build, expressions
+
+INPUTS = expressions(100, seed=2, broken=0.3)
+
+
+def parse_all(parser, rounds):
+    for _ in range(rounds):
+        for text in INPUTS:
+            try:
+                parser.parse(text)
+            except ParserError:
+                pass
+
+
+def test_memory_stays_flat():
+    with cache_size(256, policy='lru'):
+        parser = build()
+
+    parse_all(parser, 1)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        parse_all(parser, 2)
+        gc.collect()
+        first, _ = tracemalloc.get_traced_memory()
+        parse_all(parser, 10)
+        gc.collect()
+        last, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # nothing outlives a parse, 1000 more parses dont hold anything more
+    assert last - first < 64 * 1024
+
+
+def failures(parser, string):
+    '''
+    the errors of two calls of parser at the same position of one parse, the second
+    one is a memo hit
+    '''
+    context = ParseContext(string)
+    errors = []
+    with context.active():
+        for _ in range(2):
+            try:
+                parser.func((None, None, 0), string)
+            except ParserError as e:
+                errors.append(e)
+    return errors, context
+
+
+def test_failure_hit_raises_a_new_error():
+    with cache_size(16):
+        number = regex(r'\d+')
+
+    (first, second), context = failures(number, 'x')
+    assert context.memo_hits == 1 and context.memo_misses == 1
+    assert second is not first
+    assert (second.expected, second.index, second.message) == (first.expected, first.index, first.message)
+
+    # the second error only went through the memo lookup, not the frames of the first failure
+    frames = []
+    tb = second.__traceback__
+    while tb is not None:
+        frames.append(tb.tb_frame.f_code.co_name)
+        tb = tb.tb_next
+    assert 'regex_parser' not in frames
+    assert second.__context__ is None and second.__cause__ is None
+
+
+def test_failure_records_dont_keep_the_error():
+    with cache_size(16):
+        number = regex(r'\d+')
+
+    context = ParseContext('x')
+    with context.active():
+        try:
+            number.func((None, None, 0), 'x')
+        except ParserError as e:
+            error = weakref.ref(e)
+        cache, = context.caches.values()
+        gc.collect()
+        assert error() is None
+        assert len(cache.mapping) == 1
+
+
+def rss():
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/statm'), reason='needs /proc')
+def test_long_running_rss():
+    # a service parsing mostly bad input with a memo that keeps every failure of a parse
+    with cache_size(policy='all'):
+        parser = build()
+    inputs = expressions(200, seed=12, broken=0.6)
+
+    def run(rounds):
+        for _ in range(rounds):
+            for text in inputs:
+                try:
+                    parser.parse(text)
+                except ParserError:
+                    pass
+
+    run(2)
+    gc.collect()
+    before = rss()
+    run(10)
+    gc.collect()
+    assert rss() - before < 2 * 1024 * 1024
@@ -0,0 +1,55 @@
+'''
+recognizers and the predicates built on them, against full parses
+'''
+import pytest
+from yapcl.combinators import regex, followed_by, not_followed_by, lookahead, seq
+from yapcl.errors import ParserError
+from yapcl.recognize import recognizer
+from . grammar import build, expressions
+
+INPUTS = expressions(200, seed=19, broken=0.3)
+
+
+def parsed_end(parser, text, index=0):
+    try:
+        return parser.parse(text, index)[2]
+    except ParserError:
+        return -1
+
+
+@pytest.mark.parametrize('split', [False, True])
+@pytest.mark.parametrize('full', [False, True])
+def test_same_end_as_parse(split, full):
+    parser = build(split=split, full=full)
+    recognize = recognizer(parser)
+    for text in INPUTS:
+        assert recognize(text, 0) == parsed_end(parser, text)
+
+
+def test_scanners():
+    parser = build(scanners=True)
+    recognize = recognizer(parser)
+    for text in INPUTS:
+        assert recognize(text, 0) == parsed_end(parser, text)
+
+
+@pytest.mark.parametrize('make, positive', [(followed_by, True), (not_followed_by, False)])
+def test_predicates(make, positive):
+    expression = build(full=False)
+    parser = seq(make(expression), regex('.*'))
+    for text in INPUTS:
+        matches = parsed_end(expression, text) >= 0
+        expected = len(text) if matches == positive else -1
+        assert parsed_end(parser, text) == expected
+        try:
+            assert parser.parse_vm(text)[2] == expected
+        except ParserError:
+            assert expected == -1
+
+
+def test_lookahead():
+    statement = lookahead(regex('[a-z]+'), seq('=', build(full=False)))
+    for text in INPUTS:
+        line = 'v=' + text
+        expected = 1 if parsed_end(build(full=False), text) >= 0 else -1
+        assert parsed_end(statement, line) == expected
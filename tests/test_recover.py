@@ -0,0 +1,71 @@
+'''
+recover(), its resync and parse_partial(), with the combinators and the vm
+'''
+import pytest
+from yapcl.combinators import regex, recover, seq, cut, _resync
+from yapcl.errors import ParserError, CutError
+
+
+def outcome(parse, text):
+    try:
+        return repr(parse(text))
+    except ParserError as e:
+        return (type(e).__name__, e.index)
+
+
+def records(consume_sync):
+    number = regex(r'\d+') == 'n'
+    if consume_sync:
+        return recover(number << ';', ';').many()
+    return recover(number, ',', consume_sync=False).sepby(',')
+
+
+@pytest.mark.parametrize('text, ends, skipped', [
+    ('1,x,2,,3', 8, [(2, 3), (6, 6)]),
+    (',1', 2, [(0, 0)]),
+    ('1,x', 3, [(2, 3)]),
+    ('1,2', 3, []),
+])
+def test_empty_records_before_the_separator(text, ends, skipped):
+    parser = records(consume_sync=False)
+    data, errors = parser.parse_partial(text)
+    assert data[2] == ends
+    assert [(e.start, e.end) for e in errors] == skipped
+    assert repr(parser.parse_vm(text)) == repr(data)
+
+
+@pytest.mark.parametrize('text', ['1;x;2;', '1;;2;', 'xx', '1;x', ''])
+def test_consumed_sync(text):
+    parser = records(consume_sync=True)
+    assert outcome(parser.parse_vm, text) == outcome(parser.parse, text)
+
+
+def test_parse_partial_locates_errors():
+    parser = records(consume_sync=True)
+    data, errors = parser.parse_partial('1;2;x\ny;3;')
+    assert [(e.start, e.end) for e in errors] == [(4, 8)]
+    assert errors[0].linecol == (1, 5)
+    assert data[2] == 10
+
+
+@pytest.mark.parametrize('sync, consume_sync, index, end', [
+    (',', True, 0, 3),
+    (',', False, 0, 2),
+    (regex(',+'), True, 0, 4),
+    (regex(',+'), False, 3, 3),
+    (',', True, 5, 5),
+])
+def test_resync(sync, consume_sync, index, end):
+    sync_text = sync if isinstance(sync, str) else None
+    sync_func = None if sync_text is not None else sync.func
+    assert _resync('ab,,c', index, sync_text, sync_func, consume_sync) == end
+
+
+def test_cut_error_keeps_its_type_when_nothing_is_skipped():
+    # a cut at the end of the input, the resync has nothing left to skip
+    parser = recover(seq(cut, regex(r'\d+'), ';'), ';').many()
+    for parse in (parser.parse, parser.parse_vm):
+        with pytest.raises(CutError):
+            parse('1;')
+    assert outcome(parser.parse_vm, '1;x;2;') == outcome(parser.parse, '1;x;2;')
+
@@ -0,0 +1,86 @@
+'''
+ParseStats counters, merging and export
+'''
+import json
+from yapcl.cache import cache_size
+from yapcl.errors import ParserError
+from yapcl.stats import ParseStats, LATENCY_BUCKETS
+from . grammar import build, expressions
+
+INPUTS = expressions(120, seed=14, broken=0.25)
+
+
+def observe(parser, texts, stats):
+    results = []
+    for text in texts:
+        try:
+            results.append(parser.parse(text, stats=stats))
+        except ParserError as e:
+            results.append(('error', e.index))
+    return results
+
+
+def cached_grammar():
+    # keeps every entry, the memo counts dont depend on random evictions
+    with cache_size(policy='all'):
+        return build()
+
+
+def test_counts():
+    parser = cached_grammar()
+    stats = ParseStats(sample_every=0)
+    results = observe(parser, INPUTS, stats)
+    assert results == observe(build(), INPUTS, None)
+
+    failed = [r for r in results if r[0] == 'error']
+    assert stats.parses == len(INPUTS)
+    assert stats.failures == len(failed)
+    assert stats.chars == sum(r[2] for r in results if r[0] != 'error')
+    assert sum(stats.latency_counts) == len(INPUTS)
+    assert stats.memo_misses > 0
+    assert stats.sampled == 0
+
+
+def test_sampled_parses():
+    stats = ParseStats(sample_every=1)
+    observe(build(), INPUTS[:20], stats)
+    assert stats.sampled == 20
+    assert stats.max_depth > 5
+    assert stats.sampled_chars > 0 and stats.backtrack_chars > 0
+
+
+def test_merge_equals_one_stats():
+    parser = cached_grammar()
+    whole = ParseStats(sample_every=3)
+    observe(parser, INPUTS, whole)
+
+    halves = ParseStats(sample_every=3), ParseStats(sample_every=3)
+    observe(parser, INPUTS[:60], halves[0])
+    observe(parser, INPUTS[60:], halves[1])
+    merged = ParseStats().merge(halves[0]).merge(halves[1].to_dict())
+
+    for name in ('parses', 'failures', 'chars', 'memo_hits', 'memo_misses'):
+        assert getattr(merged, name) == getattr(whole, name), name
+    # which parses are sampled depends on how they were split
+    for name in ('sampled', 'sampled_chars', 'backtrack_chars'):
+        assert getattr(merged, name) == getattr(halves[0], name) + getattr(halves[1], name)
+    assert merged.max_depth == max(halves[0].max_depth, halves[1].max_depth)
+    assert sum(merged.latency_counts) == len(INPUTS)
+
+
+def test_export():
+    stats = ParseStats(sample_every=5)
+    observe(cached_grammar(), INPUTS, stats)
+
+    data = json.loads(stats.to_json())
+    copy = ParseStats.from_dict(data)
+    assert copy.to_dict() == stats.to_dict()
+
+    text = stats.to_prometheus(labels={'grammar': 'math'})
+    lines = text.splitlines()
+    assert f'yapcl_parses_total{{grammar="math"}} {len(INPUTS)}' in lines
+    assert f'yapcl_parse_seconds_count{{grammar="math"}} {len(INPUTS)}' in lines
+    buckets = [line for line in lines if line.startswith('yapcl_parse_seconds_bucket')]
+    assert len(buckets) == len(LATENCY_BUCKETS)
+    counts = [int(line.rsplit(' ', 1)[1]) for line in buckets]
+    assert counts == sorted(counts) and counts[-1] == len(INPUTS)
@@ -0,0 +1,114 @@
+'''
+parse_async() and iter_parse_async() over an in memory stand-in for asyncio.StreamReader
+'''
+import asyncio
+import threading
+import pytest
+from yapcl.combinators import regex, eof
+from yapcl.errors import ParserError
+
+
+class ChunkReader:
+    '''
+    async read(n) returning the given chunks one by one, whatever n is
+    '''
+    def __init__(self, data, size):
+        self.chunks = [data[i:i + size] for i in range(0, len(data), size)]
+        self.reads = 0
+
+    async def read(self, n):
+        self.reads += 1
+        await asyncio.sleep(0)
+        return self.chunks.pop(0) if self.chunks else b''
+
+
+def collect(parser, reader, **kwargs):
+    async def run():
+        return [data async for data in parser.iter_parse_async(reader, **kwargs)]
+    return asyncio.run(run())
+
+
+def test_multibyte_characters_split_between_chunks():
+    word = regex(r'[^;]+') << ';'
+    text = 'é;ünï;日本語;😀;'
+    items = collect(word, ChunkReader(text.encode(), 1), chunk_size=2)
+    assert [data[0] for data in items] == ['é', 'ünï', '日本語', '😀']
+
+    document = word.many() << eof
+    result = asyncio.run(document.parse_async(ChunkReader(text.encode(), 1)))
+    assert result == document.parse(text)
+
+
+def test_items_spanning_chunks():
+    record = regex(r'\d+') << 'end;' == 'record'
+    text = ''.join(f'{n * 7919}end;' for n in range(300))
+    for size in (1, 3, 7, 64):
+        items = collect(record, ChunkReader(text.encode(), size), chunk_size=16, yield_every=5)
+        assert [data[0] for data in items] == [str(n * 7919) for n in range(300)]
+
+
+def test_bad_record_raises_without_reading_the_rest():
+    record = regex(r'\d+') << ';'
+    data = ('12;345;' * 10 + 'x;' + '6;' * 5000).encode()
+    reader = ChunkReader(data, 16)
+
+    with pytest.raises(ParserError) as error:
+        collect(record, reader, chunk_size=16)
+
+    # the records before the bad one and about a chunk after it were read
+    assert reader.reads <= 8
+    assert len(reader.chunks) > 600
+
+
+def test_parse_async_runs_off_the_loop():
+    threads = []
+
+    def record_thread(result):
+        threads.append(threading.get_ident())
+        return result
+
+    document = regex(r'\d+').map(record_thread).sepby(',') << eof
+
+    async def run():
+        return threading.get_ident(), await document.parse_async(ChunkReader(b'1,2,3', 2))
+
+    loop_thread, result = asyncio.run(run())
+    assert result == document.parse('1,2,3')
+    assert threads[:3] and loop_thread not in threads[:3]
+
+
+def test_items_point_into_the_stream():
+    record = regex(r'\d+') << ';' == 'record'
+    text = ''.join(f'{n * 31};' for n in range(200))
+    items = collect(record, ChunkReader(text.encode(), 5), chunk_size=8, yield_every=3)
+    start = 0
+    for result, tag, end in items:
+        assert text[start:end] == f'{result};'
+        start = end
+    assert start == len(text)
+
+
+def test_bad_record_index_is_in_the_stream():
+    record = regex(r'\d+') << ';'
+    text = '12;345;' * 10 + 'x;'
+    with pytest.raises(ParserError) as error:
+        collect(record, ChunkReader(text.encode(), 4), chunk_size=4)
+    assert error.value.index == text.index('x')
+
+
+def test_items_parse_off_the_loop():
+    threads = []
+
+    def record_thread(result):
+        threads.append(threading.get_ident())
+        return result
+
+    record = regex(r'\d+').map(record_thread) << ';'
+
+    async def run():
+        items = [data async for data in record.iter_parse_async(ChunkReader(b'1;2;3;', 2))]
+        return threading.get_ident(), items
+
+    loop_thread, items = asyncio.run(run())
+    assert [data[0] for data in items] == ['1', '2', '3']
+    assert threads and loop_thread not in threads
@@ -0,0 +1,59 @@
+'''
+char_in, char_range, take_while and take_until against the regexes they replace
+'''
+import random
+import pytest
+from yapcl.combinators import regex, char_in, char_range, take_while, take_until
+from yapcl.errors import ParserError
+from . grammar import build, expressions
+
+
+def outcome(parse, text):
+    try:
+        return parse(text)
+    except ParserError as e:
+        return ('error', e.index)
+
+
+def test_math_grammar_with_scanners():
+    plain = build()
+    scanners = build(scanners=True)
+    for text in expressions(200, seed=11, broken=0.3):
+        for parse in (scanners.parse, scanners.parse_vm):
+            assert outcome(parse, text) == outcome(plain.parse, text)
+
+
+def samples(alphabet, count=200, seed=0):
+    rand = random.Random(seed)
+    return [''.join(rand.choice(alphabet) for _ in range(rand.randint(0, 200))) for _ in range(count)]
+
+
+@pytest.mark.parametrize('terminal, pattern', [
+    (char_in('abc'), '[abc]'),
+    (char_range('a', 'c'), '[a-c]'),
+    (char_range('Ā', '⿿'), '[Ā-⿿]'),
+    (take_while('ab'), '[ab]*'),
+    (take_while('ab', 2, 5), '[ab]{2,5}'),
+    (take_while(str.isdigit, 1), '[0-9]+'),
+    (take_until('cb'), '.*?(?=cb)'),
+])
+def test_same_as_regex(terminal, pattern):
+    reference = regex(pattern)
+    for text in samples('abcd1ā'):
+        for start in (0, len(text) // 2):
+            assert outcome(lambda s: terminal.parse(s, start), text) == outcome(lambda s: reference.parse(s, start), text)
+
+
+@pytest.mark.parametrize('terminal, pattern', [
+    (char_in('abc'), '[abc]'),
+    (char_range('a', 'c'), '[a-c]'),
+    (char_range('Ā', '⿿'), '[Ā-⿿]'),
+])
+def test_many_scan(terminal, pattern):
+    # many() of a single character class is one scan, with the results of one match per character
+    reference = regex(pattern)
+    for low, high in ((0, float('inf')), (3, 10)):
+        scanned = terminal.many(low, high)
+        matched = reference.many(low, high)
+        for text in samples('abcdā' * 3 + 'a' * 30, seed=1):
+            assert outcome(scanned.parse, text) == outcome(matched.parse, text)
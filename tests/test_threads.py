@@ -0,0 +1,62 @@
+'''
+one cached grammar shared by the threads of a pool, for every cache policy
+'''
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from yapcl.cache import cache_size, policies
+from yapcl.errors import ParserError
+from yapcl.stats import ParseStats
+from . grammar import build, expressions
+
+INPUTS = expressions(300, seed=1, broken=0.2)
+SIZES = {'bytes': 1 << 14}
+
+
+def outcome(parser, text, stats=None):
+    try:
+        return parser.parse(text, stats=stats)
+    except ParserError as e:
+        return ('error', str(e), e.index)
+
+
+def cached_grammar(policy):
+    with cache_size(SIZES.get(policy, 64), policy=policy) as cache:
+        parser = build()
+    return parser, cache
+
+
+@pytest.mark.parametrize('policy', sorted(policies))
+def test_results_match_sequential(policy):
+    expected = [outcome(build(), text) for text in INPUTS]
+    assert any(result[0] == 'error' for result in expected)
+
+    parser, cache = cached_grammar(policy)
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda text: outcome(parser, text), INPUTS * 2))
+
+    assert results == expected * 2
+
+
+@pytest.mark.parametrize('policy', sorted(policies))
+def test_stats_are_consistent(policy):
+    parser, cache = cached_grammar(policy)
+    stats = ParseStats(sample_every=0)
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda text: outcome(parser, text, stats), INPUTS))
+
+    totals = cache.stats
+    assert stats.parses == len(INPUTS)
+    assert totals['misses'] > 0 and totals['hits'] > 0
+    assert (totals['hits'], totals['misses']) == (stats.memo_hits, stats.memo_misses)
+
+    rules = cache.rules.values()
+    assert sum(rule['hits'] for rule in rules) == totals['hits']
+    assert sum(rule['misses'] for rule in rules) == totals['misses']
+    assert sum(rule['evictions'] for rule in rules) == totals['evictions']
+
+    if policy != 'random':
+        # eviction is deterministic, every parse does the same lookups as alone
+        sequential, sequential_cache = cached_grammar(policy)
+        for text in INPUTS:
+            outcome(sequential, text)
+        assert sequential_cache.stats == totals
@@ -0,0 +1,45 @@
+'''
+Parser.parse_vm() against Parser.parse()
+'''
+import sys
+import pytest
+from yapcl.combinators import regex, recover, seq, cut, either
+from yapcl.errors import ParserError
+from . grammar import build, expressions
+
+
+def outcome(parse, text):
+    # by repr, RecoveredError has no __eq__
+    try:
+        return repr(parse(text))
+    except ParserError as e:
+        return (type(e).__name__, repr(e.expected), e.index, e.message)
+
+
+@pytest.mark.parametrize('split', [False, True])
+def test_math_grammar(split):
+    parser = build(split=split)
+    for text in expressions(300, seed=6, broken=0.3):
+        assert outcome(parser.parse_vm, text) == outcome(parser.parse, text)
+
+
+def test_recovered_records():
+    number = regex(r'\d+') == 'n'
+    parser = recover(seq('(', cut, number, ')'), ';').many()
+    for text in ['(1);(x;(2)', '(1)(2', '(;', '', 'x;(3)']:
+        assert outcome(parser.parse_vm, text) == outcome(parser.parse, text)
+
+
+def test_deep_nesting():
+    parser = build()
+    depth = sys.getrecursionlimit()
+    text = '(' * depth + '1' + ')' * depth
+    with pytest.raises(RecursionError):
+        parser.parse(text)
+    assert parser.parse_vm(text)[2] == len(text)
+
+
+def test_alternative_errors():
+    parser = either('a', 'b', seq('c', 'd')) + 'e'
+    for text in ['ae', 'cde', 'cx', 'x', 'a']:
+        assert outcome(parser.parse_vm, text) == outcome(parser.parse, text)
@@ -0,0 +1,52 @@
+class Reducer:
+    '''
+    turns parse data into values with the methods of a visitor object, for
+    Parser.parse(string, actions=visitor).
+
+    a (result, tag, index) tuple is reduced when it gets embedded in its parent
+    (appended to a seq, many, sepby or concat list, combined by leftassoc, wrapped by
+    another tag) or returned by parse(). tagged data becomes visitor.on_<tag>(result),
+    or visitor.default(tag, result) when there's no such method (result itself if there's
+    no default either), untagged data becomes its result. results are already reduced
+    by then, lists hold the values of the children instead of their data, so the tree
+    never exists as a whole.
+    the combinators call self.reduce, a plain function doing the same as calling self.
+    '''
+    def __init__(self, visitor):
+        self.visitor = visitor
+        self.default = getattr(visitor, 'default', None)
+        self.handlers = handlers = {}
+        handler = self.handler
+
+        def reduce(data):
+            tag = data[1]
+            if tag is None:
+                return data[0]
+            try:
+                func = handlers[tag]
+            except KeyError:
+                func = handler(tag)
+            return data[0] if func is None else func(data[0])
+
+        self.reduce = reduce
+
+    def handler(self, tag):
+        try:
+            return self.handlers[tag]
+        except KeyError:
+            pass
+
+        handler = getattr(self.visitor, f'on_{tag}', None)
+        if handler is None and self.default is not None:
+            default = self.default
+            handler = lambda result: default(tag, result)
+
+        self.handlers[tag] = handler
+        return handler
+
+    def __call__(self, data):
+        return self.reduce(data)
+
+    def all(self, datas):
+        reduce = self.reduce
+        return [reduce(data) for data in datas]
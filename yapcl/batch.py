@@ -0,0 +1,360 @@
+import re
+from array import array
+from . errors import ParserError
+
+_inline_flags = {re.IGNORECASE: 'i', re.MULTILINE: 'm', re.DOTALL: 's', re.VERBOSE: 'x'}
+
+
+class BatchResult:
+    '''
+    columnar result of parse_batch().
+    ends[i] is the index where the parse of strings[i] stopped, or -1 if it failed.
+    tags[i] is the tag of the parse data of strings[i] (None on failure), tags is None when
+    the fused regex ran and the tag cant be known from the match, see tagged_pattern().
+    values[i] is the parse data of strings[i] (None on failure), only when values were requested.
+    '''
+    def __init__(self, ends, values=None, tags=None):
+        self.ends = ends
+        self.values = values
+        self.tags = tags
+
+    def __len__(self):
+        return len(self.ends)
+
+    @property
+    def failures(self):
+        return self.ends.count(-1)
+
+    def __repr__(self):
+        return f'BatchResult({len(self.ends)} strings, {self.failures} failures)'
+
+
+def _regex_source(pattern):
+    if pattern.groupindex:
+        return None
+
+    # numbered back references would point to the wrong group once the pattern is fused
+    if pattern.groups and re.search(r'\\[1-9]', pattern.pattern):
+        return None
+
+    flags = pattern.flags & ~re.UNICODE
+    letters = ''
+    for flag, letter in _inline_flags.items():
+        if flags & flag:
+            letters += letter
+            flags &= ~flag
+
+    if flags:
+        return None
+
+    if letters:
+        return f'(?{letters}:{pattern.pattern})'
+    return f'(?:{pattern.pattern})'
+
+
+def _char_set(chars):
+    if not chars:
+        return '(?!)'
+    return '[' + ''.join(re.escape(char) for char in sorted(chars)) + ']'
+
+
+def fuse(parser, _active=None):
+    '''
+    returns a regex source matching exactly the same span as parser, or None when the
+    parser cant be expressed as a regex. every piece is atomic or possessive, so the
+    regex never backtracks into a piece that already matched, just like the combinators.
+    results are not reproduced, only where the parse ends.
+    '''
+    node = parser.node
+    if node is None:
+        return None
+
+    if _active is None:
+        _active = set()
+
+    if id(parser) in _active:
+        return None
+
+    _active.add(id(parser))
+    try:
+        return _fuse_node(node, _active)
+    finally:
+        _active.discard(id(parser))
+
+
+def _fuse_ignore(ignore, active):
+    if ignore is None:
+        return ''
+    source = fuse(ignore, active)
+    if source is None:
+        return None
+    return f'(?:{source})?+'
+
+
+def _fuse_node(node, active):
+    kind = node[0]
+
+    if kind == 'regex':
+        source = _regex_source(node[1])
+        return None if source is None else f'(?>{source})'
+
+    elif kind == 'lit':
+        return re.escape(node[1])
+
+    elif kind == 'char_in':
+        return _char_set(node[1])
+
+    elif kind == 'char_range':
+        return f'[{re.escape(node[1])}-{re.escape(node[2])}]'
+
+    elif kind == 'take_while':
+        _, accept, mi, ma = node
+        if callable(accept):
+            return None
+        upper = '' if ma == float('inf') else str(ma)
+        return f'{_char_set(accept)}{{{mi},{upper}}}+'
+
+    elif kind == 'take_until':
+        return f'(?>(?s:.*?)(?={re.escape(node[1])}))'
+
+    elif kind == 'either':
+        sources = [fuse(p, active) for p in node[1]]
+        if None in sources:
+            return None
+        return '(?>' + '|'.join(sources) + ')'
+
+    elif kind == 'seq':
+        _, parsers, ignore, capture, auto_capture = node
+        ign = _fuse_ignore(ignore, active)
+        sources = [fuse(p, active) for p in parsers]
+        if ign is None or None in sources:
+            return None
+        return ign + ''.join(f'(?:{source}){ign}' for source in sources)
+
+    elif kind == 'many':
+        _, parser, mi, ma, capture, ignore = node
+        ign = _fuse_ignore(ignore, active)
+        source = fuse(parser, active)
+        if ign is None or source is None:
+            return None
+        upper = '' if ma == float('inf') else str(ma)
+        return f'{ign}(?:(?:{source}){ign}){{{mi},{upper}}}+'
+
+    elif kind == 'sepby':
+        _, parser, separator, mi, ma, ignore = node
+        if mi != 0 or ma != float('inf'):
+            return None
+        ign = _fuse_ignore(ignore, active)
+        source = fuse(parser, active)
+        sep = fuse(separator, active)
+        if ign is None or source is None or sep is None:
+            return None
+        return f'{ign}(?:(?:{source}){ign}(?:{sep}){ign})*+(?:(?:{source}){ign})?+'
+
+    elif kind == 'leftassoc':
+        _, start, parser, mi, ma, ignore = node
+        if mi != 0 or ma != float('inf'):
+            return None
+        ign = _fuse_ignore(ignore, active)
+        start_source = fuse(start, active)
+        source = fuse(parser, active)
+        if ign is None or start_source is None or source is None:
+            return None
+        return f'{ign}(?:{start_source})(?:{ign}(?:{source}))*+{ign}'
+
+    elif kind == 'concat':
+        sources = [fuse(p, active) for p in node[1]]
+        if None in sources:
+            return None
+        return ''.join(f'(?:{source})' for source in sources)
+
+    elif kind in ('map', 'tag', 'discard', 'deepjoin', 'error_message'):
+        return fuse(node[1], active)
+
+    elif kind == 'lookahead':
+        source1 = fuse(node[1], active)
+        source2 = fuse(node[2], active)
+        if source1 is None or source2 is None:
+            return None
+        return f'(?:{source1})(?=(?>{source2}))'
+
+    elif kind in ('followed_by', 'not_followed_by'):
+        source = fuse(node[1], active)
+        if source is None:
+            return None
+        return f'(?=(?>{source}))' if kind == 'followed_by' else f'(?!(?>{source}))'
+
+    elif kind == 'eof':
+        return r'\Z'
+
+    elif kind == 'fail':
+        return '(?!)'
+
+    elif kind in ('success', 'copy_last'):
+        return ''
+
+    return None
+
+
+def fused_pattern(parser):
+    '''
+    compiled fuse(parser), computed once per parser. None if the parser cant be fused
+    '''
+    try:
+        return parser._fused_pattern
+    except AttributeError:
+        pass
+
+    source = fuse(parser)
+    pattern = None
+    if source is not None:
+        try:
+            pattern = re.compile(source)
+        except (re.error, OverflowError):
+            pattern = None
+
+    parser._fused_pattern = pattern
+    return pattern
+
+
+_terminal_kinds = {'regex', 'lit', 'char_in', 'char_range', 'take_while', 'take_until', 'eof', 'fail'}
+
+
+def _static_tag(parser, _seen=()):
+    '''
+    (True, tag) when every parse data of parser has that tag, (False, None) if it cant be known
+    '''
+    node = parser.node
+    if node is None or id(parser) in _seen:
+        return False, None
+    seen = (*_seen, id(parser))
+
+    kind = node[0]
+    if kind in _terminal_kinds:
+        return True, None
+    if kind in ('tag', 'success'):
+        return True, node[2]
+    if kind in ('sepby', 'concat'):
+        return True, None
+    if kind == 'many' and node[4] is None:
+        return True, None
+    if kind == 'seq' and node[3] is None and not node[4]:
+        return True, None
+    if kind in ('map', 'discard', 'error_message', 'lookahead'):
+        return _static_tag(node[1], seen)
+    if kind == 'ref':
+        _, parsers, k = node
+        return _static_tag(parsers[k], seen) if k in parsers else (False, None)
+    if kind == 'either':
+        first, *others = [_static_tag(p, seen) for p in node[1]]
+        return first if all(other == first for other in others) else (False, None)
+    return False, None
+
+
+def _tagged(parser):
+    # wrappers that keep the span of their parser
+    while parser.node is not None and parser.node[0] in ('map', 'discard', 'error_message', 'ref'):
+        node = parser.node
+        if node[0] == 'ref':
+            if node[2] not in node[1]:
+                return None
+            parser = node[1][node[2]]
+        else:
+            parser = node[1]
+
+    known, tag = _static_tag(parser)
+    if known:
+        pattern = fused_pattern(parser)
+        return None if pattern is None else (pattern, tag)
+
+    # a top either with alternatives of different tags, the one that matched is found
+    # from the name of its group
+    if parser.node is None or parser.node[0] != 'either':
+        return None
+    alternatives = parser.node[1]
+    tags = {}
+    sources = []
+    for i, alternative in enumerate(alternatives):
+        known, tag = _static_tag(alternative)
+        source = fuse(alternative)
+        if not known or source is None:
+            return None
+        tags[f'alt{i}'] = tag
+        sources.append(f'(?P<alt{i}>{source})')
+
+    try:
+        pattern = re.compile('(?>' + '|'.join(sources) + ')')
+    except (re.error, OverflowError):
+        return None
+    return pattern, tags
+
+
+def tagged_pattern(parser):
+    '''
+    (pattern, tags) where pattern is a regex matching the same span as parser, like
+    fused_pattern(), and tags is the tag of the parse data of parser, or a dict from group
+    names of pattern to the tags of the alternatives of an either(), the one holding the
+    match has the tag. computed once per parser, None when the tag cant be known
+    from a match.
+    '''
+    try:
+        return parser._tagged_pattern
+    except AttributeError:
+        pass
+
+    parser._tagged_pattern = tagged = _tagged(parser)
+    return tagged
+
+
+def parse_batch(parser, strings, values=False, full=False, tags=False):
+    '''
+    parses every string in strings with parser and returns a BatchResult.
+    when only spans and tags are needed (values=False) and the parser can be fused into a
+    single regex, the regex runs over the whole batch without any per string parser call.
+    with tags=True the tag column is always filled, by parsing every string when the fused
+    regex cant tell the tags.
+    with full=True a parse only succeeds if it consumes the whole string.
+    '''
+    pattern = None
+    tagged = None
+    if not values:
+        tagged = tagged_pattern(parser)
+        if tagged is not None:
+            pattern = tagged[0]
+        elif not tags:
+            pattern = fused_pattern(parser)
+
+    if pattern is not None:
+        strings = strings if isinstance(strings, (list, tuple)) else list(strings)
+        if all(type(s) is str for s in strings):
+            match = pattern.fullmatch if full else pattern.match
+            matches = list(map(match, strings))
+            ends = array('q', [m.end() if m else -1 for m in matches])
+            tag_column = None
+            if tagged is not None:
+                tag = tagged[1]
+                if isinstance(tag, dict):
+                    tag_column = [tag[m.lastgroup] if m else None for m in matches]
+                else:
+                    tag_column = [tag if m else None for m in matches]
+            return BatchResult(ends, tags=tag_column)
+
+    ends = array('q')
+    tag_column = []
+    results = [] if values else None
+    parse = parser.parse
+    for string in strings:
+        try:
+            data = parse(string)
+        except ParserError:
+            data = None
+        else:
+            if full and data[2] != len(string):
+                data = None
+
+        ends.append(-1 if data is None else data[2])
+        tag_column.append(None if data is None else data[1])
+        if values:
+            results.append(data)
+
+    return BatchResult(ends, results, tag_column)
@@ -1,95 +1,495 @@
-from functools import wraps
+from collections import OrderedDict
+from contextvars import ContextVar
 from contextlib import contextmanager
 from random import random
+from sys import getsizeof
+from threading import Lock
+import weakref
+from . errors import ParserError
 
-_curr_cache = None
+_curr_cache = ContextVar('yapcl_curr_cache', default=None)
+
+HITS, MISSES, EVICTIONS, ENTRIES, BYTES = range(5)
 
 
 class CacheStats:
-    def __init__(self, query, mapping, size):
-        self._query = query
-        self._mapping = mapping
+    '''
+    describes a cache shared by every parser created under a cache_size() block.
+    the entries themselves live in the ParseContext of each call to Parser.parse(),
+    this object only accumulates the counters of every finished parse.
+    '''
+    def __init__(self, size, policy, measure_bytes=False):
         self._size = size
+        self._policy = policy
+        self._measure_bytes = measure_bytes or policy.measure_bytes
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._rules = {}
+        self._funcs = {}
+        self._lock = Lock()
 
     size = property(fget=lambda self: self._size)
-    stats = property(fget=lambda self: {'hits': self._mapping['hits'],
-                                        'misses': self._mapping['misses']})
+    policy = property(fget=lambda self: self._policy)
+    stats = property(fget=lambda self: {'hits': self._hits,
+                                        'misses': self._misses,
+                                        'evictions': self._evictions})
+
+    @property
+    def rules(self):
+        '''
+        per rule statistics, keyed by the repr of the parser.
+        hits, misses and evictions are totals over every parse, entries and bytes are the
+        largest amount held by the rule when a parse finished. bytes are only measured when
+        the cache was created with measure_bytes=True or a byte bounded policy.
+        '''
+        report = {}
+        with self._lock:
+            rules = [(fid, counts[:]) for fid, counts in self._rules.items()]
+
+        for fid, (hits, misses, evictions, entries, nbytes) in rules:
+            func = self._funcs.get(fid)
+            name = repr(getattr(func, 'parser_obj', func))
+            unique_name, n = name, 1
+            while unique_name in report:
+                n += 1
+                unique_name = f'{name} #{n}'
+
+            lookups = hits + misses
+            report[unique_name] = {
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': hits / lookups if lookups else 0.0,
+                'evictions': evictions,
+                'entries': entries,
+                'bytes': nbytes,
+            }
+
+        return report
 
     def erase(self):
-        dummy = object()
-        self._query.clear()
-        self._mapping.clear()
-        for i in range(self._size):
-            self._query.append((dummy, i))
-            self._mapping[(dummy, i)] = (i, i, False)
+        '''
+        entries never outlive a parse anymore, so there's nothing to erase between parses.
+        kept for compatibility.
+        '''
 
+    def register(self, fid, func):
+        self._funcs[fid] = func
 
+    def new_cache(self):
+        return self._policy(self._size, self._measure_bytes)
 
-@contextmanager
-def cache_size(size=128):
-    global _curr_cache
-    old_cache = _curr_cache
-    dummy = object()
-    mapping = {(dummy, i): (i, i, False) for i in range(size)}
-    mapping['hits'] = 0
-    mapping['misses'] = 0
-    query = [(dummy, i) for i in range(size)]
+    def merge(self, cache):
+        with self._lock:
+            self._hits += cache.hits
+            self._misses += cache.misses
+            self._evictions += cache.evictions
+            for fid, counts in cache.rules.items():
+                total = self._rules.get(fid)
+                if total is None:
+                    total = self._rules[fid] = [0] * 5
+                total[HITS] += counts[HITS]
+                total[MISSES] += counts[MISSES]
+                total[EVICTIONS] += counts[EVICTIONS]
+                total[ENTRIES] = max(total[ENTRIES], counts[ENTRIES])
+                total[BYTES] = max(total[BYTES], counts[BYTES])
 
-    _curr_cache = (query, mapping, size)
 
-    yield CacheStats(query, mapping, size)
+class ParseCache:
+    '''
+    cache entries of a single parse. subclasses decide which entry gets evicted, they keep
+    every live key in self.mapping (the wrapper made by cached() checks it) and implement
+    _touch(key), called on a hit, and _insert(key, entry), called on a miss.
+    entries are (retval, throw, nbytes) tuples, possibly followed by policy data.
+    failures are stored as (error type, expected, index, message) records and a new error
+    is raised on every hit.
+    '''
+    measure_bytes = False
 
-    _curr_cache = old_cache
+    def __init__(self, size, measure_bytes=False):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.nbytes = 0
+        self.rules = {}
+        self.mapping = {}
+        self._sizeof = None
+        if measure_bytes:
+            from . debug import deep_sizeof
+            self._sizeof = deep_sizeof
 
-def cached(func):
-    global _curr_cache
-    if not _curr_cache:
-        return func
+    def _rule(self, fid):
+        counts = self.rules.get(fid)
+        if counts is None:
+            counts = self.rules[fid] = [0] * 5
+        return counts
 
-    query, mapping, size = _curr_cache
-    size_less_one = size - 1
-    m_pop = mapping.pop
-    q_get = query.__getitem__
-    q_set = query.__setitem__
-    m_get = mapping.__getitem__
-    m_set = mapping.__setitem__
-    minimun = min
-    _round = round
-    _rand = random
-
-    def miss(key, retval, throw):
-        m_set('misses', m_get('misses') + 1)
-        rand_val = _rand()
-        index = _round(rand_val * rand_val * rand_val * size_less_one)
-        old_args = q_get(index)
-        m_pop(old_args)
-        q_set(index, key)
-        m_set(key, (retval, index, throw))
+    def hit(self, key):
+        self.hits += 1
+        self._rule(key[1])[HITS] += 1
+        retval, throw = self._touch(key)[:2]
+        if throw:
+            error_type, expected, index, message = retval
+            error = error_type(expected, index)
+            error.message = message
+            raise error
         return retval
 
-    def hit(key):
-        m_set('hits', m_get('hits') + 1)
-        retval, index, throw = m_get(key)
-        index1 = minimun(size_less_one, index + 1)
-        v1 = q_get(index1)
-        v = q_get(index)
-        q_set(index, v1)
-        q_set(index1, v)
-        m_set(key, (retval, index1, throw))
-        if throw:
-            raise retval
+    def miss(self, key, retval, throw):
+        self.misses += 1
+        counts = self._rule(key[1])
+        counts[MISSES] += 1
+        nbytes = self._sizeof(retval) if self._sizeof else 0
+        counts[ENTRIES] += 1
+        counts[BYTES] += nbytes
+        self.nbytes += nbytes
+        self._insert(key, (retval, throw, nbytes))
         return retval
 
+    def prune(self, index):
+        '''
+        drops every entry for positions before index, the parse wont go back there
+        '''
+        stale = [key for key in self.mapping if key[0] < index]
+        for key in stale:
+            entry = self._remove(key)
+            self.nbytes -= entry[2]
+            counts = self.rules[key[1]]
+            counts[ENTRIES] -= 1
+            counts[BYTES] -= entry[2]
+
+    def evicted(self, key, entry):
+        self.evictions += 1
+        self.nbytes -= entry[2]
+        counts = self.rules[key[1]]
+        counts[EVICTIONS] += 1
+        counts[ENTRIES] -= 1
+        counts[BYTES] -= entry[2]
+
+    def _touch(self, key):
+        raise NotImplementedError
+
+    def _insert(self, key, entry):
+        raise NotImplementedError
+
+    def _remove(self, key):
+        return self.mapping.pop(key)
+
+
+class RandomCache(ParseCache):
+    '''
+    evicts a random slot biased towards the start of the queue,
+    hits move the entry one slot towards the end.
+    '''
+    def __init__(self, size, measure_bytes=False):
+        super().__init__(size, measure_bytes)
+        self.query = []
+
+    def _touch(self, key):
+        query = self.query
+        mapping = self.mapping
+        entry = mapping[key]
+        index = entry[3]
+        index1 = min(len(query) - 1, index + 1)
+        other = query[index1]
+        query[index] = other
+        mapping[other] = (*mapping[other][:3], index)
+        query[index1] = key
+        mapping[key] = (*entry[:3], index1)
+        return entry
+
+    def _insert(self, key, entry):
+        query = self.query
+        mapping = self.mapping
+        if len(query) < self.size:
+            mapping[key] = (*entry, len(query))
+            query.append(key)
+            return
+
+        rand_val = random()
+        index = round(rand_val * rand_val * rand_val * (self.size - 1))
+        old_key = query[index]
+        self.evicted(old_key, mapping.pop(old_key))
+        query[index] = key
+        mapping[key] = (*entry, index)
+
+    def prune(self, index):
+        super().prune(index)
+        self.query = query = [key for key in self.query if key in self.mapping]
+        mapping = self.mapping
+        for i, key in enumerate(query):
+            mapping[key] = (*mapping[key][:3], i)
+
+
+class LRUCache(ParseCache):
+    '''
+    evicts the least recently used entry.
+    '''
+    def __init__(self, size, measure_bytes=False):
+        super().__init__(size, measure_bytes)
+        self.mapping = OrderedDict()
+
+    def _touch(self, key):
+        self.mapping.move_to_end(key)
+        return self.mapping[key]
+
+    def _insert(self, key, entry):
+        mapping = self.mapping
+        while mapping and len(mapping) >= self.size:
+            self.evicted(*mapping.popitem(last=False))
+        mapping[key] = entry
+
+
+class LFUCache(ParseCache):
+    '''
+    evicts the least frequently used entry, the oldest one among equally used entries.
+    '''
+    def __init__(self, size, measure_bytes=False):
+        super().__init__(size, measure_bytes)
+        self.buckets = {}
+        self.min_count = 0
+
+    def _touch(self, key):
+        entry = self.mapping[key]
+        count = entry[3]
+        bucket = self.buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self.buckets[count]
+            if self.min_count == count:
+                self.min_count = count + 1
+
+        self.buckets.setdefault(count + 1, {})[key] = None
+        self.mapping[key] = (*entry[:3], count + 1)
+        return entry
+
+    def _insert(self, key, entry):
+        mapping = self.mapping
+        buckets = self.buckets
+        while mapping and len(mapping) >= self.size:
+            bucket = buckets[self.min_count]
+            old_key = next(iter(bucket))
+            del bucket[old_key]
+            if not bucket:
+                del buckets[self.min_count]
+                self.min_count = min(buckets) if buckets else 0
+            self.evicted(old_key, mapping.pop(old_key))
+
+        mapping[key] = (*entry, 1)
+        buckets.setdefault(1, {})[key] = None
+        self.min_count = 1
+
+    def _remove(self, key):
+        entry = self.mapping.pop(key)
+        bucket = self.buckets[entry[3]]
+        del bucket[key]
+        if not bucket:
+            del self.buckets[entry[3]]
+            self.min_count = min(self.buckets) if self.buckets else 0
+        return entry
+
+
+class KeepAllCache(ParseCache):
+    '''
+    keeps every entry until the parse finishes, size is ignored.
+    '''
+    def _touch(self, key):
+        return self.mapping[key]
+
+    def _insert(self, key, entry):
+        self.mapping[key] = entry
+
+
+class ByteBoundedCache(LRUCache):
+    '''
+    least recently used eviction, bounded by the estimated bytes held (debug.deep_sizeof)
+    instead of the number of entries. size is the limit in bytes.
+    '''
+    measure_bytes = True
+
+    def _insert(self, key, entry):
+        mapping = self.mapping
+        mapping[key] = entry
+        while len(mapping) > 1 and self.nbytes > self.size:
+            self.evicted(*mapping.popitem(last=False))
+
+
+policies = {
+    'random': RandomCache,
+    'lru': LRUCache,
+    'lfu': LFUCache,
+    'all': KeepAllCache,
+    'bytes': ByteBoundedCache,
+}
+
+
+@contextmanager
+def cache_size(size=128, policy='random', measure_bytes=False):
+    '''
+    parsers created inside this block memoize their results.
+    policy is one of the names in cache.policies or a ParseCache subclass.
+    '''
+    if isinstance(policy, str):
+        policy = policies[policy]
+
+    stats = CacheStats(size, policy, measure_bytes)
+    token = _curr_cache.set(stats)
+    try:
+        yield stats
+    finally:
+        _curr_cache.reset(token)
+
+
+def cached(func):
+    stats = _curr_cache.get()
+    if stats is None:
+        return func
+
+    from . context import current_parse
+    get_context = current_parse.get
+    fid = id(func)
+    stats.register(fid, func)
+
     def wrapper(data, string):
-        fid = id(func)
-        key = (data[2], id(string), fid)
-        if key in mapping:
-            return hit(key)
+        context = get_context()
+        if context is None:
+            return func(data, string)
+
+        caches = context.caches
+        cache = caches.get(stats)
+        if cache is None:
+            cache = caches[stats] = stats.new_cache()
+
+        key = (data[2], fid)
+        if key in cache.mapping:
+            return cache.hit(key)
 
         try:
-            return miss(key, func(data, string), False)
-        except Exception as e:
-            miss(key, e, True)
+            return cache.miss(key, func(data, string), False)
+        except ParserError as e:
+            # only a compact record is kept, storing the exception would keep its
+            # traceback and every frame it references alive for as long as the entry.
+            cache.miss(key, (type(e), e.expected, e.index, e.message), True)
             raise e
 
     return wrapper
+
+
+class DocumentCache:
+    '''
+    results of whole parses, shared between calls to Parser.parse(string, cache=this).
+    entries are keyed by the parser, the content of the string and the start index, so
+    equal strings share a result even if they are different objects, and a hit skips
+    the parse entirely. failures are cached too and raised again as new errors.
+    least recently used entries are evicted past max_entries or max_bytes, the estimated
+    size of the strings and results held (debug.deep_sizeof).
+    the same result object is returned by every hit, dont mutate it, or pass copy=True
+    to get a fresh copy of its lists on each hit. safe to share between threads.
+    '''
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_entries=float('inf'), copy=False):
+        from . debug import deep_sizeof
+        self._sizeof = deep_sizeof
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.copy = copy
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    stats = property(fget=lambda self: {'hits': self.hits,
+                                        'misses': self.misses,
+                                        'evictions': self.evictions,
+                                        'entries': len(self._entries),
+                                        'bytes': self.nbytes})
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def fetch(self, parser, string, index, parse):
+        '''
+        the cached result of parser over string from index, calls parse() on a miss
+        '''
+        key = (id(parser), string, index)
+        try:
+            hash(key)
+        except TypeError:  # unhashable input, like a list of tokens
+            return parse()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            # ids are reused once a parser is collected, the weak reference tells them apart
+            if entry is not None and entry[0]() is parser:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                entry = None
+                self.misses += 1
+
+        if entry is not None:
+            _, retval, throw, _ = entry
+            if throw:
+                error_type, expected, error_index, message = retval
+                error = error_type(expected, error_index)
+                error.message = message
+                raise error
+            return _copy_lists(retval) if self.copy else retval
+
+        try:
+            data = parse()
+        except ParserError as e:
+            self._store(key, parser, (type(e), e.expected, e.index, e.message), True)
+            raise
+
+        self._store(key, parser, data, False)
+        return _copy_lists(data) if self.copy else data
+
+    def _store(self, key, parser, retval, throw):
+        nbytes = getsizeof(key[1]) + self._sizeof(retval)
+        if nbytes > self.max_bytes:
+            return
+
+        entry = (weakref.ref(parser), retval, throw, nbytes)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= old[3]
+            self._entries[key] = entry
+            self.nbytes += nbytes
+            while self._entries and (self.nbytes > self.max_bytes or len(self._entries) > self.max_entries):
+                _, old = self._entries.popitem(last=False)
+                self.nbytes -= old[3]
+                self.evictions += 1
+
+    def __repr__(self):
+        return f'DocumentCache({len(self._entries)} entries, {self.nbytes} bytes)'
+
+
+def _copy_lists(data):
+    '''
+    copy of a parse result where every list is new, tuples holding lists are rebuilt,
+    everything else is shared. iterative, so any nesting depth works.
+    '''
+    done = []
+    stack = [(data, False)]
+    while stack:
+        item, expanded = stack.pop()
+        if not isinstance(item, (list, tuple)):
+            done.append(item)
+        elif not expanded:
+            stack.append((item, True))
+            stack.extend((child, False) for child in reversed(item))
+        else:
+            children = done[len(done) - len(item):]
+            del done[len(done) - len(item):]
+            done.append(children if isinstance(item, list) else tuple(children))
+
+    return done[0]
@@ -0,0 +1,415 @@
+'''
+compact binary encoding of parse data, for sending trees between processes.
+
+    buffer = encode(data, source)
+    data = decode(buffer, source)
+    tree = LazyTree(buffer, source)      # decodes only what is accessed
+
+tags are written once in a table and referenced by number, integers are varints,
+the index of data is written relative to the index of the data it's in, and a string
+result that ends at the index of its data and matches the source there is written as
+its length only, so the same source must be given to decode it. lists and non data
+tuples carry their size in bytes, a lazy reader skips them without decoding.
+
+this isnt faster than pickle: encode() and decode() are pure python and take about
+eight times as long as pickle.dumps() and pickle.loads() on the same data. what it
+gives is a smaller buffer, reading part of a tree with LazyTree, and trees deeper than
+the recursion limit, which pickle cant write. use pickle when only speed matters.
+'''
+import pickle
+from struct import Struct
+from . combinators import Discarded
+
+MAGIC = b'YPT\x02'
+
+DATA, LIST, SPAN, STR, NONE, DISCARDED, INT, FLOAT, TUPLE, OBJECT, TRUE, FALSE = range(1, 13)
+
+_u32 = Struct('<I')
+_f64 = Struct('<d')
+
+
+def _zigzag(n):
+    return (n << 1) if n >= 0 else ((-n << 1) - 1)
+
+
+def _unzigzag(n):
+    return (n >> 1) if not n & 1 else -((n + 1) >> 1)
+
+
+def _write_varint_reversed(out, n):
+    if n < 0x80:
+        out.append(n)
+        return
+    parts = []
+    while n > 0x7f:
+        parts.append((n & 0x7f) | 0x80)
+        n >>= 7
+    parts.append(n)
+    parts.reverse()
+    out += bytes(parts)
+
+
+def _read_varint(buffer, pos):
+    n = buffer[pos]
+    if n < 0x80:
+        return n, pos + 1
+    n &= 0x7f
+    shift = 7
+    while True:
+        pos += 1
+        byte = buffer[pos]
+        n |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return n, pos + 1
+        shift += 7
+
+
+def _is_data(item, tags):
+    if len(item) != 3 or type(item[2]) is not int:
+        return False
+    try:
+        tag = item[1]
+        if tag not in tags:
+            tags[tag] = len(tags)
+    except TypeError:
+        return False
+    return True
+
+
+class _End:
+    '''
+    on the encoder stack after the children of a value, writes its header
+    '''
+    __slots__ = ('kind', 'mark', 'count', 'index')
+
+    def __init__(self, kind, mark, count, index):
+        self.kind = kind
+        self.mark = mark
+        self.count = count
+        self.index = index
+
+
+def encode(data, source=None):
+    '''
+    bytes encoding data, source is the string it was parsed from.
+    slower than pickle.dumps(), see the module docstring.
+    '''
+    # the body is written back to front and reversed at the end, so that the header
+    # of a list, written after its children, knows their size
+    out = bytearray()
+    tags = {None: 0}
+    spans = isinstance(source, str)
+    write = _write_varint_reversed
+    append = out.append
+
+    # (value, index of the data it's in)
+    stack = [(data, 0)]
+    pop = stack.pop
+    push = stack.append
+    while stack:
+        item, base = pop()
+        kind = type(item)
+
+        if kind is _End:
+            if item.kind == DATA:
+                write(out, _zigzag(base - item.index))
+                write(out, item.count)
+            else:
+                write(out, len(out) - item.mark)
+                write(out, item.count)
+            append(item.kind)
+
+        elif kind is tuple and _is_data(item, tags):
+            result, tag, index = item
+            if type(result) is str and spans and result:
+                start = index - len(result)
+                if start >= 0 and source.startswith(result, start):
+                    write(out, len(result))
+                    append(SPAN)
+                    write(out, _zigzag(base - index))
+                    write(out, tags[tag])
+                    append(DATA)
+                    continue
+            push((_End(DATA, 0, tags[tag], index), base))
+            push((result, index))
+
+        elif kind is str:
+            encoded = item.encode('utf-8', 'surrogatepass')
+            out += encoded[::-1]
+            write(out, len(encoded))
+            append(STR)
+
+        elif kind is list or kind is tuple:
+            push((_End(LIST if kind is list else TUPLE, len(out), len(item), 0), base))
+            stack.extend([(child, base) for child in item])
+
+        elif item is None:
+            append(NONE)
+
+        elif item is Discarded:
+            append(DISCARDED)
+
+        elif item is True or item is False:
+            append(TRUE if item else FALSE)
+
+        elif kind is int:
+            write(out, _zigzag(item))
+            append(INT)
+
+        elif kind is float:
+            out += _f64.pack(item)[::-1]
+            append(FLOAT)
+
+        else:
+            encoded = pickle.dumps(item)
+            out += encoded[::-1]
+            write(out, len(encoded))
+            append(OBJECT)
+
+    out.reverse()
+    table = [None] * len(tags)
+    for tag, tag_id in tags.items():
+        table[tag_id] = tag
+    table = pickle.dumps(table[1:])
+    return b''.join((MAGIC, _u32.pack(len(table)), table, out))
+
+
+def _read_header(buffer):
+    '''
+    (tags, position of the body) of an encoded buffer
+    '''
+    if bytes(buffer[:len(MAGIC)]) != MAGIC:
+        raise ValueError('not an encoded parse tree')
+    start = len(MAGIC) + _u32.size
+    end = start + _u32.unpack_from(buffer, len(MAGIC))[0]
+    return [None] + pickle.loads(buffer[start:end]), end
+
+
+def _read_scalar(buffer, pos, kind, source, index=0):
+    '''
+    (value, next position) of a value that isnt DATA, LIST or TUPLE. a SPAN is the
+    result of the data at index.
+    '''
+    if kind == SPAN:
+        length, pos = _read_varint(buffer, pos)
+        return source[index - length:index], pos
+    if kind == STR:
+        length, pos = _read_varint(buffer, pos)
+        return str(buffer[pos:pos + length], 'utf-8', 'surrogatepass'), pos + length
+    if kind == NONE:
+        return None, pos
+    if kind == DISCARDED:
+        return Discarded, pos
+    if kind == TRUE:
+        return True, pos
+    if kind == FALSE:
+        return False, pos
+    if kind == INT:
+        n, pos = _read_varint(buffer, pos)
+        return _unzigzag(n), pos
+    if kind == FLOAT:
+        return _f64.unpack_from(buffer, pos)[0], pos + _f64.size
+    if kind == OBJECT:
+        length, pos = _read_varint(buffer, pos)
+        return pickle.loads(buffer[pos:pos + length]), pos + length
+    raise ValueError(f'invalid value kind {kind}')
+
+
+def decode(buffer, source=None, base=0):
+    '''
+    the data encoded in buffer (bytes, bytearray or memoryview) by encode(), source
+    must be the one given to encode() when there was one. slower than pickle.loads().
+    '''
+    buffer = memoryview(buffer)
+    tags, pos = _read_header(buffer)
+    read = _read_varint
+
+    # builders are [kind, remaining children, children, tag, base of the parent],
+    # base is the index of the innermost data
+    builders = []
+    value = None
+    while True:
+        kind = buffer[pos]
+        pos += 1
+        if kind == DATA:
+            tag_id, pos = read(buffer, pos)
+            delta, pos = read(buffer, pos)
+            index = base - _unzigzag(delta)
+            if buffer[pos] != SPAN:
+                builders.append([DATA, 1, [], tags[tag_id], base])
+                base = index
+                continue
+            length, pos = read(buffer, pos + 1)
+            value = (source[index - length:index], tags[tag_id], index)
+
+        elif kind == LIST or kind == TUPLE:
+            count, pos = read(buffer, pos)
+            _, pos = read(buffer, pos)
+            if count:
+                builders.append([kind, count, [], None, None])
+                continue
+            value = [] if kind == LIST else ()
+
+        else:
+            value, pos = _read_scalar(buffer, pos, kind, source)
+
+        # hand the value to its parents, closing every builder it completes
+        while builders:
+            builder = builders[-1]
+            builder[2].append(value)
+            builder[1] -= 1
+            if builder[1]:
+                break
+            builders.pop()
+            kind, _, children, tag, outer = builder
+            if kind == DATA:
+                value = (children[0], tag, base)
+                base = outer
+            elif kind == LIST:
+                value = children
+            else:
+                value = tuple(children)
+
+        if not builders:
+            return value
+
+
+class LazyTree:
+    '''
+    reads an encoded tree without decoding it up front: data and lists come out as
+    LazyData and LazyList views over the buffer, other values are decoded when reached.
+    the buffer isnt copied.
+    '''
+    def __init__(self, buffer, source=None):
+        self.buffer = memoryview(buffer)
+        self.source = source
+        self.tags, self.start = _read_header(self.buffer)
+
+    @property
+    def root(self):
+        return self.value_at(self.start)[0]
+
+    def value_at(self, pos, base=0):
+        '''
+        (value, position after it) of the value encoded at pos, base is the index
+        of the data it's in
+        '''
+        buffer = self.buffer
+        kind = buffer[pos]
+        if kind == DATA:
+            return LazyData(self, pos, base), self.skip(pos)
+        if kind == LIST or kind == TUPLE:
+            view = LazyList(self, pos, base)
+            return view, view.end
+        return _read_scalar(buffer, pos + 1, kind, self.source, base)
+
+    def skip(self, pos):
+        '''
+        position after the value encoded at pos
+        '''
+        buffer = self.buffer
+        while True:
+            kind = buffer[pos]
+            if kind == DATA:
+                _, pos = _read_varint(buffer, pos + 1)
+                _, pos = _read_varint(buffer, pos)
+                continue
+            if kind == LIST or kind == TUPLE:
+                _, pos = _read_varint(buffer, pos + 1)
+                size, pos = _read_varint(buffer, pos)
+                return pos + size
+            if kind == SPAN:
+                return _read_varint(buffer, pos + 1)[1]
+            return _read_scalar(buffer, pos + 1, kind, self.source)[1]
+
+    def materialize(self, pos=None, base=0):
+        '''
+        fully decodes the value at pos, the whole tree by default
+        '''
+        if pos is None:
+            return decode(self.buffer, self.source)
+
+        # a standalone buffer holding the value, with the tag table of the tree
+        buffer = self.buffer
+        return decode(b''.join((buffer[:self.start], buffer[pos:self.skip(pos)])), self.source, base)
+
+
+class LazyData:
+    '''
+    (result, tag, index) read from a LazyTree, indexable like the tuple
+    '''
+    __slots__ = ('tree', 'pos', 'base', 'tag', 'index', '_result_pos')
+
+    def __init__(self, tree, pos, base):
+        buffer = tree.buffer
+        self.tree = tree
+        self.pos = pos
+        self.base = base
+        tag_id, pos = _read_varint(buffer, pos + 1)
+        delta, self._result_pos = _read_varint(buffer, pos)
+        self.tag = tree.tags[tag_id]
+        self.index = base - _unzigzag(delta)
+
+    @property
+    def result(self):
+        return self.tree.value_at(self._result_pos, self.index)[0]
+
+    def __getitem__(self, i):
+        return (self.result, self.tag, self.index)[i]
+
+    def __len__(self):
+        return 3
+
+    def materialize(self):
+        return self.tree.materialize(self.pos, self.base)
+
+    def __repr__(self):
+        return f'LazyData({self.tag!r}, {self.index})'
+
+
+class LazyList:
+    '''
+    list (or tuple) read from a LazyTree, the positions of the items are found on first use
+    '''
+    __slots__ = ('tree', 'pos', 'base', 'kind', 'count', 'start', 'end', '_offsets')
+
+    def __init__(self, tree, pos, base):
+        buffer = tree.buffer
+        self.tree = tree
+        self.pos = pos
+        self.base = base
+        self.kind = buffer[pos]
+        self.count, pos = _read_varint(buffer, pos + 1)
+        size, self.start = _read_varint(buffer, pos)
+        self.end = self.start + size
+        self._offsets = None
+
+    def offsets(self):
+        if self._offsets is None:
+            offsets = []
+            pos = self.start
+            for _ in range(self.count):
+                offsets.append(pos)
+                pos = self.tree.skip(pos)
+            self._offsets = offsets
+        return self._offsets
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.tree.value_at(pos, self.base)[0] for pos in self.offsets()[i]]
+        return self.tree.value_at(self.offsets()[i], self.base)[0]
+
+    def __iter__(self):
+        pos = self.start
+        for _ in range(self.count):
+            value, pos = self.tree.value_at(pos, self.base)
+            yield value
+
+    def materialize(self):
+        return self.tree.materialize(self.pos, self.base)
+
+    def __repr__(self):
+        return f'LazyList({self.count} items)'
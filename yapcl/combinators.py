@@ -1,10 +1,13 @@
 import inspect
 import re
+from contextvars import ContextVar
 from types import FunctionType
 from functools import wraps
+from threading import Lock
 from . cache import cached
-from . context import GlobalContext
-from . errors import ParserError
+from . context import GlobalContext, ParseContext, current_parse
+from . errors import ParserError, RecoveredError, CutError
+from . lines import LineIndex
 from . debug import trace_parser
 
 
@@ -39,6 +42,22 @@ def _make_parser(obj):
     raise ValueError(f'Invalid parser type {obj}')
 
 
+# parses with actions running in any thread. nodes only look for the reducing function
+# of their parse while there are some, as reduce = _reducer() if _reducing else None
+_reducing = 0
+_reducing_lock = Lock()
+# the reducing function of the running parse, None unless parse() was given actions.
+# set once per parse by Parser._run(), _reducer is the bare ContextVar.get
+_current_reducer = ContextVar('yapcl_current_reducer', default=None)
+_reducer = _current_reducer.get
+
+
+def _count_reducing(n):
+    global _reducing
+    with _reducing_lock:
+        _reducing += n
+
+
 def _overridable(method):
     @wraps(method)
     def decorated(self, *args, **kwargs):
@@ -56,14 +75,20 @@ class Parser:
 
     max_repr_size = 75
 
+    # describes what the parser does for code that inspects grammars (see batch.fuse()).
+    # builtin combinators set it to a tuple starting with their name, followed by their
+    # arguments, e.g. ('seq', parsers, ignore, capture, auto_capture). None means opaque.
+    node = None
+
     def __init__(self, func):
         self.funcname = func.__name__
         self._overrides = {}
         func.parser_obj = self
-        if GlobalContext.trace_file:
-            stack = inspect.stack(context=GlobalContext.trace_code_context)
+        trace_file = GlobalContext.setting('trace_file')
+        if trace_file:
+            stack = inspect.stack(context=GlobalContext.setting('trace_code_context'))
             for frame in stack:
-                if frame.filename == GlobalContext.trace_file:
+                if frame.filename == trace_file:
                     code_context = frame.code_context
                     context_line_index = frame.index
                     func = trace_parser(func, code_context, context_line_index, frame.lineno, frame.filename)
@@ -74,9 +99,111 @@ class Parser:
     def set_func(self, func):
         self.func = func
 
-    def parse(self, string):
-        data = (None, None, 0)
-        return self.func(data, string)
+    def parse(self, string, index=0, actions=None, stats=None, cache=None):
+        '''
+        parses string starting at index and returns the data (result, tag, index).
+        with actions, a visitor object, returns the value computed by its on_<tag> methods
+        instead, see actions.Reducer.
+        with stats, a stats.ParseStats, the parse is recorded in it.
+        with cache, a cache.DocumentCache, the result is looked up there first. parses with
+        actions dont use the cache, their values can depend on the visitor.
+        '''
+        context = ParseContext(string)
+        if actions is not None:
+            context.use_actions(actions)
+
+        if cache is None and stats is None:
+            return self._run(context, index)
+
+        run = lambda: self._run(context, index)
+        if cache is not None and actions is None:
+            run = lambda: self._cached_run(cache, context, index)
+
+        if stats is not None:
+            return stats.observe(run, context, index)
+        return run()
+
+    def _cached_run(self, cache, context, index):
+        try:
+            data = cache.fetch(self, context.string, index, lambda: self._run(context, index))
+        except ParserError as e:
+            context.locate(e)
+            raise
+
+        context.end = data[2]
+        return data
+
+    def _run(self, context, index):
+        reduce = context.reduce
+        if reduce is not None:
+            _count_reducing(1)
+
+        # what context.active() does, without a generator for every parse. the reducer is
+        # set even when None, a parse run inside another one doesnt reduce with its actions
+        token = current_parse.set(context)
+        reduce_token = _current_reducer.set(reduce)
+        try:
+            data = self.func((None, None, index), context.string)
+        except ParserError as e:
+            context.locate(e)
+            raise
+        finally:
+            current_parse.reset(token)
+            _current_reducer.reset(reduce_token)
+            context.close()
+            if reduce is not None:
+                _count_reducing(-1)
+
+        context.end = data[2]
+        if reduce is not None:
+            return reduce(data)
+        return data
+
+    def parse_async(self, reader, **kwargs):
+        '''
+        awaitable version of parse() reading from an async stream, see streams.parse_async()
+        '''
+        from . streams import parse_async
+        return parse_async(self, reader, **kwargs)
+
+    def iter_parse_async(self, reader, **kwargs):
+        '''
+        async iterator over the items parsed from an async stream, see streams.iter_parse_async()
+        '''
+        from . streams import iter_parse_async
+        return iter_parse_async(self, reader, **kwargs)
+
+    def parse_vm(self, string, index=0):
+        '''
+        same as parse(), but runs the grammar on the instruction machine in vm.py, which
+        doesnt recurse and so isnt limited by the recursion limit. the grammar is compiled
+        on the first call, assign every RecursionContainer rule before calling this.
+        '''
+        program = self.__dict__.get('_program')
+        if program is None:
+            from . vm import compile_grammar
+            program = self._program = compile_grammar(self)
+        return program.parse(string, index)
+
+    def parse_batch(self, strings, values=False, full=False, tags=False):
+        '''
+        parses many strings at once, see batch.parse_batch()
+        '''
+        from . batch import parse_batch
+        return parse_batch(self, strings, values, full, tags)
+
+    def parse_partial(self, string):
+        '''
+        parses the string and returns (data, errors), where errors is the list of
+        RecoveredError nodes left in the tree by recover(), in input order.
+        '''
+        data = self.parse(string)
+        errors = collect_errors(data)
+        if errors and isinstance(string, str):
+            lines = LineIndex(string)
+            for error in errors:
+                error.lines = lines
+        return data, errors
 
     def override(self, func, name=None):
         if name:
@@ -195,11 +322,11 @@ class Parser:
         return sepby(self, separator, mi, ma)
 
     @_overridable
-    def leftassoc(self, *parsers, mi=0, ma=float('inf')):
+    def leftassoc(self, *parsers, mi=0, ma=float('inf'), split=False):
         if len(parsers) == 1:
-            return leftassoc(self, parsers[0], mi, ma)
+            return leftassoc(self, parsers[0], mi, ma, split=split)
         else:
-            return leftassoc(self, either(*parsers), mi, ma)
+            return leftassoc(self, either(*parsers), mi, ma, split=split)
 
     @_overridable
     def repeat(self, count):
@@ -209,10 +336,18 @@ class Parser:
     def ahead(self, other):
         return lookahead(self, other)
 
+    @_overridable
+    def not_ahead(self, other):
+        return lookahead(self, not_followed_by(other))
+
     @_overridable
     def error_message(self, msg):
         return error_message(self, msg)
 
+    @_overridable
+    def recover(self, sync, tag='error', consume_sync=True):
+        return recover(self, sync, tag, consume_sync)
+
     @_overridable
     def map(self, func):
         return map(self, func)
@@ -236,6 +371,7 @@ def regex(pattern):
             raise ParserError(regex_parser, index)
 
     regex_parser.__repr__ = lambda self: f'regex({repr(pattern.pattern)})'
+    regex_parser.node = ('regex', pattern)
 
     return regex_parser
 
@@ -252,12 +388,302 @@ def lit(text):
             return (text, None, index + le)
 
     literal_parser.__repr__ = lambda self: f'lit({repr(text)})'
+    literal_parser.node = ('lit', text)
 
     return literal_parser
 
 
+# largest char_range still scanned with a set of characters instead of comparisons
+_MAX_RANGE_SET = 1024
+
+
+def _scanner(accept):
+    '''
+    returns scan(string, index, stop), the end of the run of accepted characters starting
+    at index, never past stop. accept is a set of characters or a predicate.
+    sets are scanned with str.lstrip over growing chunks, so long runs cost a few C calls.
+    '''
+    if callable(accept):
+        def scan(string, index, stop):
+            while index < stop and accept(string[index]):
+                index += 1
+            return index
+
+        return scan
+
+    chars = ''.join(accept)
+
+    def scan(string, index, stop):
+        chunk_size = 64
+        while index < stop:
+            chunk = string[index:min(stop, index + chunk_size)]
+            rest = chunk.lstrip(chars)
+            index += len(chunk) - len(rest)
+            if rest:
+                break
+            chunk_size = min(chunk_size * 2, 65536)
+        return index
+
+    return scan
+
+
+def _char_class(parser):
+    '''
+    the set (or predicate) of characters accepted by a single character parser, None for other parsers
+    '''
+    node = parser.node
+    if node is None:
+        return None
+    if node[0] == 'char_in':
+        return node[1]
+    if node[0] == 'char_range':
+        _, first, last = node
+        if ord(last) - ord(first) < _MAX_RANGE_SET:
+            return frozenset(chr(c) for c in range(ord(first), ord(last) + 1))
+        return lambda char: first <= char <= last
+    return None
+
+
+def char_in(chars):
+    '''
+    matches one character from chars
+    '''
+    charset = frozenset(chars)
+
+    @Parser
+    def char_in_parser(data, string):
+        index = data[2]
+        if index < len(string) and string[index] in charset:
+            return (string[index], None, index + 1)
+        raise ParserError(char_in_parser, index)
+
+    char_in_parser.__repr__ = lambda self: f'char_in({repr("".join(sorted(charset)))})'
+    char_in_parser.node = ('char_in', charset)
+
+    return char_in_parser
+
+
+def char_range(first, last):
+    '''
+    matches one character between first and last, inclusive
+    '''
+    @Parser
+    def char_range_parser(data, string):
+        index = data[2]
+        if index < len(string) and first <= string[index] <= last:
+            return (string[index], None, index + 1)
+        raise ParserError(char_range_parser, index)
+
+    char_range_parser.__repr__ = lambda self: f'char_range{first, last}'
+    char_range_parser.node = ('char_range', first, last)
+
+    return char_range_parser
+
+
+def take_while(accept, mi=0, ma=float('inf')):
+    '''
+    matches the longest run of characters in accept, a set of characters (or a string)
+    or a predicate taking one character. fails if the run is shorter than mi.
+    '''
+    if not callable(accept):
+        accept = frozenset(accept)
+    scan = _scanner(accept)
+
+    @Parser
+    def take_while_parser(data, string):
+        index = data[2]
+        end = scan(string, index, min(len(string), index + ma))
+        if end - index < mi:
+            raise ParserError(take_while_parser, index)
+        return (string[index:end], None, end)
+
+    if callable(accept):
+        take_while_parser.__repr__ = lambda self: f'take_while({accept.__name__}, {mi}, {ma})'
+    else:
+        take_while_parser.__repr__ = lambda self: f'take_while({repr("".join(sorted(accept)))}, {mi}, {ma})'
+    take_while_parser.node = ('take_while', accept, mi, ma)
+
+    return take_while_parser
+
+
+def take_until(text):
+    '''
+    matches everything up to, not including, the first occurrence of text. fails if text never occurs.
+    '''
+    @Parser
+    def take_until_parser(data, string):
+        index = data[2]
+        end = string.find(text, index)
+        if end == -1:
+            raise ParserError(take_until_parser, index)
+        return (string[index:end], None, end)
+
+    take_until_parser.__repr__ = lambda self: f'take_until({repr(text)})'
+    take_until_parser.node = ('take_until', text)
+
+    return take_until_parser
+
+
+def balanced(open, close, quotes='"\'', escape='\\'):
+    '''
+    matches from open to its matching close, counting the nested open/close pairs.
+    delimiters inside string literals, started and ended by one of the quotes
+    characters, dont count. inside literals escape skips the next character.
+    the scan jumps between delimiters with regexes, nothing inside is parsed.
+    '''
+    if open == close:
+        raise ValueError('balanced() needs different open and close delimiters')
+
+    delimiters = sorted((open, close, *quotes), key=len, reverse=True)
+    find_delimiter = re.compile('|'.join(re.escape(d) for d in delimiters)).search
+    ends = {}
+    for quote in quotes:
+        q = re.escape(quote)
+        if escape:
+            e = re.escape(escape)
+            ends[quote] = re.compile(f'(?:[^{q}{e}]|{e}.)*{q}', re.DOTALL).match
+        else:
+            ends[quote] = re.compile(f'[^{q}]*{q}').match
+
+    @Parser
+    def balanced_parser(data, string):
+        index = data[2]
+        if not string.startswith(open, index):
+            raise ParserError(balanced_parser, index)
+
+        depth = 0
+        pos = index
+        while True:
+            match = find_delimiter(string, pos)
+            if match is None:
+                raise ParserError(close, len(string))
+            token = match.group()
+            pos = match.end()
+            if token == open:
+                depth += 1
+            elif token == close:
+                depth -= 1
+                if depth == 0:
+                    return (string[index:pos], None, pos)
+            else:
+                match = ends[token](string, pos)
+                if match is None:
+                    raise ParserError(token, len(string))
+                pos = match.end()
+
+    balanced_parser.__repr__ = lambda self: f'balanced{open, close}'
+    balanced_parser.node = ('balanced', open, close, quotes, escape)
+
+    return balanced_parser
+
+
+def _trailing_ignore(parser):
+    '''
+    the ignore parser skipped at the end of a match of parser, None when there's none
+    '''
+    node = parser.node
+    while node is not None:
+        kind = node[0]
+        if kind == 'seq':
+            return node[2]
+        if kind in ('many', 'sepby', 'leftassoc'):
+            return node[5]
+        if kind in ('map', 'tag', 'discard', 'deepjoin', 'error_message'):
+            node = node[1].node
+        elif kind == 'ref' and node[2] in node[1]:
+            node = node[1][node[2]].node
+        else:
+            return None
+    return None
+
+
+class Deferred:
+    '''
+    result of lazy(): the span of the input skipped during the parse. force() parses it
+    with the real parser on first call and returns what parse() would have, the value
+    computed by the actions when the parse had any.
+    '''
+    __slots__ = ('parser', 'string', 'start', 'end', 'actions', '_value')
+
+    def __init__(self, parser, string, start, end, actions):
+        self.parser = parser
+        self.string = string
+        self.start = start
+        self.end = end
+        self.actions = actions
+
+    def force(self):
+        try:
+            return self._value
+        except AttributeError:
+            pass
+
+        context = ParseContext(self.string)
+        if self.actions is not None:
+            context.use_actions(self.actions)
+
+        value = self.parser._run(context, self.start)
+        if context.end != self.end and not self._trailing_ignore(context.end):
+            error = ParserError(f'end of the block at {self.end}', context.end)
+            context.locate(error)
+            raise error
+
+        self._value = value
+        return value
+
+    def _trailing_ignore(self, end):
+        '''
+        True if the parse only went past the block by skipping its ignore after it
+        '''
+        if end < self.end:
+            return False
+        ignore = _trailing_ignore(self.parser)
+        if ignore is None:
+            return False
+        try:
+            return ignore.func((None, None, self.end), self.string)[2] == end
+        except ParserError:
+            return False
+
+    @property
+    def forced(self):
+        return hasattr(self, '_value')
+
+    def __repr__(self):
+        return f'Deferred({self.parser}, {self.start}, {self.end})'
+
+
+def lazy(parser, skip=None):
+    '''
+    skips the input matched by skip (by default balanced('(', ')')) without parsing it
+    with parser, the result is a Deferred that does it when forced. for the blocks of big
+    documents that are rarely looked at. parser must match what skip does, the error
+    for input only skip accepts comes from force().
+    '''
+    parser = _make_parser(parser)
+    skip = balanced('(', ')') if skip is None else _make_parser(skip)
+    skip_func = skip.func
+
+    @Parser
+    def lazy_parser(data, string):
+        start = data[2]
+        end = skip_func(data, string)[2]
+        context = current_parse.get() if _reducing else None
+        actions = None if context is None else context.actions
+        return (Deferred(parser, string, start, end, actions), None, end)
+
+    lazy_parser.__repr__ = lambda self: f'lazy{parser, skip}'
+    lazy_parser.node = ('lazy', parser, skip)
+
+    return lazy_parser
+
+
 def either(*parsers):
-    funcs = _parser_funcs_unpack(parsers)
+    alternatives = tuple(_make_parser(p) for p in parsers)
+    funcs = [p.func for p in alternatives]
+    # replaces the ordered tries when set, see dispatch.EitherProfile. it's put alone in
+    # funcs, the tries dont pay for a check
+    guided = None
 
     @Parser
     def either_parser(data, string):
@@ -265,12 +691,27 @@ def either(*parsers):
         for func in funcs:
             try:
                 return func(data, string)
+            except CutError:
+                raise
             except ParserError as e:
                 errors.append(e.expected)
 
+        if guided is not None:
+            # already the errors of every alternative
+            raise ParserError(errors[0], data[2])
         raise ParserError(errors, data[2])
 
+    def guide(func):
+        '''
+        makes either_parser call func(data, string) instead, None restores the ordered tries
+        '''
+        nonlocal guided
+        guided = func
+        funcs[:] = [p.func for p in alternatives] if func is None else [func]
+
     either_parser.__repr__ = lambda self: f'either{parsers}'
+    either_parser.node = ('either', alternatives)
+    either_parser.guide = guide
 
     either_parser.__or__ = lambda self, other: either(*parsers, other)
 
@@ -287,6 +728,13 @@ def seq(*parsers, ignore=None, capture=None, auto_capture=False):
     parsers = tuple(_make_parser(p) for p in parsers)
     funcs = _parser_funcs_unpack(parsers)
 
+    # identity checks, Parser.__eq__ builds a tag parser
+    cut_indexes = [i for i, p in enumerate(parsers) if p is cut]
+    if cut_indexes:
+        after_cut = cut_indexes[0] + 1
+        funcs = funcs[:after_cut] + [_committed(func) for func in funcs[after_cut:]]
+
+    ignore = GlobalContext.ignore_parser(ignore)
     ignore_fn = GlobalContext.make_ignore_fn(ignore)
 
     @SeqParser
@@ -310,9 +758,14 @@ def seq(*parsers, ignore=None, capture=None, auto_capture=False):
             result, tag, _ = result[capture]
             return (result, tag, data[2])
 
+        reduce = _reducer() if _reducing else None
+        if reduce is not None:
+            result = [reduce(item) for item in result]
+
         return (result, None, data[2])
 
     sequence_parser.__repr__ = lambda self: f'seq{parsers}'
+    sequence_parser.node = ('seq', parsers, ignore, capture, auto_capture)
     sequence_parser.capture = lambda index: seq(*parsers, capture=index)
     sequence_parser.__rshift__ = lambda self, other: seq(
         *parsers[:-1], parsers[-1].discard(True), other, auto_capture=True)
@@ -323,8 +776,37 @@ def seq(*parsers, ignore=None, capture=None, auto_capture=False):
 
 
 def many(parser, mi=0, ma=float('inf'), capture=None, ignore=None):
-    func = _parser_funcs_unpack(parser, multiple=False)
+    parser = _make_parser(parser)
+    func = parser.func
+    ignore = GlobalContext.ignore_parser(ignore)
     ignore_fn = GlobalContext.make_ignore_fn(ignore)
+    accept = _char_class(parser) if ignore is None else None
+
+    if accept is not None:
+        scan = _scanner(accept)
+
+        @SeqParser
+        def many_parser(data, string):
+            # a single scan over the whole run instead of one call per character
+            index = data[2]
+            end = scan(string, index, min(len(string), index + ma))
+            if end - index < mi:
+                raise ParserError(parser, end)
+
+            if capture is not None:
+                return (string[index:end][capture], None, end)
+
+            if _reducing and _reducer() is not None:
+                return (list(string[index:end]), None, end)
+
+            result = [(char, None, i) for i, char in enumerate(string[index:end], index + 1)]
+            return (result, None, end)
+
+        many_parser.__repr__ = lambda self: f'many{parser, mi, ma}'
+        many_parser.node = ('many', parser, mi, ma, capture, ignore)
+        many_parser.capture = lambda index: many(parser, mi, ma, capture=index)
+
+        return many_parser
 
     @SeqParser
     def many_parser(data, string):
@@ -341,6 +823,8 @@ def many(parser, mi=0, ma=float('inf'), capture=None, ignore=None):
 
                 data = ignore_fn(data, string)
 
+            except CutError:
+                raise
             except ParserError as e:
                 error = e
                 break
@@ -350,6 +834,10 @@ def many(parser, mi=0, ma=float('inf'), capture=None, ignore=None):
                 result, tag, _ = result[capture]
                 return (result, tag, data[2])
 
+            reduce = _reducer() if _reducing else None
+            if reduce is not None:
+                result = [reduce(item) for item in result]
+
             return (result, None, data[2])
 
         if error:
@@ -358,14 +846,18 @@ def many(parser, mi=0, ma=float('inf'), capture=None, ignore=None):
         raise ParserError(many_parser, data[2])
 
     many_parser.__repr__ = lambda self: f'many{parser, mi, ma}'
+    many_parser.node = ('many', parser, mi, ma, capture, ignore)
     many_parser.capture = lambda index: many(parser, mi, ma, capture=index)
 
     return many_parser
 
 
 def sepby(parser, separator, mi=0, ma=float('inf'), ignore=None):
-    func = _parser_funcs_unpack(parser)
-    sep_func = _parser_funcs_unpack(separator)
+    parser = _make_parser(parser)
+    separator = _make_parser(separator)
+    func = parser.func
+    sep_func = separator.func
+    ignore = GlobalContext.ignore_parser(ignore)
     ignore_fn = GlobalContext.make_ignore_fn(ignore)
 
     @Parser
@@ -383,11 +875,17 @@ def sepby(parser, separator, mi=0, ma=float('inf'), ignore=None):
                 data = sep_func(data, string)
                 data = ignore_fn(data, string)
 
+            except CutError:
+                raise
             except ParserError as e:
                 error = e
                 break
 
         if len(result) >= mi:
+            reduce = _reducer() if _reducing else None
+            if reduce is not None:
+                result = [reduce(item) for item in result]
+
             return (result, None, data[2])
 
         elif error:
@@ -396,22 +894,179 @@ def sepby(parser, separator, mi=0, ma=float('inf'), ignore=None):
         else:
             raise ParserError(sep_parser, data[2])
 
-    sep_parser.__repr__ = lambda self: f'sepby{parser, separator, min, max}'
+    sep_parser.__repr__ = lambda self: f'sepby{parser, separator, mi, ma}'
+    sep_parser.node = ('sepby', parser, separator, mi, ma, ignore)
 
     return sep_parser
 
 
-def leftassoc(start, parser, mi=0, ma=float('inf'), ignore=None):
-    func_start = _parser_funcs_unpack(start, multiple=False)
+def _split_alternative(alternative):
+    '''
+    (operator, operand, seq ignore, tag) if alternative looks like tag(op >> operand, tag)
+    or op >> operand, None otherwise
+    '''
+    new_tag = None
+    node = alternative.node
+    if node is not None and node[0] == 'tag':
+        _, alternative, new_tag = node
+        node = alternative.node
+
+    if node is None or node[0] != 'seq':
+        return None
+
+    _, parsers, ignore, capture, auto_capture = node
+    if len(parsers) != 2 or capture is not None or not auto_capture:
+        return None
+
+    operator, operand = parsers
+    if operator.node is None or operator.node[0] != 'discard':
+        return None
+
+    return operator, operand, ignore, new_tag
+
+
+def _split_step(parser):
+    '''
+    function doing the same as parser.func for an either of op >> operand alternatives,
+    but the first character decides which literal operators are tried and an operand that
+    failed at some index isnt parsed again there for the next alternatives.
+    '''
+    node = parser.node
+    if node is None or node[0] != 'either':
+        return parser.func
+
+    steps = []
+    for alternative in node[1]:
+        split = _split_alternative(alternative)
+        if split is None:
+            steps.append((alternative.func, None, None, None, None, None))
+            continue
+
+        operator, operand, ignore, new_tag = split
+        inner = operator.node[1]
+        text = inner.node[1] if inner.node is not None and inner.node[0] == 'lit' else ''
+        steps.append((operator.func, operand.func, id(operand), ignore, new_tag, (text[:1], inner, text)))
+
+    ignores = {id(step[3]) for step in steps if step[1] is not None}
+    if not ignores:
+        return parser.func
+
+    # literal operators only get a dispatch table when every alternative skips the same
+    # things before its operator, the first character is then the same for all of them
+    dispatch = len(ignores) == 1
+    # a seq built without ignore skips nothing, whatever ignore is active here
+    ignore_fns = [None if step[1] is None else
+                  (lambda data, string: data) if step[3] is None else GlobalContext.make_ignore_fn(step[3])
+                  for step in steps]
+    pre_ignore_fn = next(fn for fn in ignore_fns if fn is not None)
+
+    everything = list(range(len(steps)))
+    generic = [i for i, step in enumerate(steps) if step[1] is None or not step[5][0]]
+    table = {}
+    if dispatch:
+        for step in steps:
+            if step[1] is not None and step[5][0]:
+                char = step[5][0]
+                table[char] = [i for i, other in enumerate(steps)
+                               if other[1] is None or other[5][0] in ('', char)]
+
+    def split_step(data, string):
+        index = data[2]
+        if dispatch:
+            pre = pre_ignore_fn(data, string)
+            candidates = table.get(string[pre[2]:pre[2] + 1], generic)
+        else:
+            candidates = everything
+
+        failed = {}
+        operand_errors = {}
+
+        for i in candidates:
+            func, operand_func, operand_id, _, new_tag, _ = steps[i]
+            if operand_func is None:
+                try:
+                    return func(data, string)
+                except CutError:
+                    raise
+                except ParserError as e:
+                    failed[i] = e.expected
+                    continue
+
+            ignore_fn = ignore_fns[i]
+            try:
+                text = steps[i][5][2]
+                if dispatch and text:
+                    # a literal operator, matched here instead of through discard(lit())
+                    if not string.startswith(text, pre[2]):
+                        failed[i] = steps[i][5][1]
+                        continue
+                    after = ignore_fn((Discarded, None, pre[2] + len(text)), string)
+                else:
+                    after = ignore_fn(func(pre if dispatch else ignore_fn(data, string), string), string)
+
+                key = (operand_id, after[2])
+                if key in operand_errors:
+                    failed[i] = operand_errors[key]
+                    continue
+
+                try:
+                    result = operand_func(after, string)
+                except CutError:
+                    raise
+                except ParserError as e:
+                    failed[i] = operand_errors[key] = e.expected
+                    continue
+
+            except CutError:
+                raise
+            except ParserError as e:
+                failed[i] = e.expected
+                continue
+
+            # what seq(discard(op), operand, auto_capture=True) and tag() would return
+            end = ignore_fn(result, string)[2]
+            if result[0] == Discarded:
+                result = ([], None, end)
+            else:
+                result = (*result[:2], end)
+
+            if new_tag is None:
+                return result
+            if result[1] is None:
+                return (result[0], new_tag, end)
+
+            reduce = _reducer() if _reducing else None
+            if reduce is not None:
+                return (reduce(result), new_tag, end)
+            return (result, new_tag, end)
+
+        # the operators skipped by the dispatch would have failed
+        errors = [failed[i] if i in failed else steps[i][5][1] for i in range(len(steps))]
+        raise ParserError(errors, index)
+
+    return split_step
+
+
+def leftassoc(start, parser, mi=0, ma=float('inf'), ignore=None, split=False):
+    '''
+    start followed by up to ma (at least mi) matches of parser, each one nested with the
+    previous data as ([previous, result], tag, index).
+    with split=True, alternatives of parser shaped like tag(op >> operand, tag) are
+    dispatched on their operator, and an operand is parsed at most once per position,
+    the results are the same.
+    '''
+    start = _make_parser(start)
+    func_start = start.func
     if isinstance(parser, (list, tuple)):
-        func = either(*parser).func
-    else:
-        func = _parser_funcs_unpack(parser)
+        parser = either(*parser)
+    func = _split_step(parser) if split else parser.func
 
+    ignore = GlobalContext.ignore_parser(ignore)
     ignore_fn = GlobalContext.make_ignore_fn(ignore)
 
     @Parser
     def lassoc_parser(data, string):
+        reduce = _reducer() if _reducing else None
         data = ignore_fn(data, string)
         data = func_start(data, string)
 
@@ -422,9 +1077,11 @@ def leftassoc(start, parser, mi=0, ma=float('inf'), ignore=None):
 
                 result, tag, index = func(data, string)
                 if not result == Discarded:
-                    data = ([data, result], tag, index)
+                    data = ([data if reduce is None else reduce(data), result], tag, index)
                     n += 1
 
+            except CutError:
+                raise
             except ParserError as e:
                 error = e
                 break
@@ -440,16 +1097,19 @@ def leftassoc(start, parser, mi=0, ma=float('inf'), ignore=None):
             raise ParserError(lassoc_parser, data[2])
 
     lassoc_parser.__repr__ = lambda self: f'leftassoc{start, parser, mi, ma}'
+    lassoc_parser.node = ('leftassoc', start, parser, mi, ma, ignore)
 
     return lassoc_parser
 
 
 def concat(*parsers):
-    funcs = _parser_funcs_unpack(parsers)
     sequences = [isinstance(p, (SeqParser, list, tuple)) for p in parsers]
+    parsers = tuple(_make_parser(p) for p in parsers)
+    funcs = [p.func for p in parsers]
 
     @SeqParser
     def concat_parser(data, string):
+        reduce = _reducer() if _reducing else None
         result = []
         for func, is_seq in zip(funcs, sequences):
             data = func(data, string)
@@ -458,17 +1118,19 @@ def concat(*parsers):
                     result.extend(data[0])
 
                 else:
-                    result.append(data)
+                    result.append(data if reduce is None else reduce(data))
 
         return (result, None, data[2])
 
     concat_parser.__repr__ = lambda self: f'cocnat{parsers}'
+    concat_parser.node = ('concat', parsers, tuple(sequences))
 
     return concat_parser
 
 
 def map(parser, function):
-    func = _parser_funcs_unpack(parser, multiple=False)
+    parser = _make_parser(parser)
+    func = parser.func
 
     @Parser
     def map_parser(data, string):
@@ -476,27 +1138,34 @@ def map(parser, function):
         return (function(result), tag, index)
 
     map_parser.__repr__ = lambda self: f'map{parser, function}'
+    map_parser.node = ('map', parser, function)
     return map_parser
 
 
 def tag(parser, new_tag):
-    func = _parser_funcs_unpack(parser, multiple=False)
+    parser = _make_parser(parser)
+    func = parser.func
 
     @Parser
     def tag_parser(data, string):
         result, tag, index = func(data, string)
         if tag is None:
             return (result, new_tag, index)
-        else:
-            return ((result, tag, index), new_tag, index)
+
+        reduce = _reducer() if _reducing else None
+        if reduce is not None:
+            return (reduce((result, tag, index)), new_tag, index)
+        return ((result, tag, index), new_tag, index)
 
     # tag_parser.__repr__ = lambda self: f'tag{parser, new_tag}'
     tag_parser.__repr__ = lambda self: f'tag{parser, new_tag}'
+    tag_parser.node = ('tag', parser, new_tag)
     return tag_parser
 
 
 def discard(parser):
-    func = _parser_funcs_unpack(parser, multiple=False)
+    parser = _make_parser(parser)
+    func = parser.func
 
     @Parser
     def discard_parser(data, string):
@@ -504,50 +1173,143 @@ def discard(parser):
         return (Discarded, tag, index)
 
     discard_parser.__repr__ = lambda self: f'discard({parser})'
+    discard_parser.node = ('discard', parser)
 
     discard_parser.discard = lambda self, should_discard=True: self if should_discard else parser
 
     return discard_parser
 
 
-def deepjoin(parser):
-    func = _parser_funcs_unpack(parser, multiple=False)
+def _join(result):
+    '''
+    concatenates every leaf of a result, iteratively so any nesting depth works
+    '''
+    parts = []
+    stack = [result]
+    while stack:
+        item = stack.pop()
+        while isinstance(item, tuple) and len(item) == 3:
+            item = item[0]
 
-    def join(result):
-        if isinstance(result, tuple) and len(result) == 3:
-            return join(result[0])
+        if isinstance(item, list):
+            stack.extend(reversed(item))
+        else:
+            parts.append(str(item))
 
-        elif isinstance(result, list):
-            return ''.join(join(x) for x in result)
+    return ''.join(parts)
 
-        else:
-            return str(result)
+
+def deepjoin(parser):
+    parser = _make_parser(parser)
+    func = parser.func
 
     @Parser
     def deepstr_parser(data, string):
         result, tag, index = func(data, string)
-        return (join(result), tag, index)
+        return (_join(result), tag, index)
 
     deepstr_parser.__repr__ = lambda self: f'deepstr_parser({parser})'
+    deepstr_parser.node = ('deepjoin', parser)
 
     return deepstr_parser
 
 
+def _lookahead_check(parser):
+    '''
+    function(data, string) returning data when parser matches at its index and raising
+    the error of parser when it doesnt. a cut inside parser doesnt get out of the check
+    '''
+    func = parser.func
+    # compiled on the first parse, once every RecursionContainer rule is assigned
+    recognize = None
+
+    def check(data, string):
+        nonlocal recognize
+        if recognize is None:
+            from . recognize import predicate
+            recognize = predicate(parser)
+        if recognize(string, data[2]) < 0:
+            try:
+                func(data, string)
+            except CutError as e:
+                error = ParserError(e.expected, e.index)
+                error.message = e.message
+                raise error
+        return data
+
+    return check
+
+
 def lookahead(parser1, parser2):
-    func1 = _parser_funcs_unpack(parser1, multiple=False)
-    func2 = _parser_funcs_unpack(parser2, multiple=False)
+    '''
+    parser1, when parser2 matches right after it. parser2 is only recognized (see
+    recognize.py), it's run in full to raise its error when it doesnt match.
+    '''
+    parser1 = _make_parser(parser1)
+    parser2 = _make_parser(parser2)
+    func1 = parser1.func
+    check = _lookahead_check(parser2)
 
     @Parser
     def lookahead_parser(data, string):
-        data = func1(data, string)
-        func2(data, string)
-        return data
+        return check(func1(data, string), string)
 
     lookahead_parser.__repr__ = lambda self: f'lookahead{parser1, parser2}'
+    lookahead_parser.node = ('lookahead', parser1, parser2)
 
     return lookahead_parser
 
 
+def followed_by(parser):
+    '''
+    succeeds without consuming anything where parser matches, fails where it doesnt.
+    parser is only recognized, see recognize.py.
+    '''
+    parser = _make_parser(parser)
+    recognize = None
+
+    @Parser
+    def followed_by_parser(data, string):
+        nonlocal recognize
+        if recognize is None:
+            from . recognize import predicate
+            recognize = predicate(parser)
+        index = data[2]
+        if recognize(string, index) < 0:
+            raise ParserError(followed_by_parser, index)
+        return (Discarded, None, index)
+
+    followed_by_parser.__repr__ = lambda self: f'followed_by({parser})'
+    followed_by_parser.node = ('followed_by', parser)
+
+    return followed_by_parser
+
+
+def not_followed_by(parser):
+    '''
+    succeeds without consuming anything where parser doesnt match, fails where it does.
+    parser is only recognized, see recognize.py.
+    '''
+    parser = _make_parser(parser)
+    recognize = None
+
+    @Parser
+    def not_followed_by_parser(data, string):
+        nonlocal recognize
+        if recognize is None:
+            from . recognize import predicate
+            recognize = predicate(parser)
+        index = data[2]
+        if recognize(string, index) >= 0:
+            raise ParserError(not_followed_by_parser, index)
+        return (Discarded, None, index)
+
+    not_followed_by_parser.__repr__ = lambda self: f'not_followed_by({parser})'
+    not_followed_by_parser.node = ('not_followed_by', parser)
+
+    return not_followed_by_parser
+
+
 def fail(expected):
 
     @Parser
@@ -555,6 +1317,7 @@ def fail(expected):
         raise ParserError(expected, data[2])
 
     fail_aways.__repr__ = lambda self: f'fail({repr(expected)})'
+    fail_aways.node = ('fail', expected)
 
     return fail_aways
 
@@ -566,12 +1329,14 @@ def success(result, tag=None):
         return (result, tag, data[2])
 
     success_always.__repr__ = lambda self: f'success{result, tag}'
+    success_always.node = ('success', result, tag)
 
     return success_always
 
 
 def error_message(parser, msg):
-    func = _parser_funcs_unpack(parser)
+    parser = _make_parser(parser)
+    func = parser.func
 
     @Parser
     def error_override(data, string):
@@ -581,11 +1346,126 @@ def error_message(parser, msg):
             e.message = msg
             raise e
 
-    error_override.__repr__ = lambda self: f'success{parser, msg}'
+    error_override.__repr__ = lambda self: f'error_message{parser, msg}'
+    error_override.node = ('error_message', parser, msg)
 
     return error_override
 
 
+def _resync(string, index, sync_text, sync_func, consume_sync=True):
+    '''
+    returns the index right after the next match of the synchronization parser,
+    or right before it when not consume_sync
+    '''
+    if sync_text is not None:
+        found = string.find(sync_text, index)
+        if found == -1:
+            return len(string)
+        return found + len(sync_text) if consume_sync else found
+
+    for i in range(index, len(string)):
+        try:
+            end = sync_func((None, None, i), string)[2]
+        except ParserError:
+            continue
+        return end if consume_sync else i
+
+    return len(string)
+
+
+def recover(parser, sync, tag='error', consume_sync=True):
+    '''
+    on failure of parser, skips the input up to (and including) the next match of sync
+    and returns an error node (RecoveredError(...), tag, index) instead of raising.
+    meant to be used inside many()/sepby() so that one bad record doesnt abort the parse.
+    with consume_sync=False the skip stops before the match of sync, for a sync that
+    something after the parser has to take, like the separator of a sepby(). a record
+    failing right at the sync is then a zero width error node, dont use it in a many()
+    whose items cant advance past the sync.
+    '''
+    parser = _make_parser(parser)
+    func = parser.func
+    sync_text = sync if isinstance(sync, str) else None
+    sync = _make_parser(sync)
+    sync_func = sync.func
+
+    @Parser
+    def recover_parser(data, string):
+        start = data[2]
+        try:
+            return func(data, string)
+        except ParserError as e:
+            end = _resync(string, max(start, e.index), sync_text, sync_func, consume_sync)
+            # an empty record right at the sync gives a zero width error node, what comes
+            # after (the separator of a sepby) still advances
+            if end <= start and (consume_sync or end >= len(string)):
+                raise e
+            return (RecoveredError(e, start, end), tag, end)
+
+    recover_parser.__repr__ = lambda self: f'recover{parser, sync}'
+    recover_parser.node = ('recover', parser, sync, tag, consume_sync)
+
+    return recover_parser
+
+
+def collect_errors(data):
+    '''
+    returns every RecoveredError found in a parse tree, in input order
+    '''
+    errors = []
+    stack = [data]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, RecoveredError):
+            errors.append(item)
+
+        elif isinstance(item, list):
+            stack.extend(reversed(item))
+
+        elif isinstance(item, tuple) and len(item) == 3:
+            stack.append(item[0])
+
+    return errors
+
+
+def _committed(func):
+    def committed(data, string):
+        try:
+            return func(data, string)
+        except CutError:
+            raise
+        except ParserError as e:
+            error = CutError(e.expected, e.index)
+            error.message = e.message
+            raise error
+
+    return committed
+
+
+@Parser
+def cut(data, string):
+    '''
+    to be used inside seq(), as in seq('def', cut, name, ...). once the parsers before the
+    cut matched, a failure of the parsers after it is raised as a CutError, which enclosing
+    either()s and repetitions dont catch. memo entries before the cut are dropped.
+    '''
+    index = data[2]
+    context = ParseContext.current()
+    if context is not None:
+        for cache in context.caches.values():
+            cache.prune(index)
+
+    return (Discarded, None, index)
+
+
+cut.__repr__ = lambda self: 'cut'
+cut.node = ('cut',)
+
+
+def commit():
+    return cut
+
+
 @Parser
 def eof(data, string):
     if data[2] >= len(string):
@@ -595,6 +1475,7 @@ def eof(data, string):
 
 
 eof.__repr__ = lambda self: 'eof'
+eof.node = ('eof',)
 
 
 @Parser
@@ -603,6 +1484,7 @@ def copy_last(data, string):
 
 
 copy_last.__repr__ = lambda self: 'copy_last'
+copy_last.node = ('copy_last',)
 
 
 def token(match_tag):
@@ -624,6 +1506,7 @@ def token(match_tag):
         raise ParserError(token_parser, data[2] + 1)
 
     token_parser.__repr__ = lambda self: f'token({repr(match_tag)})'
+    token_parser.node = ('token', match_tag)
     return token_parser
 
 
@@ -656,4 +1539,5 @@ class RecursionContainer:
             raise KeyError(f'parser {k} promissed but never assigned.')
 
         promissed.__repr__ = lambda self: f'r.{k}'
+        promissed.node = ('ref', parsers, k)
         return promissed
@@ -1,36 +1,127 @@
 from contextlib import contextmanager
+from contextvars import ContextVar
 import inspect
-from . errors import ParserError
+from . errors import ParserError, CutError
 from . cache import cache_size
+from . lines import LineIndex
+
+_settings = ContextVar('yapcl_settings', default={
+    'ignore': None,
+    'trace_file': None,
+    'trace_code_context': 7,
+    'max_trace_lines': 5,
+})
+
+current_parse = ContextVar('yapcl_current_parse', default=None)
+
+# parser nodes without children, no cut can happen inside them
+_LEAVES = frozenset(['regex', 'lit', 'char_in', 'char_range', 'take_while', 'take_until', 'balanced'])
+
+
+class ParseContext:
+    '''
+    mutable state belonging to a single call to Parser.parse().
+    every parse gets its own context, so one grammar can serve many threads
+    (or nested parses from inside a map()) at the same time.
+    '''
+    __slots__ = ('string', 'caches', 'trace_lines', '_lines', 'actions', 'reduce',
+                 'end', 'memo_hits', 'memo_misses')
+
+    def __init__(self, string):
+        self.string = string
+        self.caches = {}
+        self.trace_lines = []
+        self._lines = None
+        # the visitor and the function reducing data with it (actions.Reducer.reduce)
+        # when the parse was given actions
+        self.actions = None
+        self.reduce = None
+        # where the parse ended, and the memo counters of every cache, known once closed
+        self.end = None
+        self.memo_hits = 0
+        self.memo_misses = 0
+
+    def use_actions(self, visitor):
+        from . actions import Reducer
+        self.actions = visitor
+        self.reduce = Reducer(visitor).reduce
+
+    @property
+    def lines(self):
+        '''
+        LineIndex of the parsed string, shared by everything reported about this parse.
+        None when parsing something other than a str.
+        '''
+        if self._lines is None and isinstance(self.string, str):
+            self._lines = LineIndex(self.string)
+        return self._lines
+
+    def locate(self, error):
+        '''
+        lets error report line and column instead of the raw index
+        '''
+        error.lines = self.lines
+        return error
+
+    @contextmanager
+    def active(self):
+        token = current_parse.set(self)
+        try:
+            yield self
+        finally:
+            current_parse.reset(token)
+            self.close()
+
+    def close(self):
+        if not self.caches:
+            return
+        for stats, cache in self.caches.items():
+            stats.merge(cache)
+            self.memo_hits += cache.hits
+            self.memo_misses += cache.misses
+        self.caches = {}
+
+    @staticmethod
+    def current():
+        return current_parse.get()
 
 
 class GlobalContext:
     '''
-    Class that stores global options and exposes context managers to change global options
+    Class that exposes context managers to change the options used while building parsers.
+    the options are stored in a context variable, so threads building grammars dont see each
+    other's options.
     '''
     def __init__(self):
         assert False, 'Cant instantiate this class'
 
-    _global_ignore_parser = None
     current_context = None
-    trace_lines = []
-    trace_file = None
-    trace_code_context=7
-    max_trace_lines = 5
+
+    @classmethod
+    def setting(cls, name):
+        return _settings.get()[name]
+
+    @classmethod
+    @contextmanager
+    def _settings_override(cls, **values):
+        token = _settings.set({**_settings.get(), **values})
+        try:
+            yield
+        finally:
+            _settings.reset(token)
 
     @classmethod
     @contextmanager
     def ignore(cls, *parsers):
-        from . combinators import _make_parser
+        from . combinators import _make_parser, either
         '''
         to be used as:
         with ignore(whitespace):
             parser_that_ignores_whitespace = seq('foo', 'bar')
         '''
-        old_val = cls._global_ignore_parser
-        cls._global_ignore_parser = _make_parser(parsers[0]) if len(parsers) == 1 else either(*parsers)
-        yield
-        cls._global_ignore_parser = old_val
+        ignore_parser = _make_parser(parsers[0]) if len(parsers) == 1 else either(*parsers)
+        with cls._settings_override(ignore=ignore_parser):
+            yield
 
     @classmethod
     @contextmanager
@@ -45,21 +136,12 @@ class GlobalContext:
         whith debug_trace():
             parser_to_be_debugged = seq('foo', 'bar')
         '''
-        old_lines = cls.trace_lines
-        old_val = cls.trace_file
-        old_code_context = cls.trace_code_context
-        old_max_lines = cls.max_trace_lines
         stack = inspect.stack()
         outer = stack[2]
-        cls.trace_lines = []
-        cls.trace_file = outer.filename
-        cls.trace_code_context = code_context
-
-        yield
-        cls.trace_lines = old_lines
-        cls.trace_file = old_val
-        cls.trace_code_context = old_code_context
-        cls.max_trace_lines = old_max_lines
+        with cls._settings_override(trace_file=outer.filename,
+                                    trace_code_context=code_context,
+                                    max_trace_lines=max_trace_lines):
+            yield
 
     @classmethod
     @contextmanager
@@ -82,24 +164,48 @@ class GlobalContext:
         return cls.current_context
 
     @classmethod
-    def make_ignore_fn(cls, ignore_override=None):
+    def ignore_parser(cls, ignore_override=None):
         from . combinators import _make_parser
+        '''
+        returns the parser to be ignored, either ignore_override or the global one, or None
+        '''
+        if ignore_override is None:
+            ignore_override = cls.setting('ignore')
+
+        if ignore_override is None:
+            return None
+
+        return _make_parser(ignore_override)
+
+    @classmethod
+    def make_ignore_fn(cls, ignore_override=None):
         '''
         checks if there's a global parser to be ignored or if there or takes a parser as input
         produces a parsing function to consume input but not change the result, essentialy
         advancing the element index if there's something matched to ignore.
         '''
-        if ignore_override is None:
-            ignore_override = cls._global_ignore_parser
+        ignore_parser = cls.ignore_parser(ignore_override)
 
-        if ignore_override is None:
+        if ignore_parser is None:
             return lambda data, string: data
 
-        ignore_fn = _make_parser(ignore_override).func
+        ignore_fn = ignore_parser.func
+
+        if getattr(ignore_parser, 'node', (None,))[0] in _LEAVES:
+            # the usual whitespace regex, it cant raise a CutError
+            def ignore_impl(data, string):
+                try:
+                    return (*data[:2], ignore_fn(data, string)[2])
+                except ParserError:
+                    return data
+
+            return ignore_impl
 
         def ignore_impl(data, string):
             try:
                 return (*data[:2], ignore_fn(data, string)[2])
+            except CutError:
+                raise
             except ParserError:
                 return data
 
@@ -1,4 +1,4 @@
-from . context import GlobalContext
+from . context import GlobalContext, ParseContext
 from os import path
 
 def last_file_name(file_path):
@@ -50,8 +50,7 @@ def trace_parser(func, code_context, index, line_no, file):
     '''
     creates an interactive visualization of the parser calls and behaviour
     '''
-    trace_lines = GlobalContext.trace_lines
-    max_lines = GlobalContext.max_trace_lines
+    max_lines = GlobalContext.setting('max_trace_lines')
 
     def print_parser():
         print(repr(func.parser_obj), '\n')
@@ -69,12 +68,20 @@ def trace_parser(func, code_context, index, line_no, file):
         string_slice, index_pointer = get_string_index_slice(string, index, 25)
         print(string_slice)
         print(index_pointer)
+        context = ParseContext.current()
+        if context is not None and context.lines is not None:
+            print('line {}, column {}'.format(*context.lines.pos_to_linecol(index)))
+
+    def get_trace_lines():
+        context = ParseContext.current()
+        return context.trace_lines if context else []
 
     def print_trace_lines():
-        for line in reversed(trace_lines[-max_lines:]):
+        for line in reversed(get_trace_lines()[-max_lines:]):
             print(line)
 
     def traced(data, string):
+        trace_lines = get_trace_lines()
         trace_lines.append(code_context[index].strip()
                            + f'\n{" "*10}{ANSI.green}in {repr(func.parser_obj)}\n{ANSI.reset}')
         print_string_index(string, data[2])
@@ -108,39 +115,57 @@ def trace_parser(func, code_context, index, line_no, file):
     return traced
 
 
+_line = object()
+
+
 def pretty_print(data, indent='', color=True, print_fn=print):
     '''
-    prints a nice tree visualization of the parse data
+    prints a nice tree visualization of the parse data.
+    walks the tree with an explicit stack, so deeply nested trees dont hit the recursion limit
     '''
     green = ANSI.green
     cyan = ANSI.cyan
     reset = ANSI.reset
 
-    if isinstance(data, list):
-        for item in data:
-            pretty_print(item, indent=indent + '│   ', color=color, print_fn=print_fn)
-        print_fn(indent + '└─────')
+    # entries are (data, indent), or (_line, text) for a line to be printed as is
+    stack = [(data, indent)]
+    while stack:
+        data, indent = stack.pop()
 
-    elif isinstance(data, tuple) and len(data) == 3:
-        result, tag, index = data
-        tag, index = repr(tag), repr(index)
+        if data is _line:
+            print_fn(indent)
 
-        if isinstance(result, list):
-            print_fn(''.join((indent, green, tag, ' [', cyan, index, green, ']:', reset)))
-            pretty_print(result, indent=indent, color=color, print_fn=print_fn)
+        elif isinstance(data, list):
+            stack.append((_line, indent + '└─────'))
+            stack.extend((item, indent + '│   ') for item in reversed(data))
 
-        elif isinstance(result, tuple) and len(result) == 3:
-            print_fn(''.join((indent, green, tag, ' [', cyan, index, green, ']:', reset)))
-            pretty_print(result, indent=indent + '    ', color=color, print_fn=print_fn)
-        else:
-            print_fn(''.join((indent, green, tag, ' [', cyan, index, green, ']:', cyan, repr(result), reset)))
+        elif isinstance(data, tuple) and len(data) == 3:
+            result, tag, index = data
+            tag, index = repr(tag), repr(index)
+
+            if isinstance(result, list):
+                print_fn(''.join((indent, green, tag, ' [', cyan, index, green, ']:', reset)))
+                stack.append((result, indent))
 
-    else:
-        print_fn(''.join((indent, cyan, repr(data), reset)))
+            elif isinstance(result, tuple) and len(result) == 3:
+                print_fn(''.join((indent, green, tag, ' [', cyan, index, green, ']:', reset)))
+                stack.append((result, indent + '    '))
+            else:
+                print_fn(''.join((indent, green, tag, ' [', cyan, index, green, ']:', cyan, repr(result), reset)))
+
+        else:
+            print_fn(''.join((indent, cyan, repr(data), reset)))
 
 
 def deep_sizeof(x):
-    if isinstance(x, (list, tuple)):
-        return sum(deep_sizeof(y) for y in x) + x.__sizeof__()
-    else:
-        return x.__sizeof__()
+    total = 0
+    stack = [x]
+    while stack:
+        x = stack.pop()
+        if isinstance(x, (list, tuple)):
+            stack.extend(x)
+            total += x.__sizeof__()
+        else:
+            total += type(x).__sizeof__(x)
+
+    return total
@@ -0,0 +1,532 @@
+'''
+profile guided dispatch for either().
+
+    profile = EitherProfile(grammar)
+    with profile.training():
+        for text in samples:
+            grammar.parse(text)
+    profile.save('grammar.json')
+
+    # in production
+    EitherProfile.load('grammar.json', grammar).apply()
+
+training counts, for every either of the grammar, which alternative matched at each
+first character. apply() then makes the eithers try, at the characters seen in training,
+only the alternatives that can start with that character, and the one that won most
+often first when it provably cant match where the ones before it do. the sets of first
+characters are computed from the parser nodes and are never too small, so results and
+errors are the same as without the profile.
+eithers are numbered in the order of a walk of the grammar, the profile fits any grammar
+built by the same code.
+'''
+import json
+from contextlib import contextmanager
+from os.path import commonprefix
+from . combinators import cut, _char_class
+from . errors import ParserError, CutError
+
+try:
+    import re._parser as sre_parse
+    import re._constants as sre_constants
+except ImportError:  # python < 3.11
+    import sre_parse
+    import sre_constants
+
+# (first characters, nullable) of parsers nothing is known about
+_ANYTHING = (None, True)
+_NOTHING = (frozenset(), False)
+
+
+def _parsers(node):
+    '''
+    the parsers used by a node, ignore parsers included
+    '''
+    kind = node[0]
+    if kind == 'either':
+        parsers = list(node[1])
+    elif kind == 'seq':
+        parsers = [*node[1], node[2]]
+    elif kind == 'concat':
+        parsers = list(node[1])
+    elif kind == 'many':
+        parsers = [node[1], node[5]]
+    elif kind in ('sepby', 'leftassoc'):
+        parsers = [node[1], node[2], node[5]]
+    elif kind in ('map', 'tag', 'discard', 'deepjoin', 'error_message', 'followed_by', 'not_followed_by'):
+        parsers = [node[1]]
+    elif kind in ('lookahead', 'recover', 'lazy'):
+        parsers = [node[1], node[2]]
+    elif kind == 'ref':
+        _, parsers, k = node
+        parsers = [parsers[k]] if k in parsers else []
+    else:
+        parsers = []
+    return [p for p in parsers if p is not None]
+
+
+def walk(parser):
+    '''
+    every parser reachable from parser, once each, always in the same order for grammars
+    built the same way
+    '''
+    seen = set()
+    order = []
+    stack = [parser]
+    while stack:
+        p = stack.pop()
+        if id(p) in seen:
+            continue
+        seen.add(id(p))
+        order.append(p)
+        if p.node is not None:
+            stack.extend(reversed(_parsers(p.node)))
+    return order
+
+
+def _union(a, b):
+    return None if a is None or b is None else a | b
+
+
+def first_sets(parser):
+    '''
+    {id(p): (chars, nullable)} for every parser p reachable from parser. chars holds all
+    the characters a match of p can start with (None if they cant be known), nullable
+    tells that p can succeed, or raise a CutError, without consuming anything.
+    found by iterating to a fixed point since the grammar can be recursive.
+    '''
+    parsers = walk(parser)
+    firsts = {id(p): _NOTHING for p in parsers}
+    changed = True
+    while changed:
+        changed = False
+        for p in parsers:
+            first = _node_first(p, firsts)
+            if first != firsts[id(p)]:
+                firsts[id(p)] = first
+                changed = True
+    return firsts
+
+
+def _sequence_first(parsers, ignore, firsts):
+    # ignore parsers never fail, their characters are added but they dont stop the sequence
+    chars = frozenset() if ignore is None else firsts[id(ignore)][0]
+    for p in parsers:
+        p_chars, p_nullable = firsts[id(p)]
+        chars = _union(chars, p_chars)
+        if not p_nullable:
+            return chars, False
+    return chars, True
+
+
+def _node_first(parser, firsts):
+    node = parser.node
+    if node is None:
+        return _ANYTHING
+
+    kind = node[0]
+    if kind == 'lit':
+        return frozenset(node[1][:1]), not node[1]
+    if kind == 'regex':
+        return _regex_first(node[1])
+    if kind == 'char_in':
+        return frozenset(node[1]), False
+    if kind == 'char_range':
+        accept = _char_class(parser)
+        return (None if callable(accept) else accept), False
+    if kind == 'take_while':
+        _, accept, mi, _ = node
+        return (None if callable(accept) else accept), mi == 0
+    if kind == 'balanced':
+        return frozenset(node[1][:1]), False
+    if kind == 'lazy':
+        return firsts[id(node[2])]
+    if kind == 'either':
+        chars = frozenset()
+        nullable = False
+        for p in node[1]:
+            p_chars, p_nullable = firsts[id(p)]
+            chars = _union(chars, p_chars)
+            nullable = nullable or p_nullable
+        return chars, nullable
+    if kind == 'seq':
+        return _sequence_first(node[1], node[2], firsts)
+    if kind == 'concat':
+        return _sequence_first(node[1], None, firsts)
+    if kind in ('many', 'sepby'):
+        mi = node[2] if kind == 'many' else node[3]
+        chars, nullable = _sequence_first([node[1]], node[5], firsts)
+        return chars, nullable or mi == 0
+    if kind == 'leftassoc':
+        chars, nullable = _sequence_first([node[1]], node[5], firsts)
+        if nullable:
+            chars = _union(chars, firsts[id(node[2])][0])
+        return chars, nullable
+    if kind in ('map', 'tag', 'discard', 'deepjoin', 'error_message', 'lookahead'):
+        return firsts[id(node[1])]
+    if kind == 'ref':
+        _, parsers, k = node
+        return firsts[id(parsers[k])] if k in parsers else _ANYTHING
+    if kind == 'fail':
+        return _NOTHING
+    if kind == 'eof':
+        # only matches where there's no character
+        return _NOTHING
+    if kind in ('success', 'copy_last', 'followed_by', 'not_followed_by'):
+        return frozenset(), True
+    # cut, recover, take_until, token
+    return _ANYTHING
+
+
+_category_chars = {}
+
+
+def _category(category, ascii):
+    '''
+    the characters of a \\d or \\s regex category, None for the others
+    '''
+    key = (category, ascii)
+    if key not in _category_chars:
+        c = sre_constants
+        if category is c.CATEGORY_DIGIT:
+            chars = '0123456789' if ascii else (chr(i) for i in range(0x20000) if chr(i).isdecimal())
+        elif category is c.CATEGORY_SPACE:
+            # every unicode space comes before U+3001
+            chars = ' \t\n\r\f\v' if ascii else (chr(i) for i in range(0x3001) if chr(i).isspace())
+        else:
+            chars = None
+        _category_chars[key] = None if chars is None else frozenset(chars)
+    return _category_chars[key]
+
+
+def _regex_first(pattern):
+    if pattern.flags & sre_constants.SRE_FLAG_IGNORECASE:
+        return _ANYTHING
+    ascii = bool(pattern.flags & sre_constants.SRE_FLAG_ASCII)
+    return _items_first(sre_parse.parse(pattern.pattern, pattern.flags), ascii)
+
+
+def _items_first(items, ascii):
+    chars = frozenset()
+    for op, av in items:
+        item_chars, nullable = _item_first(op, av, ascii)
+        if item_chars is None:
+            return _ANYTHING
+        chars |= item_chars
+        if not nullable:
+            return chars, False
+    return chars, True
+
+
+def _item_first(op, av, ascii):
+    c = sre_constants
+    if op is c.LITERAL:
+        return frozenset(chr(av)), False
+    if op is c.IN:
+        chars = set()
+        for item_op, item_av in av:
+            if item_op is c.LITERAL:
+                chars.add(chr(item_av))
+            elif item_op is c.RANGE and item_av[1] - item_av[0] < 1024:
+                chars.update(chr(i) for i in range(item_av[0], item_av[1] + 1))
+            elif item_op is c.CATEGORY and _category(item_av, ascii) is not None:
+                chars |= _category(item_av, ascii)
+            else:
+                return _ANYTHING
+        return frozenset(chars), False
+    if op in (c.MAX_REPEAT, c.MIN_REPEAT, getattr(c, 'POSSESSIVE_REPEAT', None)):
+        mi, _, sub = av
+        chars, nullable = _items_first(sub, ascii)
+        return chars, nullable or mi == 0
+    if op is c.SUBPATTERN:
+        _, add_flags, _, sub = av
+        if add_flags & c.SRE_FLAG_IGNORECASE:
+            return _ANYTHING
+        return _items_first(sub, ascii)
+    if op is getattr(c, 'ATOMIC_GROUP', None):
+        return _items_first(av, ascii)
+    if op is c.BRANCH:
+        chars = frozenset()
+        nullable = False
+        for branch in av[1]:
+            branch_chars, branch_nullable = _items_first(branch, ascii)
+            if branch_chars is None:
+                return _ANYTHING
+            chars |= branch_chars
+            nullable = nullable or branch_nullable
+        return chars, nullable
+    if op in (c.AT, c.ASSERT, c.ASSERT_NOT):
+        # zero width, the characters come from what follows
+        return frozenset(), True
+    return _ANYTHING
+
+
+def _regex_prefix(pattern):
+    '''
+    (text, exact) where every match of pattern starts with text, exact when it's all the match
+    '''
+    if pattern.flags & sre_constants.SRE_FLAG_IGNORECASE:
+        return '', False
+    items = list(sre_parse.parse(pattern.pattern, pattern.flags))
+    text = ''
+    for op, av in items:
+        if op is not sre_constants.LITERAL:
+            return text, False
+        text += chr(av)
+    return text, True
+
+
+def required_prefix(parser, _seen=()):
+    '''
+    (skips, text, exact): every match of parser is text, once the ignore parsers with ids
+    in skips were applied in order, and parser fails without a CutError where text isnt
+    there. exact tells that the match is text and nothing else. None if there's no text.
+    '''
+    node = parser.node
+    if node is None or id(parser) in _seen:
+        return None
+    seen = (*_seen, id(parser))
+
+    kind = node[0]
+    if kind == 'lit':
+        return ((), node[1], True) if node[1] else None
+    if kind == 'regex':
+        text, exact = _regex_prefix(node[1])
+        return ((), text, exact) if text else None
+    if kind == 'char_in' and len(node[1]) == 1:
+        return (), next(iter(node[1])), True
+    if kind == 'char_range' and node[1] == node[2]:
+        return (), node[1], True
+    if kind == 'balanced':
+        return (), node[1], False
+    if kind == 'lazy':
+        return required_prefix(node[2], seen)
+    if kind in ('map', 'tag', 'discard', 'deepjoin', 'error_message', 'lookahead'):
+        return required_prefix(node[1], seen)
+    if kind == 'ref':
+        _, parsers, k = node
+        return required_prefix(parsers[k], seen) if k in parsers else None
+
+    if kind == 'either':
+        prefixes = [required_prefix(p, seen) for p in node[1]]
+        if not prefixes or None in prefixes or len({p[0] for p in prefixes}) != 1:
+            return None
+        text = commonprefix([p[1] for p in prefixes])
+        return (prefixes[0][0], text, False) if text else None
+
+    if kind in ('seq', 'concat'):
+        ignore = node[2] if kind == 'seq' else None
+        if ignore is not None and any(p is cut for p in walk(ignore)):
+            return None
+        skips = () if ignore is None else (id(ignore),)
+        text = ''
+        exact = ignore is None
+        for p in node[1]:
+            prefix = None if p is cut else required_prefix(p, seen)
+            if prefix is None:
+                exact = False
+                break
+            p_skips, p_text, p_exact = prefix
+            if text and p_skips:
+                exact = False
+                break
+            skips += p_skips
+            text += p_text
+            # what follows can only be appended after a whole literal with nothing to skip
+            if not p_exact or ignore is not None:
+                exact = False
+                break
+        return (skips, text, exact) if text else None
+
+    return None
+
+
+def _disjoint(a, b):
+    '''
+    True if the alternatives with prefixes a and b cant both match at the same index
+    '''
+    if a is None or b is None or a[0] != b[0]:
+        return False
+    return not a[1].startswith(b[1]) and not b[1].startswith(a[1])
+
+
+def _recorder(funcs, wins):
+    '''
+    either() that counts the alternative that matched at each first character in wins
+    '''
+    count = len(funcs)
+
+    def record(data, string):
+        index = data[2]
+        errors = []
+        for i, func in enumerate(funcs):
+            try:
+                result = func(data, string)
+            except CutError:
+                raise
+            except ParserError as e:
+                errors.append(e.expected)
+                continue
+
+            char = string[index:index + 1] if isinstance(string, str) else ''
+            if char not in wins:
+                wins[char] = [0] * count
+            wins[char][i] += 1
+            return result
+
+        raise ParserError(errors, index)
+
+    return record
+
+
+def _dispatcher(funcs, table):
+    '''
+    either() that tries the alternatives in table[first character] when it's there
+    '''
+    def dispatch(data, string):
+        index = data[2]
+        order = table.get(string[index:index + 1]) if isinstance(string, str) else None
+        if order is None:
+            errors = []
+            for func in funcs:
+                try:
+                    return func(data, string)
+                except CutError:
+                    raise
+                except ParserError as e:
+                    errors.append(e.expected)
+            raise ParserError(errors, index)
+
+        failed = {}
+        for i in order:
+            try:
+                return funcs[i](data, string)
+            except CutError:
+                raise
+            except ParserError as e:
+                failed[i] = e.expected
+
+        # the errors of the alternatives that were left out, in the usual order. they
+        # cant start here, one that matches anyway still wins like it would in either()
+        errors = []
+        for i, func in enumerate(funcs):
+            if i in failed:
+                errors.append(failed[i])
+                continue
+            try:
+                return func(data, string)
+            except CutError:
+                raise
+            except ParserError as e:
+                errors.append(e.expected)
+
+        raise ParserError(errors, index)
+
+    return dispatch
+
+
+class EitherProfile:
+    '''
+    which alternative of each either of grammar matched at each first character,
+    see the module docstring
+    '''
+    def __init__(self, grammar):
+        self.grammar = grammar
+        self.eithers = [p for p in walk(grammar) if p.node is not None and p.node[0] == 'either']
+        # for every either {first character: [matches of each alternative]}
+        self.wins = [{} for _ in self.eithers]
+
+    @contextmanager
+    def training(self):
+        '''
+        the parses of grammar are counted inside this block. the eithers try their
+        alternatives in order afterwards, apply() again if it was applied before.
+        '''
+        for either, wins in zip(self.eithers, self.wins):
+            either.guide(_recorder([p.func for p in either.node[1]], wins))
+        try:
+            yield self
+        finally:
+            self.remove()
+
+    def tables(self, min_count=1):
+        '''
+        for every either {first character: order of the alternatives to try} or None
+        when it's better left alone. characters matched less than min_count times are left out.
+        '''
+        firsts = first_sets(self.grammar)
+        tables = []
+        for either, wins in zip(self.eithers, self.wins):
+            alternatives = either.node[1]
+            everything = list(range(len(alternatives)))
+            starts = [firsts[id(p)] for p in alternatives]
+            prefixes = None
+
+            table = {}
+            for char, counts in wins.items():
+                if not char or sum(counts) < min_count:
+                    continue
+
+                order = [i for i in everything
+                         if starts[i][1] or starts[i][0] is None or char in starts[i][0]]
+
+                # the alternatives that win more often move ahead of the ones they cant overlap
+                if prefixes is None:
+                    prefixes = [required_prefix(p) for p in alternatives]
+                swapped = True
+                while swapped:
+                    swapped = False
+                    for j in range(1, len(order)):
+                        a, b = order[j - 1], order[j]
+                        if counts[b] > counts[a] and _disjoint(prefixes[a], prefixes[b]):
+                            order[j - 1], order[j] = b, a
+                            swapped = True
+
+                if order != everything:
+                    table[char] = tuple(order)
+
+            tables.append(table or None)
+        return tables
+
+    def apply(self, min_count=1):
+        '''
+        makes the eithers of grammar dispatch on their first character, returns self
+        '''
+        for either, table in zip(self.eithers, self.tables(min_count)):
+            either.guide(None if table is None else _dispatcher([p.func for p in either.node[1]], table))
+        return self
+
+    def remove(self):
+        '''
+        makes the eithers of grammar try their alternatives in order again
+        '''
+        for either in self.eithers:
+            either.guide(None)
+
+    def to_dict(self):
+        return {
+            'version': 1,
+            'eithers': [{'alternatives': len(either.node[1]), 'wins': wins}
+                        for either, wins in zip(self.eithers, self.wins)],
+        }
+
+    @classmethod
+    def from_dict(cls, d, grammar):
+        profile = cls(grammar)
+        eithers = d['eithers']
+        if len(eithers) != len(profile.eithers) or any(
+                e['alternatives'] != len(either.node[1]) for e, either in zip(eithers, profile.eithers)):
+            raise ValueError('the profile was trained on a different grammar')
+        profile.wins = [{char: list(counts) for char, counts in e['wins'].items()} for e in eithers]
+        return profile
+
+    def save(self, path):
+        with open(path, 'w') as file:
+            json.dump(self.to_dict(), file)
+
+    @classmethod
+    def load(cls, path, grammar):
+        with open(path) as file:
+            return cls.from_dict(json.load(file), grammar)
+
+    def __repr__(self):
+        return f'EitherProfile({len(self.eithers)} eithers)'
@@ -1,5 +1,28 @@
 
-class ParserError(BaseException):
+class _Located:
+    '''
+    line and column of self.index, known once a lines.LineIndex of the parsed string
+    is assigned to self.lines. they are only computed when asked for.
+    '''
+    lines = None
+
+    @property
+    def linecol(self):
+        if self.lines is None:
+            return None
+        return self.lines.pos_to_linecol(self.index)
+
+    line = property(fget=lambda self: None if self.lines is None else self.linecol[0])
+    column = property(fget=lambda self: None if self.lines is None else self.linecol[1])
+
+    def _where(self):
+        if self.lines is None:
+            return f'at index {self.index}'
+        line, column = self.linecol
+        return f'at line {line}, column {column} (index {self.index})'
+
+
+class ParserError(_Located, BaseException):
     def __init__(self, expected, index):
         self.expected = expected
         self.index = index
@@ -7,5 +30,34 @@ class ParserError(BaseException):
 
     def __str__(self):
         if self.message:
-            return f'{self.message}\nat index {self.index}'
-        return f'expected {self.expected} at index {self.index}'
+            return f'{self.message}\n{self._where()}'
+        return f'expected {self.expected} {self._where()}'
+
+
+class RecoveredError(_Located):
+    '''
+    error node produced by combinators.recover() when a parser failed and the input
+    was skipped up to a synchronization point. it only keeps what is needed to report
+    the error (expected, span and message), not the exception itself.
+    '''
+    def __init__(self, error, start, end):
+        self.expected = error.expected
+        self.index = error.index
+        self.message = error.message
+        self.start = start
+        self.end = end
+
+    def __repr__(self):
+        return f'RecoveredError({repr(self.expected)}, {self.start}, {self.end})'
+
+    def __str__(self):
+        if self.message:
+            return f'{self.message}\n{self._where()}, skipped {self.start}:{self.end}'
+        return f'expected {self.expected} {self._where()}, skipped {self.start}:{self.end}'
+
+
+class CutError(ParserError):
+    '''
+    raised when a parser fails after a cut, enclosing alternatives and repetitions
+    let it through instead of trying something else.
+    '''
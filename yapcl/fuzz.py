@@ -0,0 +1,545 @@
+'''
+random inputs for a grammar, and a benchmark measuring how parse time and memory
+grow with the size and nesting of the input.
+
+    python -m yapcl.fuzz module:parser --sizes 1000,10000,100000 --depths 4,16,64
+'''
+import argparse
+import importlib
+import math
+import random
+import string as string_module
+import sys
+import tracemalloc
+from time import perf_counter
+from . errors import ParserError
+
+try:
+    import re._parser as sre_parse
+    import re._constants as sre_constants
+except ImportError:  # python < 3.11
+    import sre_parse
+    import sre_constants
+
+_printable = string_module.ascii_letters + string_module.digits + string_module.punctuation + ' '
+
+_categories = {
+    sre_constants.CATEGORY_DIGIT: string_module.digits,
+    sre_constants.CATEGORY_NOT_DIGIT: string_module.ascii_letters + string_module.punctuation + ' ',
+    sre_constants.CATEGORY_SPACE: ' \t\n',
+    sre_constants.CATEGORY_NOT_SPACE: string_module.ascii_letters + string_module.digits + string_module.punctuation,
+    sre_constants.CATEGORY_WORD: string_module.ascii_letters + string_module.digits + '_',
+    sre_constants.CATEGORY_NOT_WORD: string_module.punctuation.replace('_', '') + ' ',
+    sre_constants.CATEGORY_LINEBREAK: '\n',
+    sre_constants.CATEGORY_NOT_LINEBREAK: _printable,
+}
+
+_repeats = (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT,
+            getattr(sre_constants, 'POSSESSIVE_REPEAT', sre_constants.MAX_REPEAT))
+
+
+class InputGenerator:
+    '''
+    walks the nodes of a grammar (see Parser.node) and produces random strings the grammar
+    should accept. regexes are sampled from their parsed form, either picks a random
+    alternative and repetitions draw around breadth extra items.
+    depth bounds the nesting of RecursionContainer rules and max_length the characters
+    produced, past either of them the generator only takes the shortest way out.
+    deepen is the chance of taking the most nested alternative before that, use it to build
+    inputs close to depth.
+    opaque parsers (node None) and token parsers cant be generated and raise ValueError.
+    '''
+    def __init__(self, parser, seed=None, breadth=3, depth=16, deepen=0.0, max_length=10000):
+        self.parser = parser
+        self.random = random.Random(seed)
+        self.breadth = breadth
+        self.depth = depth
+        self.deepen = deepen
+        self.max_length = max_length
+        self.costs = _min_costs(parser)
+
+    def generate(self, length=None):
+        '''
+        one random input. with length, about length characters: the walk stops growing once
+        it has length characters and breadth is doubled while the input is still too short.
+        '''
+        if length is None:
+            return self._generate(self.max_length)
+
+        breadth = self.breadth
+        text = ''
+        try:
+            for _ in range(20):
+                text = self._generate(length)
+                if len(text) >= length:
+                    break
+                self.breadth = max(1, self.breadth * 2)
+        finally:
+            self.breadth = breadth
+        return text
+
+    def _generate(self, limit):
+        parts = []
+        self._level = 0
+        self._chars = 0
+        self._limit = limit
+        self.emit(self.parser, parts)
+        return ''.join(parts)
+
+    def out(self, parts, text):
+        parts.append(text)
+        self._chars += len(text)
+
+    def exhausted(self):
+        return self._level > self.depth or self._chars >= self._limit
+
+    def valid(self, length=None, attempts=100):
+        '''
+        like generate(), but checks that the parser consumes the whole input, some grammars
+        accept less than what the walk produces (adjacent tokens merging, lookaheads).
+        '''
+        for _ in range(attempts):
+            text = self.generate(length)
+            if _accepts(self.parser, text):
+                return text
+        raise ValueError(f'no valid input found in {attempts} attempts')
+
+    def invalid(self, length=None, attempts=100):
+        '''
+        a generated input mutated until the parser rejects it
+        '''
+        for _ in range(attempts):
+            text = mutate(self.generate(length), self.random)
+            if not _accepts(self.parser, text):
+                return text
+        raise ValueError(f'no invalid input found in {attempts} attempts')
+
+    def cost(self, parser):
+        return self.costs.get(id(parser), math.inf)
+
+    def repetitions(self, mi, ma):
+        if self.exhausted():
+            return mi
+        extra = self.random.randint(0, 2 * self.breadth)
+        return int(min(ma, mi + extra))
+
+    def emit(self, parser, parts):
+        node = parser.node
+        if node is None:
+            raise ValueError(f'cant generate input for opaque parser {parser}')
+
+        kind = node[0]
+        rand = self.random
+
+        if kind == 'lit':
+            self.out(parts, node[1])
+
+        elif kind == 'regex':
+            self.out(parts, sample_regex(node[1], rand, self.breadth))
+
+        elif kind == 'char_in':
+            self.out(parts, rand.choice(sorted(node[1])) if node[1] else '')
+
+        elif kind == 'char_range':
+            self.out(parts, chr(rand.randint(ord(node[1]), ord(node[2]))))
+
+        elif kind == 'take_while':
+            _, accept, mi, ma = node
+            chars = [c for c in _printable if (accept(c) if callable(accept) else c in accept)]
+            count = self.repetitions(mi, ma) if chars else 0
+            self.out(parts, ''.join(rand.choice(chars) for _ in range(min(count, mi + 2 * self.breadth))))
+
+        elif kind == 'take_until':
+            text = node[1]
+            chars = [c for c in _printable if c not in text] or [' ']
+            self.out(parts, ''.join(rand.choice(chars) for _ in range(self.repetitions(0, math.inf))))
+
+        elif kind == 'balanced':
+            _, open, close = node[:3]
+            count = self.repetitions(1, math.inf)
+            self.out(parts, open * count + close * count)
+
+        elif kind == 'either':
+            alternatives = [p for p in node[1] if self.cost(p) != math.inf]
+            if not alternatives:
+                raise ValueError(f'no alternative of {parser} can be generated')
+            if self.exhausted():
+                choice = min(alternatives, key=self.cost)
+            elif self.deepen and rand.random() < self.deepen:
+                deepest = max(self.cost(p) for p in alternatives)
+                choice = rand.choice([p for p in alternatives if self.cost(p) == deepest])
+            else:
+                choice = rand.choice(alternatives)
+            self.emit(choice, parts)
+
+        elif kind == 'seq':
+            _, parsers, ignore, capture, auto_capture = node
+            self.emit_ignore(ignore, parts)
+            for p in parsers:
+                self.emit(p, parts)
+                self.emit_ignore(ignore, parts)
+
+        elif kind == 'many':
+            _, p, mi, ma, capture, ignore = node
+            self.emit_ignore(ignore, parts)
+            for i in range(self.repetitions(mi, ma)):
+                if i >= mi and self.exhausted():
+                    break
+                self.emit(p, parts)
+                self.emit_ignore(ignore, parts)
+
+        elif kind == 'sepby':
+            _, p, separator, mi, ma, ignore = node
+            self.emit_ignore(ignore, parts)
+            for i in range(self.repetitions(mi, ma)):
+                if i >= mi and self.exhausted():
+                    break
+                if i:
+                    self.emit(separator, parts)
+                    self.emit_ignore(ignore, parts)
+                self.emit(p, parts)
+                self.emit_ignore(ignore, parts)
+
+        elif kind == 'leftassoc':
+            _, start, p, mi, ma, ignore = node
+            self.emit_ignore(ignore, parts)
+            self.emit(start, parts)
+            for i in range(self.repetitions(mi, ma)):
+                if i >= mi and self.exhausted():
+                    break
+                self.emit_ignore(ignore, parts)
+                self.emit(p, parts)
+            self.emit_ignore(ignore, parts)
+
+        elif kind == 'concat':
+            for p in node[1]:
+                self.emit(p, parts)
+
+        elif kind in ('map', 'tag', 'discard', 'deepjoin', 'error_message', 'recover', 'lookahead', 'lazy'):
+            self.emit(node[1], parts)
+
+        elif kind == 'ref':
+            _, parsers, k = node
+            if k not in parsers:
+                raise ValueError(f'parser r.{k} promissed but never assigned.')
+            self._level += 1
+            try:
+                self.emit(parsers[k], parts)
+            finally:
+                self._level -= 1
+
+        elif kind == 'fail':
+            raise ValueError(f'cant generate input for {parser}')
+
+        elif kind in ('success', 'copy_last', 'cut', 'eof', 'followed_by', 'not_followed_by'):
+            pass
+
+        else:
+            raise ValueError(f'cant generate input for {parser}')
+
+    def emit_ignore(self, ignore, parts):
+        if ignore is not None and self.random.random() < 0.25:
+            try:
+                self.emit(ignore, parts)
+            except ValueError:
+                pass
+
+
+def _children(node):
+    kind = node[0]
+    if kind in ('either', 'seq', 'concat'):
+        return list(node[1])
+    if kind in ('many', 'map', 'tag', 'discard', 'deepjoin', 'error_message', 'recover', 'lookahead', 'lazy'):
+        return [node[1]]
+    if kind == 'sepby':
+        return [node[1], node[2]]
+    if kind == 'leftassoc':
+        return [node[1], node[2]]
+    if kind == 'ref':
+        _, parsers, k = node
+        return [parsers[k]] if k in parsers else []
+    return []
+
+
+def _min_costs(parser):
+    '''
+    for every parser reachable from parser, the least number of nested rules needed to
+    generate something for it (inf if it can never be generated), found by iterating to
+    a fixed point since the grammar can be recursive.
+    '''
+    parsers = {}
+    stack = [parser]
+    while stack:
+        p = stack.pop()
+        if id(p) in parsers:
+            continue
+        parsers[id(p)] = p
+        if p.node is not None:
+            stack.extend(_children(p.node))
+            # ignore parsers dont change the cost, but they get generated too
+            if p.node[0] in ('seq', 'many', 'sepby', 'leftassoc'):
+                ignore = p.node[2] if p.node[0] == 'seq' else p.node[5]
+                if ignore is not None:
+                    stack.append(ignore)
+
+    costs = {key: math.inf for key in parsers}
+    changed = True
+    while changed:
+        changed = False
+        for key, p in parsers.items():
+            cost = _node_cost(p.node, costs)
+            if cost < costs[key]:
+                costs[key] = cost
+                changed = True
+
+    return costs
+
+
+def _node_cost(node, costs):
+    if node is None:
+        return math.inf
+
+    kind = node[0]
+    cost = lambda p: costs[id(p)]
+
+    if kind == 'fail':
+        return math.inf
+    if kind == 'token':
+        return math.inf
+    if kind == 'either':
+        return 1 + min((cost(p) for p in node[1]), default=math.inf)
+    if kind in ('seq', 'concat'):
+        return 1 + max((cost(p) for p in node[1]), default=0)
+    if kind == 'many':
+        return 0 if node[2] == 0 else 1 + cost(node[1])
+    if kind == 'sepby':
+        return 0 if node[3] == 0 else 1 + max(cost(node[1]), cost(node[2]))
+    if kind == 'leftassoc':
+        return 1 + (cost(node[1]) if node[3] == 0 else max(cost(node[1]), cost(node[2])))
+    if kind == 'ref':
+        children = _children(node)
+        return 1 + cost(children[0]) if children else math.inf
+    if kind in ('map', 'tag', 'discard', 'deepjoin', 'error_message', 'recover', 'lookahead', 'lazy'):
+        return 1 + cost(node[1])
+    return 0
+
+
+def sample_regex(pattern, rand=random, breadth=3):
+    '''
+    a random string matched by pattern (a compiled regex), built from its parsed form.
+    lookarounds and anchors are left out, so the result can fail to match when they matter.
+    '''
+    groups = {}
+    parts = []
+    _sample_subpattern(sre_parse.parse(pattern.pattern, pattern.flags), rand, breadth, groups, parts)
+    return ''.join(parts)
+
+
+def _sample_subpattern(items, rand, breadth, groups, parts):
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            parts.append(chr(av))
+
+        elif op is sre_constants.NOT_LITERAL:
+            parts.append(rand.choice(_printable.replace(chr(av), '')))
+
+        elif op is sre_constants.ANY:
+            parts.append(rand.choice(_printable))
+
+        elif op is sre_constants.IN:
+            parts.append(_sample_in(av, rand))
+
+        elif op is sre_constants.BRANCH:
+            _sample_subpattern(rand.choice(av[1]), rand, breadth, groups, parts)
+
+        elif op is sre_constants.SUBPATTERN:
+            group, _, _, sub = av
+            start = len(parts)
+            _sample_subpattern(sub, rand, breadth, groups, parts)
+            if group is not None:
+                groups[group] = ''.join(parts[start:])
+
+        elif op is sre_constants.ATOMIC_GROUP:
+            _sample_subpattern(av, rand, breadth, groups, parts)
+
+        elif op in _repeats:
+            mi, ma, sub = av
+            ma = mi + 2 * breadth if ma == sre_constants.MAXREPEAT else ma
+            for _ in range(rand.randint(mi, max(mi, ma))):
+                _sample_subpattern(sub, rand, breadth, groups, parts)
+
+        elif op is sre_constants.GROUPREF:
+            parts.append(groups.get(av, ''))
+
+        elif op is sre_constants.GROUPREF_EXISTS:
+            group, yes, no = av
+            branch = yes if group in groups else no
+            if branch is not None:
+                _sample_subpattern(branch, rand, breadth, groups, parts)
+
+        # AT, ASSERT and ASSERT_NOT dont consume anything
+
+
+def _sample_in(items, rand):
+    negate = False
+    choices = []
+    for op, av in items:
+        if op is sre_constants.NEGATE:
+            negate = True
+        elif op is sre_constants.LITERAL:
+            choices.append(chr(av))
+        elif op is sre_constants.RANGE:
+            lo, hi = av
+            choices.extend(chr(c) for c in range(lo, min(hi, lo + 255) + 1))
+        elif op is sre_constants.CATEGORY:
+            choices.extend(_categories.get(av, ''))
+
+    if negate:
+        excluded = set(choices)
+        choices = [c for c in _printable if c not in excluded]
+    return rand.choice(choices) if choices else ''
+
+
+def mutate(text, rand=random):
+    '''
+    text with one random edit: a character deleted, inserted, replaced or swapped with
+    the next one, a span duplicated, or the end cut off
+    '''
+    if not text:
+        return rand.choice(_printable)
+
+    i = rand.randrange(len(text))
+    edit = rand.randrange(6)
+    if edit == 0:
+        return text[:i] + text[i + 1:]
+    if edit == 1:
+        return text[:i] + rand.choice(_printable) + text[i:]
+    if edit == 2:
+        return text[:i] + rand.choice(_printable) + text[i + 1:]
+    if edit == 3 and i + 1 < len(text):
+        return text[:i] + text[i + 1] + text[i] + text[i + 2:]
+    if edit == 4:
+        j = rand.randint(i, len(text))
+        return text[:j] + text[i:j] + text[j:]
+    return text[:i]
+
+
+def _accepts(parser, text):
+    try:
+        return parser.parse(text)[2] == len(text)
+    except (ParserError, RecursionError):
+        return False
+
+
+def measure(parser, text, repeat=3):
+    '''
+    (best parse time in seconds, peak memory in bytes while parsing, error or None)
+    '''
+    best = math.inf
+    error = None
+    for _ in range(repeat):
+        start = perf_counter()
+        try:
+            parser.parse(text)
+        except (ParserError, RecursionError) as e:
+            error = e
+        best = min(best, perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        parser.parse(text)
+    except (ParserError, RecursionError):
+        pass
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return best, peak, error
+
+
+def scaling(parser, sizes=(), depths=(), seed=0, repeat=3, invalid=False):
+    '''
+    generates inputs of each size, then inputs nested up to each depth, parses them and
+    returns a row per input: dict with chars, depth, seconds, peak_bytes, error and exponent,
+    the growth of the time relative to the previous row of the same kind, against the
+    length for sizes and against the depth for depths (1.0 is linear, much more is a blowup).
+    '''
+    rows = []
+    previous = None
+    for size in sizes:
+        generator = InputGenerator(parser, seed=seed)
+        text = generator.invalid(size) if invalid else generator.generate(size)
+        previous = _row(parser, text, None, repeat, previous, 'chars')
+        rows.append(previous)
+
+    previous = None
+    for depth in depths:
+        generator = InputGenerator(parser, seed=seed, breadth=0, depth=depth, deepen=1.0,
+                                   max_length=math.inf)
+        text = generator.invalid() if invalid else generator.generate()
+        previous = _row(parser, text, depth, repeat, previous, 'depth')
+        rows.append(previous)
+
+    return rows
+
+
+def _row(parser, text, depth, repeat, previous, scale):
+    seconds, peak, error = measure(parser, text, repeat)
+    row = {
+        'chars': len(text),
+        'depth': depth,
+        'seconds': seconds,
+        'peak_bytes': peak,
+        'error': None if error is None else type(error).__name__,
+        'exponent': None,
+    }
+
+    if previous and previous[scale] and row[scale] > previous[scale] and previous['seconds'] > 0:
+        row['exponent'] = math.log(seconds / previous['seconds']) / math.log(row[scale] / previous[scale])
+
+    return row
+
+
+def _load(target):
+    module_name, _, attr = target.partition(':')
+    sys.path.insert(0, '')
+    module = importlib.import_module(module_name)
+    obj = module
+    for name in (attr or 'parser').split('.'):
+        obj = getattr(obj, name)
+    return obj() if callable(obj) and not hasattr(obj, 'parse') else obj
+
+
+def main(argv=None):
+    args = argparse.ArgumentParser(prog='python -m yapcl.fuzz',
+                                   description='measures how parse time and memory scale with the input')
+    args.add_argument('target', help='module:attribute of the parser, or of a function returning it')
+    args.add_argument('--sizes', default='1000,10000,100000', help='comma separated input lengths')
+    args.add_argument('--depths', default='', help='comma separated nesting depths')
+    args.add_argument('--seed', type=int, default=0)
+    args.add_argument('--repeat', type=int, default=3)
+    args.add_argument('--invalid', action='store_true', help='mutate the inputs into invalid ones')
+    args.add_argument('--limit', type=float, default=1.5, help='exponent reported as a blowup')
+    args = args.parse_args(argv)
+
+    parser = _load(args.target)
+    sizes = [int(x) for x in args.sizes.split(',') if x]
+    depths = [int(x) for x in args.depths.split(',') if x]
+
+    print(f'{"chars":>10} {"depth":>6} {"ms":>10} {"us/char":>8} {"peak KB":>10} {"exp":>6}  error')
+    blowups = 0
+    for row in scaling(parser, sizes, depths, args.seed, args.repeat, args.invalid):
+        exponent = row['exponent']
+        flag = ''
+        if exponent is not None and exponent > args.limit:
+            flag = '  <- non linear'
+            blowups += 1
+        print(f'{row["chars"]:>10} {row["depth"] if row["depth"] is not None else "-":>6} '
+              f'{row["seconds"] * 1000:>10.3f} {row["seconds"] * 1e6 / max(1, row["chars"]):>8.3f} '
+              f'{row["peak_bytes"] / 1024:>10.1f} {"-" if exponent is None else f"{exponent:.2f}":>6}'
+              f'  {row["error"] or ""}{flag}')
+
+    return 1 if blowups else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,48 @@
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+
+
+class LineIndex:
+    '''
+    maps indexes of a string to (line, column) pairs, both counted from 1.
+    the offsets where each line starts are found on the first lookup, with a single
+    pass over the string, every lookup after that is a binary search.
+    '''
+    def __init__(self, string):
+        self.string = string
+        self._starts = None
+
+    @property
+    def starts(self):
+        '''
+        array with the index where each line starts
+        '''
+        if self._starts is None:
+            lengths = (len(line) + 1 for line in self.string.split('\n')[:-1])
+            self._starts = array('q', [0])
+            self._starts.extend(accumulate(lengths))
+        return self._starts
+
+    def __len__(self):
+        return len(self.starts)
+
+    def pos_to_linecol(self, index):
+        starts = self.starts
+        line = bisect_right(starts, index)
+        return line, index - starts[line - 1] + 1
+
+    def linecol_to_pos(self, line, column):
+        return self.starts[line - 1] + column - 1
+
+    def span_to_linecol(self, start, end):
+        return self.pos_to_linecol(start), self.pos_to_linecol(end)
+
+    def line_text(self, line):
+        '''
+        text of the given line, without the line break
+        '''
+        starts = self.starts
+        start = starts[line - 1]
+        end = starts[line] - 1 if line < len(starts) else len(self.string)
+        return self.string[start:end]
@@ -0,0 +1,322 @@
+'''
+recognizers: functions that only tell where a parser's match ends, for the predicates
+followed_by(), not_followed_by() and lookahead().
+
+    recognize = recognizer(parser)
+    recognize(string, index)     # end of the match of parser at index, -1 if none
+
+they are compiled from the parser nodes and dont build results, dont use the memo and
+dont collect errors. map functions arent called, so a map that rejects its input by
+raising a ParserError is seen as a match. parsers they know nothing about, seqs with a
+cut (whose CutError must get out), recover() and token() run through their parser.
+a predicate is a boundary for cuts: a CutError raised inside it is a plain failure.
+'''
+from . combinators import Discarded, cut, _char_class, _scanner
+from . errors import ParserError, CutError
+
+
+def recognizer(parser):
+    return _Compiler().compile(parser)
+
+
+def predicate(parser):
+    '''
+    recognizer of parser for a predicate, a cut inside parser only commits within the
+    predicate and a CutError is a failure like any other
+    '''
+    return _bounded(recognizer(parser))
+
+
+def _bounded(recognize):
+    def bounded(string, index):
+        try:
+            return recognize(string, index)
+        except CutError:
+            return -1
+
+    return bounded
+
+
+# kinds whose result is never Discarded, and those whose result always is. repetitions
+# dont count Discarded items
+_counted_kinds = {'lit', 'regex', 'char_in', 'char_range', 'take_while', 'take_until', 'balanced',
+                  'lazy', 'seq', 'many', 'sepby', 'concat', 'eof'}
+_uncounted_kinds = {'discard', 'followed_by', 'not_followed_by', 'cut'}
+
+
+def _counted(parser, _seen=()):
+    '''
+    True if a repetition counts every match of parser, False if it never does, None if unknown
+    '''
+    node = parser.node
+    if node is None or id(parser) in _seen:
+        return None
+    seen = (*_seen, id(parser))
+
+    kind = node[0]
+    if kind in _counted_kinds:
+        return True
+    if kind in _uncounted_kinds:
+        return False
+    if kind == 'success':
+        return node[1] is not Discarded
+    if kind in ('tag', 'error_message', 'lookahead'):
+        return _counted(node[1], seen)
+    if kind == 'deepjoin':
+        return True if _counted(node[1], seen) else None
+    if kind == 'either':
+        counted = {_counted(p, seen) for p in node[1]}
+        return counted.pop() if len(counted) == 1 else None
+    if kind == 'ref':
+        _, parsers, k = node
+        return _counted(parsers[k], seen) if k in parsers else None
+    return None
+
+
+def _fallback(parser):
+    func = parser.func
+
+    def recognize(string, index):
+        try:
+            return func((None, None, index), string)[2]
+        except CutError:
+            raise
+        except ParserError:
+            return -1
+
+    return recognize
+
+
+class _Compiler:
+    def __init__(self):
+        # id(parser): recognizer, None while it's being compiled
+        self.compiled = {}
+
+    def compile(self, parser):
+        key = id(parser)
+        compiled = self.compiled
+        if key in compiled:
+            if compiled[key] is not None:
+                return compiled[key]
+            # a recursive rule, resolved when called
+            return lambda string, index: compiled[key](string, index)
+
+        compiled[key] = None
+        recognize = self.compile_node(parser)
+        compiled[key] = recognize
+        return recognize
+
+    def skip(self, ignore):
+        '''
+        recognizer of an ignore parser, that never fails, or None when there's no ignore
+        '''
+        if ignore is None:
+            return None
+        recognize = self.compile(ignore)
+
+        def skip(string, index):
+            end = recognize(string, index)
+            return index if end < 0 else end
+
+        return skip
+
+    def compile_node(self, parser):
+        node = parser.node
+        if node is None:
+            return _fallback(parser)
+
+        kind = node[0]
+
+        if kind == 'lit':
+            text = node[1]
+            size = len(text)
+
+            def recognize(string, index):
+                return index + size if string.startswith(text, index) else -1
+
+        elif kind == 'regex':
+            match = node[1].match
+
+            def recognize(string, index):
+                found = match(string, index)
+                return -1 if found is None else found.end()
+
+        elif kind in ('char_in', 'char_range'):
+            accept = _char_class(parser)
+            if callable(accept):
+                def recognize(string, index):
+                    return index + 1 if index < len(string) and accept(string[index]) else -1
+            else:
+                def recognize(string, index):
+                    return index + 1 if index < len(string) and string[index] in accept else -1
+
+        elif kind == 'take_while':
+            _, accept, mi, ma = node
+            scan = _scanner(accept)
+
+            def recognize(string, index):
+                end = scan(string, index, min(len(string), index + ma))
+                return end if end - index >= mi else -1
+
+        elif kind == 'take_until':
+            text = node[1]
+
+            def recognize(string, index):
+                return string.find(text, index)
+
+        elif kind == 'lazy':
+            return self.compile(node[2])
+
+        elif kind == 'either':
+            alternatives = [self.compile(p) for p in node[1]]
+
+            def recognize(string, index):
+                for alternative in alternatives:
+                    end = alternative(string, index)
+                    if end >= 0:
+                        return end
+                return -1
+
+        elif kind == 'seq':
+            _, parsers, ignore, _, _ = node
+            if any(p is cut for p in parsers):
+                return _fallback(parser)
+            return self.sequence([self.compile(p) for p in parsers], self.skip(ignore))
+
+        elif kind == 'concat':
+            return self.sequence([self.compile(p) for p in node[1]], None)
+
+        elif kind == 'many':
+            _, item, mi, ma, _, ignore = node
+            accept = _char_class(item) if ignore is None else None
+            if accept is not None:
+                scan = _scanner(accept)
+
+                def recognize(string, index):
+                    end = scan(string, index, min(len(string), index + ma))
+                    return end if end - index >= mi else -1
+
+                return recognize
+
+            counted = _counted(item)
+            if counted is None and (mi > 0 or ma != float('inf')):
+                return _fallback(parser)
+            step = 1 if counted else 0
+            item = self.compile(item)
+            skip = self.skip(ignore) or (lambda string, index: index)
+
+            def recognize(string, index):
+                index = skip(string, index)
+                count = 0
+                while count < ma:
+                    end = item(string, index)
+                    if end < 0:
+                        break
+                    index = skip(string, end)
+                    count += step
+                return index if count >= mi else -1
+
+        elif kind == 'sepby':
+            _, item, separator, mi, ma, ignore = node
+            item = self.compile(item)
+            separator = self.compile(separator)
+            skip = self.skip(ignore) or (lambda string, index: index)
+
+            def recognize(string, index):
+                index = skip(string, index)
+                count = 0
+                while count < ma:
+                    end = item(string, index)
+                    if end < 0:
+                        break
+                    count += 1
+                    index = skip(string, end)
+                    end = separator(string, index)
+                    if end < 0:
+                        break
+                    index = skip(string, end)
+                return index if count >= mi else -1
+
+        elif kind == 'leftassoc':
+            _, start, operation, mi, ma, ignore = node
+            if not _counted(operation):
+                return _fallback(parser)
+            start = self.compile(start)
+            operation = self.compile(operation)
+            skip = self.skip(ignore) or (lambda string, index: index)
+
+            def recognize(string, index):
+                index = start(string, skip(string, index))
+                if index < 0:
+                    return -1
+                count = 0
+                while count < ma:
+                    end = operation(string, skip(string, index))
+                    if end < 0:
+                        break
+                    index = end
+                    count += 1
+                return skip(string, index) if count >= mi else -1
+
+        elif kind in ('map', 'tag', 'discard', 'deepjoin', 'error_message'):
+            return self.compile(node[1])
+
+        elif kind == 'lookahead':
+            first = self.compile(node[1])
+            second = _bounded(self.compile(node[2]))
+
+            def recognize(string, index):
+                end = first(string, index)
+                if end < 0 or second(string, end) < 0:
+                    return -1
+                return end
+
+        elif kind in ('followed_by', 'not_followed_by'):
+            inner = _bounded(self.compile(node[1]))
+            positive = kind == 'followed_by'
+
+            def recognize(string, index):
+                return index if (inner(string, index) >= 0) == positive else -1
+
+        elif kind == 'ref':
+            _, parsers, k = node
+            if k not in parsers:
+                raise ValueError(f'parser r.{k} promissed but never assigned.')
+            return self.compile(parsers[k])
+
+        elif kind == 'eof':
+            def recognize(string, index):
+                return index if index >= len(string) else -1
+
+        elif kind == 'fail':
+            def recognize(string, index):
+                return -1
+
+        elif kind in ('success', 'copy_last', 'cut'):
+            def recognize(string, index):
+                return index
+
+        else:
+            return _fallback(parser)
+
+        return recognize
+
+    def sequence(self, recognizers, skip):
+        if skip is None:
+            def recognize(string, index):
+                for part in recognizers:
+                    index = part(string, index)
+                    if index < 0:
+                        return -1
+                return index
+        else:
+            def recognize(string, index):
+                index = skip(string, index)
+                for part in recognizers:
+                    index = part(string, index)
+                    if index < 0:
+                        return -1
+                    index = skip(string, index)
+                return index
+
+        return recognize
@@ -0,0 +1,215 @@
+import json
+import sys
+from bisect import bisect_left
+from threading import Lock
+from time import perf_counter
+from types import CodeType
+from . cache import cached
+from . errors import ParserError
+
+# upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2,
+                   2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+# memo lookups dont scan the input, the probe must not count their results
+_memo_codes = {c for c in cached.__code__.co_consts if isinstance(c, CodeType)}
+
+
+class _Probe:
+    '''
+    sys.setprofile() function used on sampled parses. follows the parser functions
+    (anything called as func(data, string)) to find the deepest nesting and the
+    characters matched by leaf calls, the ones that didnt call another parser.
+    '''
+    def __init__(self):
+        self.stack = []
+        self.max_depth = 0
+        self.scanned = 0
+
+    def __call__(self, frame, event, arg):
+        if event == 'call':
+            code = frame.f_code
+            if code.co_argcount == 2 and code.co_varnames[:2] == ('data', 'string'):
+                stack = self.stack
+                if stack:
+                    stack[-1][1] = True
+                stack.append([frame.f_locals['data'][2], False, frame])
+                if len(stack) > self.max_depth:
+                    self.max_depth = len(stack)
+
+        elif event == 'return':
+            stack = self.stack
+            if stack and stack[-1][2] is frame:
+                start, has_children, _ = stack.pop()
+                # arg is None when the call raised
+                if not has_children and isinstance(arg, tuple) and frame.f_code not in _memo_codes:
+                    self.scanned += max(0, arg[2] - start)
+
+
+class ParseStats:
+    '''
+    counters about every parse(string, stats=this), safe to share between threads.
+    latency, consumed characters, failures and memo hits are counted on every parse.
+    one parse out of sample_every (none if 0) also runs under a profiler that measures
+    the maximum nesting of parser calls and the characters scanned more than once
+    (matched by a leaf parser, but not part of the final result), that parse is a lot
+    slower, so keep sample_every high.
+    stats from other threads or processes are combined with merge(), from_dict() reads
+    what to_dict() wrote.
+    '''
+    def __init__(self, sample_every=1000):
+        self.sample_every = sample_every
+        self.parses = 0
+        self.failures = 0
+        self.chars = 0
+        self.latency_counts = [0] * len(LATENCY_BUCKETS)
+        self.latency_sum = 0.0
+        self.memo_hits = 0
+        self.memo_misses = 0
+        self.sampled = 0
+        self.sampled_chars = 0
+        self.backtrack_chars = 0
+        self.max_depth = 0
+        self._lock = Lock()
+
+    def observe(self, run, context, index):
+        '''
+        calls run(), which performs the parse of context, and records it
+        '''
+        with self._lock:
+            self.parses += 1
+            sample = self.sample_every and self.parses % self.sample_every == 0
+
+        probe = None
+        if sample and sys.getprofile() is None:
+            probe = _Probe()
+            sys.setprofile(probe)
+
+        failed = False
+        start = perf_counter()
+        try:
+            return run()
+        except ParserError:
+            failed = True
+            raise
+        finally:
+            elapsed = perf_counter() - start
+            if probe is not None:
+                sys.setprofile(None)
+
+            end = context.end if context.end is not None else index
+            self._record(elapsed, failed, end - index, context, probe)
+
+    def _record(self, elapsed, failed, consumed, context, probe):
+        with self._lock:
+            self.latency_counts[bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+            self.latency_sum += elapsed
+            self.memo_hits += context.memo_hits
+            self.memo_misses += context.memo_misses
+            if failed:
+                self.failures += 1
+            else:
+                self.chars += consumed
+
+            if probe is not None:
+                self.sampled += 1
+                self.max_depth = max(self.max_depth, probe.max_depth)
+                if not failed:
+                    self.sampled_chars += consumed
+                self.backtrack_chars += max(0, probe.scanned - (0 if failed else consumed))
+
+    def merge(self, other):
+        '''
+        adds the counters of other (a ParseStats or a dict from to_dict()) to these
+        '''
+        if isinstance(other, dict):
+            other = ParseStats.from_dict(other)
+
+        with self._lock:
+            self.parses += other.parses
+            self.failures += other.failures
+            self.chars += other.chars
+            self.latency_counts = [a + b for a, b in zip(self.latency_counts, other.latency_counts)]
+            self.latency_sum += other.latency_sum
+            self.memo_hits += other.memo_hits
+            self.memo_misses += other.memo_misses
+            self.sampled += other.sampled
+            self.sampled_chars += other.sampled_chars
+            self.backtrack_chars += other.backtrack_chars
+            self.max_depth = max(self.max_depth, other.max_depth)
+        return self
+
+    def to_dict(self):
+        with self._lock:
+            lookups = self.memo_hits + self.memo_misses
+            scanned = self.sampled_chars + self.backtrack_chars
+            return {
+                'parses': self.parses,
+                'failures': self.failures,
+                'chars': self.chars,
+                'latency': {
+                    'buckets': [bound if bound != float('inf') else '+Inf' for bound in LATENCY_BUCKETS],
+                    'counts': self.latency_counts[:],
+                    'sum': self.latency_sum,
+                },
+                'memo_hits': self.memo_hits,
+                'memo_misses': self.memo_misses,
+                'memo_hit_ratio': self.memo_hits / lookups if lookups else 0.0,
+                'sampled': self.sampled,
+                'sampled_chars': self.sampled_chars,
+                'backtrack_chars': self.backtrack_chars,
+                'backtrack_ratio': self.backtrack_chars / scanned if scanned else 0.0,
+                'max_depth': self.max_depth,
+            }
+
+    @classmethod
+    def from_dict(cls, d):
+        stats = cls()
+        for name in ('parses', 'failures', 'chars', 'memo_hits', 'memo_misses',
+                     'sampled', 'sampled_chars', 'backtrack_chars', 'max_depth'):
+            setattr(stats, name, d[name])
+        stats.latency_counts = list(d['latency']['counts'])
+        stats.latency_sum = d['latency']['sum']
+        return stats
+
+    def to_json(self):
+        return json.dumps(self.to_dict())
+
+    def to_prometheus(self, prefix='yapcl', labels=None):
+        '''
+        the counters in the prometheus text exposition format
+        '''
+        d = self.to_dict()
+        label_text = ','.join(f'{k}="{v}"' for k, v in (labels or {}).items())
+
+        def sample(name, value, extra=''):
+            text = ','.join(x for x in (label_text, extra) if x)
+            return f'{prefix}_{name}{{{text}}} {value}' if text else f'{prefix}_{name} {value}'
+
+        lines = []
+        for name, kind, help_text in (
+                ('parses_total', 'counter', 'parses started'),
+                ('failures_total', 'counter', 'parses that raised ParserError'),
+                ('chars_total', 'counter', 'characters consumed by successful parses'),
+                ('memo_hits_total', 'counter', 'memo lookups that found an entry'),
+                ('memo_misses_total', 'counter', 'memo lookups that didnt find an entry'),
+                ('sampled_total', 'counter', 'parses run under the profiler'),
+                ('backtrack_chars_total', 'counter', 'characters scanned more than once in sampled parses'),
+                ('max_depth', 'gauge', 'deepest nesting of parser calls in sampled parses')):
+            lines.append(f'# HELP {prefix}_{name} {help_text}')
+            lines.append(f'# TYPE {prefix}_{name} {kind}')
+            lines.append(sample(name, d[name.replace('_total', '') if name.endswith('_total') else name]))
+
+        lines.append(f'# HELP {prefix}_parse_seconds parse latency')
+        lines.append(f'# TYPE {prefix}_parse_seconds histogram')
+        total = 0
+        for bound, count in zip(d['latency']['buckets'], d['latency']['counts']):
+            total += count
+            lines.append(sample('parse_seconds_bucket', total, f'le="{bound}"'))
+        lines.append(sample('parse_seconds_sum', d['latency']['sum']))
+        lines.append(sample('parse_seconds_count', total))
+
+        return '\n'.join(lines) + '\n'
+
+    def __repr__(self):
+        return f'ParseStats({self.parses} parses, {self.failures} failures)'
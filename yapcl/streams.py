@@ -0,0 +1,152 @@
+import asyncio
+import codecs
+from copy import copy
+from . errors import ParserError, RecoveredError
+
+
+def _decoder(encoding):
+    if encoding is None:
+        return None
+    return codecs.getincrementaldecoder(encoding)(errors='strict')
+
+
+def _decode(decoder, chunk, final=False):
+    if decoder is None or isinstance(chunk, str):
+        return chunk
+    return decoder.decode(chunk, final)
+
+
+async def parse_async(parser, reader, chunk_size=65536, encoding='utf-8', executor=None):
+    '''
+    reads reader (anything with an async read(n), like asyncio.StreamReader) until eof
+    without blocking the event loop, then parses the whole text.
+    combinators cant be suspended midway, so the parse runs in executor (the default
+    executor of the loop if None) while the loop goes on. parses dont share any state,
+    one grammar can run in many of them at once.
+    '''
+    decoder = _decoder(encoding)
+    chunks = []
+    while True:
+        chunk = await reader.read(chunk_size)
+        if not chunk:
+            break
+        chunks.append(_decode(decoder, chunk))
+
+    if decoder is not None:
+        chunks.append(decoder.decode(b'', True))
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, parser.parse, ''.join(chunks))
+
+
+def _shifted(item, delta):
+    '''
+    copy of the parse data item with every index moved by delta. like collect_errors(),
+    it takes tuples of 3 ending in an int for data
+    '''
+    if isinstance(item, list):
+        return [_shifted(child, delta) for child in item]
+
+    if isinstance(item, tuple) and len(item) == 3 and type(item[2]) is int:
+        return (_shifted(item[0], delta), item[1], item[2] + delta)
+
+    if isinstance(item, RecoveredError):
+        item = copy(item)
+        item.index += delta
+        item.start += delta
+        item.end += delta
+
+    return item
+
+
+def _parse_items(parser, buffer, offset, at_eof, chunk_size, count):
+    '''
+    parses up to count items of buffer from offset, see iter_parse_async().
+    returns (items, offset, need_more)
+    '''
+    items = []
+    while len(items) < count and offset < len(buffer):
+        try:
+            data = parser.parse(buffer, offset)
+
+        except ParserError as e:
+            # more input could only help a failure that a terminal cut by the end of the
+            # buffer may have caused
+            if at_eof or e.index + chunk_size <= len(buffer):
+                if items:
+                    # the items before it still get yielded, the error comes on the next run
+                    return items, offset, False
+                raise
+            return items, offset, True
+
+        if data[2] >= len(buffer) and not at_eof:
+            return items, offset, True
+
+        if data[2] <= offset:
+            if items:
+                return items, offset, False
+            raise ParserError(parser, offset)
+
+        offset = data[2]
+        items.append(data)
+
+    return items, offset, not at_eof and offset >= len(buffer)
+
+
+async def iter_parse_async(parser, reader, chunk_size=65536, encoding='utf-8', yield_every=64,
+                           executor=None):
+    '''
+    repeatedly parses parser over the text read from reader and yields each result as soon
+    as it is known to be complete, that is, when it ends before the buffered text does.
+    when an item reaches the end of the buffer or fails near it, more input is read and the
+    item is parsed again, so the parser should not need to look further than the next item.
+    an item that fails chunk_size characters or more before the end of the buffer raises
+    right away, a malformed record doesnt make the rest of the stream get buffered. an
+    either() fails where it started, so items should be shorter than chunk_size.
+
+    the items are parsed in executor (the default executor of the loop if None), up to
+    yield_every of them per call so that a run of small items doesnt pay a thread switch
+    each. indexes in the yielded trees are positions in the decoded stream, the internal
+    buffer drops already parsed text every time more input is read.
+    '''
+    loop = asyncio.get_running_loop()
+    decoder = _decoder(encoding)
+    buffer = ''
+    # position of buffer[0] in the stream
+    base = 0
+    offset = 0
+    at_eof = False
+    need_more = True
+
+    while True:
+        if need_more and not at_eof:
+            buffer = buffer[offset:]
+            base += offset
+            offset = 0
+            wanted = max(chunk_size, len(buffer))
+            read = []
+            while wanted > 0:
+                chunk = await reader.read(chunk_size)
+                if not chunk:
+                    at_eof = True
+                    if decoder is not None:
+                        read.append(decoder.decode(b'', True))
+                    break
+                text = _decode(decoder, chunk)
+                read.append(text)
+                wanted -= len(text)
+
+            buffer += ''.join(read)
+
+        if offset >= len(buffer) and at_eof:
+            return
+
+        try:
+            items, offset, need_more = await loop.run_in_executor(
+                executor, _parse_items, parser, buffer, offset, at_eof, chunk_size, yield_every)
+        except ParserError as e:
+            e.index += base
+            raise
+
+        for data in items:
+            yield _shifted(data, base) if base else data
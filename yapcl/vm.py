@@ -0,0 +1,638 @@
+'''
+alternative execution backend: a grammar is lowered to a flat list of instructions, in
+the style of LPeg's parsing machine, and run by a single loop with explicit call and
+backtrack stacks. there's no python recursion, so nesting depth is only limited by memory.
+
+results and errors are the same as the ones produced by the combinators. parsers with no
+node description (custom @Parser functions, token()) are called as python functions.
+'''
+from . combinators import Discarded, _join, _resync, _char_class, _lookahead_check, eof
+from . context import ParseContext
+from . errors import ParserError, CutError, RecoveredError
+
+(
+    HALT, LIT, RE, EOF, FAIL, SUCCESS, CALLPY, CALL, RET, JMP,
+    CHOICE, ECHOICE, EITHER, COMMIT, POP, CUT, ERRMSG, RECOVER, RESYNC,
+    IGNRE, IGNLIT, IGNPY, NEWLIST, APPEND, APPENDALL, LOOPCHECK,
+    ENDSEQ, ENDMANY, ENDSEPBY, PUSHD, POPD, PUSHCOUNT, LCOMBINE, LEND,
+    CONCATADD, ENDCONCAT, TAG, MAP, DISCARD, DEEPJOIN,
+) = range(40)
+
+OPNAMES = (
+    'HALT', 'LIT', 'RE', 'EOF', 'FAIL', 'SUCCESS', 'CALLPY', 'CALL', 'RET', 'JMP',
+    'CHOICE', 'ECHOICE', 'EITHER', 'COMMIT', 'POP', 'CUT', 'ERRMSG', 'RECOVER', 'RESYNC',
+    'IGNRE', 'IGNLIT', 'IGNPY', 'NEWLIST', 'APPEND', 'APPENDALL', 'LOOPCHECK',
+    'ENDSEQ', 'ENDMANY', 'ENDSEPBY', 'PUSHD', 'POPD', 'PUSHCOUNT', 'LCOMBINE', 'LEND',
+    'CONCATADD', 'ENDCONCAT', 'TAG', 'MAP', 'DISCARD', 'DEEPJOIN',
+)
+
+# kinds of backtrack stack entries
+K_CHOICE, K_ECHOICE, K_EITHER, K_BARRIER, K_ERRMSG, K_RECOVER = range(6)
+
+_terminals = ('lit', 'regex', 'eof', 'fail', 'success', 'copy_last', 'cut')
+
+# terminals that scan without regex, their own function is already the fastest way to run them
+_native_terminals = ('char_in', 'char_range', 'take_while', 'take_until')
+
+
+class Compiler:
+    '''
+    lowers a grammar to instructions. every non terminal parser becomes a subroutine,
+    compiled once, terminals are emitted inline.
+    '''
+    def __init__(self):
+        self.code = []
+        self.labels = {}
+        self.fixups = []
+        self.pending = []
+
+    def emit(self, op, a=None, b=None):
+        self.code.append([op, a, b])
+        return len(self.code) - 1
+
+    def here(self):
+        return len(self.code)
+
+    def patch(self, pc, target=None):
+        self.code[pc][1] = self.here() if target is None else target
+
+    def compile(self, parser):
+        self.emit_parser(parser)
+        self.emit(HALT)
+        while self.pending:
+            parser = self.pending.pop()
+            self.labels[id(parser)] = self.here()
+            self.emit_body(parser)
+            self.emit(RET)
+
+        for pc, key in self.fixups:
+            self.code[pc][1] = self.labels[key]
+
+        return Program([tuple(instruction) for instruction in self.code])
+
+    def resolve(self, parser):
+        seen = set()
+        while parser.node is not None and parser.node[0] == 'ref':
+            _, parsers, k = parser.node
+            if k not in parsers or id(parser) in seen:
+                break
+            seen.add(id(parser))
+            parser = parsers[k]
+        return parser
+
+    def emit_parser(self, parser):
+        parser = self.resolve(parser)
+        node = parser.node
+
+        if node is None or node[0] in ('token', 'ref') or node[0] in _native_terminals:
+            self.emit(CALLPY, parser.func)
+            return
+
+        kind = node[0]
+        if kind in _terminals:
+            self.emit_terminal(parser, kind, node)
+            return
+
+        key = id(parser)
+        if key not in self.labels:
+            self.labels[key] = None
+            self.pending.append(parser)
+        self.fixups.append((self.emit(CALL), key))
+
+    def emit_terminal(self, parser, kind, node):
+        if kind == 'lit':
+            self.emit(LIT, node[1], parser)
+        elif kind == 'regex':
+            self.emit(RE, node[1], parser)
+        elif kind == 'eof':
+            self.emit(EOF, parser)
+        elif kind == 'fail':
+            self.emit(FAIL, node[1])
+        elif kind == 'success':
+            self.emit(SUCCESS, node[1], node[2])
+        elif kind == 'cut':
+            self.emit(SUCCESS, Discarded, None)
+
+    def emit_ignore(self, ignore):
+        if ignore is None:
+            return
+        ignore = self.resolve(ignore)
+        node = ignore.node
+        if node is not None and node[0] == 'regex':
+            self.emit(IGNRE, node[1])
+        elif node is not None and node[0] == 'lit':
+            self.emit(IGNLIT, node[1])
+        else:
+            self.emit(IGNPY, ignore.func)
+
+    def emit_body(self, parser):
+        node = parser.node
+        kind = node[0]
+
+        if kind == 'either':
+            alternatives = node[1]
+            if not alternatives:
+                self.emit(FAIL, [])
+                return
+
+            self.emit(EITHER)
+            commits = []
+            for alternative in alternatives[:-1]:
+                choice = self.emit(ECHOICE)
+                self.emit_parser(alternative)
+                commits.append(self.emit(COMMIT))
+                self.patch(choice)
+
+            self.emit_parser(alternatives[-1])
+            for pc in commits:
+                self.patch(pc)
+            self.emit(POP)
+
+        elif kind == 'seq':
+            _, parsers, ignore, capture, auto_capture = node
+            self.emit(NEWLIST)
+            self.emit_ignore(ignore)
+            has_cut = False
+            for p in parsers:
+                if p.node is not None and p.node[0] == 'cut' and not has_cut:
+                    has_cut = True
+                    self.emit(CUT)
+                else:
+                    self.emit_parser(p)
+                self.emit(APPEND)
+                self.emit_ignore(ignore)
+
+            if has_cut:
+                self.emit(POP)
+            self.emit(ENDSEQ, capture, auto_capture)
+
+        elif kind == 'many' and node[5] is None and _char_class(node[1]) is not None:
+            # many over a character class collapses into a single scan
+            self.emit(CALLPY, parser.func)
+
+        elif kind == 'many':
+            _, p, mi, ma, capture, ignore = node
+            self.emit(NEWLIST)
+            self.emit_ignore(ignore)
+            loop = self.here()
+            check = self.emit(LOOPCHECK, None, ma) if ma != float('inf') else None
+            choice = self.emit(CHOICE)
+            self.emit_parser(p)
+            self.emit(COMMIT, self.here() + 1)
+            self.emit(APPEND)
+            self.emit_ignore(ignore)
+            self.emit(JMP, loop)
+            self.patch(choice)
+            if check is not None:
+                self.patch(check)
+            self.emit(ENDMANY, mi, capture)
+
+        elif kind == 'sepby':
+            _, p, separator, mi, ma, ignore = node
+            self.emit(NEWLIST)
+            self.emit_ignore(ignore)
+            loop = self.here()
+            check = self.emit(LOOPCHECK, None, ma) if ma != float('inf') else None
+            choice1 = self.emit(CHOICE)
+            self.emit_parser(p)
+            self.emit(COMMIT, self.here() + 1)
+            self.emit(APPENDALL)
+            self.emit_ignore(ignore)
+            choice2 = self.emit(CHOICE)
+            self.emit_parser(separator)
+            self.emit_ignore(ignore)
+            self.emit(COMMIT, loop)
+            self.patch(choice1)
+            self.patch(choice2)
+            if check is not None:
+                self.patch(check)
+            self.emit(ENDSEPBY, mi)
+
+        elif kind == 'leftassoc':
+            _, start, p, mi, ma, ignore = node
+            self.emit_ignore(ignore)
+            self.emit_parser(start)
+            self.emit(PUSHCOUNT)
+            loop = self.here()
+            check = self.emit(LOOPCHECK, None, ma) if ma != float('inf') else None
+            self.emit_ignore(ignore)
+            choice = self.emit(CHOICE)
+            self.emit(PUSHD)
+            self.emit_parser(p)
+            self.emit(COMMIT, self.here() + 1)
+            self.emit(LCOMBINE)
+            self.emit(JMP, loop)
+            self.patch(choice)
+            if check is not None:
+                self.patch(check)
+            self.emit_ignore(ignore)
+            self.emit(LEND, mi)
+
+        elif kind == 'concat':
+            _, parsers, sequences = node
+            self.emit(NEWLIST)
+            for p, is_seq in zip(parsers, sequences):
+                self.emit_parser(p)
+                self.emit(CONCATADD, is_seq)
+            self.emit(ENDCONCAT)
+
+        elif kind == 'map':
+            self.emit_parser(node[1])
+            self.emit(MAP, node[2])
+
+        elif kind == 'tag':
+            self.emit_parser(node[1])
+            self.emit(TAG, node[2])
+
+        elif kind == 'discard':
+            self.emit_parser(node[1])
+            self.emit(DISCARD)
+
+        elif kind == 'deepjoin':
+            self.emit_parser(node[1])
+            self.emit(DEEPJOIN)
+
+        elif kind == 'lookahead':
+            # the check is a boundary for cuts, it runs as one call
+            self.emit_parser(node[1])
+            self.emit(CALLPY, _lookahead_check(self.resolve(node[2])))
+
+        elif kind == 'error_message':
+            self.emit(ERRMSG, node[2])
+            self.emit_parser(node[1])
+            self.emit(POP)
+
+        elif kind == 'recover':
+            _, p, sync, tag, consume_sync = node
+            sync = self.resolve(sync)
+            sync_text = sync.node[1] if sync.node is not None and sync.node[0] == 'lit' else None
+            recover = self.emit(RECOVER)
+            self.emit_parser(p)
+            self.emit(POP)
+            jump = self.emit(JMP)
+            self.patch(recover)
+            self.emit(RESYNC, (sync_text, sync.func, consume_sync), tag)
+            self.patch(jump)
+
+        else:
+            self.emit(CALLPY, parser.func)
+
+
+class Program:
+    def __init__(self, code):
+        self.code = code
+
+    def __len__(self):
+        return len(self.code)
+
+    def dump(self):
+        '''
+        human readable listing of the instructions
+        '''
+        lines = []
+        for pc, (op, a, b) in enumerate(self.code):
+            args = ', '.join(repr(x) for x in (a, b) if x is not None)
+            lines.append(f'{pc:5} {OPNAMES[op]} {args}')
+        return '\n'.join(lines)
+
+    def parse(self, string, index=0):
+        context = ParseContext(string)
+        with context.active():
+            try:
+                return self.run(string, index)
+            except ParserError as e:
+                context.locate(e)
+                raise
+
+    def run(self, string, index=0):
+        code = self.code
+        strlen = len(string)
+        D = (None, None, index)
+        pc = 0
+        vals = []
+        calls = []
+        bt = []
+        fatal = False
+        err_expected = None
+        err_index = index
+        err_message = None
+
+        while True:
+            op, a, b = code[pc]
+
+            if op == CALL:
+                calls.append(pc + 1)
+                pc = a
+                continue
+
+            elif op == RET:
+                pc = calls.pop()
+                continue
+
+            elif op == LIT:
+                i = D[2]
+                if string.startswith(a, i):
+                    D = (a, None, i + len(a))
+                    pc += 1
+                    continue
+                err_expected, err_index, err_message = b, i, None
+
+            elif op == RE:
+                i = D[2]
+                match = a.match(string, i)
+                if match:
+                    result = match[0]
+                    D = (result, None, i + len(result))
+                    pc += 1
+                    continue
+                err_expected, err_index, err_message = b, i, None
+
+            elif op == IGNRE:
+                match = a.match(string, D[2])
+                if match:
+                    D = (D[0], D[1], match.end())
+                pc += 1
+                continue
+
+            elif op == APPEND:
+                if D[0] is not Discarded:
+                    vals[-1].append(D)
+                pc += 1
+                continue
+
+            elif op == TAG:
+                if D[1] is None:
+                    D = (D[0], a, D[2])
+                else:
+                    D = (D, a, D[2])
+                pc += 1
+                continue
+
+            elif op == DISCARD:
+                D = (Discarded, D[1], D[2])
+                pc += 1
+                continue
+
+            elif op == EITHER:
+                bt.append((K_EITHER, None, D, len(vals), len(calls), []))
+                pc += 1
+                continue
+
+            elif op == ECHOICE:
+                bt.append((K_ECHOICE, a, D, len(vals), len(calls), None))
+                pc += 1
+                continue
+
+            elif op == CHOICE:
+                bt.append((K_CHOICE, a, D, len(vals), len(calls), None))
+                pc += 1
+                continue
+
+            elif op == COMMIT:
+                bt.pop()
+                pc = a
+                continue
+
+            elif op == POP:
+                bt.pop()
+                pc += 1
+                continue
+
+            elif op == JMP:
+                pc = a
+                continue
+
+            elif op == NEWLIST:
+                vals.append([])
+                pc += 1
+                continue
+
+            elif op == ENDSEQ:
+                result = vals.pop()
+                if b and len(result) == 1:
+                    D = (result[0][0], result[0][1], D[2])
+                elif a is not None:
+                    result = result[a]
+                    D = (result[0], result[1], D[2])
+                else:
+                    D = (result, None, D[2])
+                pc += 1
+                continue
+
+            elif op == PUSHD:
+                vals.append(D)
+                pc += 1
+                continue
+
+            elif op == LCOMBINE:
+                prev = vals.pop()
+                if D[0] is Discarded:
+                    D = prev
+                else:
+                    D = ([prev, D[0]], D[1], D[2])
+                    vals[-1] += 1
+                pc += 1
+                continue
+
+            elif op == LOOPCHECK:
+                top = vals[-1]
+                if (top if type(top) is int else len(top)) >= b:
+                    pc = a
+                else:
+                    pc += 1
+                continue
+
+            elif op == ENDMANY:
+                result = vals[-1]
+                if len(result) >= a:
+                    vals.pop()
+                    if b is not None:
+                        result = result[b]
+                        D = (result[0], result[1], D[2])
+                    else:
+                        D = (result, None, D[2])
+                    pc += 1
+                    continue
+                # the error of the last iteration is raised again
+
+            elif op == ENDSEPBY:
+                result = vals[-1]
+                if len(result) >= a:
+                    vals.pop()
+                    D = (result, None, D[2])
+                    pc += 1
+                    continue
+
+            elif op == APPENDALL:
+                vals[-1].append(D)
+                pc += 1
+                continue
+
+            elif op == PUSHCOUNT:
+                vals.append(0)
+                pc += 1
+                continue
+
+            elif op == LEND:
+                if vals[-1] >= a:
+                    vals.pop()
+                    pc += 1
+                    continue
+
+            elif op == POPD:
+                D = vals.pop()
+                pc += 1
+                continue
+
+            elif op == IGNLIT:
+                if string.startswith(a, D[2]):
+                    D = (D[0], D[1], D[2] + len(a))
+                pc += 1
+                continue
+
+            elif op == IGNPY:
+                try:
+                    D = (D[0], D[1], a(D, string)[2])
+                except CutError:
+                    fatal = True
+                    raise
+                except ParserError:
+                    pass
+                pc += 1
+                continue
+
+            elif op == MAP:
+                D = (a(D[0]), D[1], D[2])
+                pc += 1
+                continue
+
+            elif op == DEEPJOIN:
+                D = (_join(D[0]), D[1], D[2])
+                pc += 1
+                continue
+
+            elif op == CONCATADD:
+                if D[0] is not Discarded:
+                    if a:
+                        vals[-1].extend(D[0])
+                    else:
+                        vals[-1].append(D)
+                pc += 1
+                continue
+
+            elif op == ENDCONCAT:
+                D = (vals.pop(), None, D[2])
+                pc += 1
+                continue
+
+            elif op == SUCCESS:
+                D = (a, b, D[2])
+                pc += 1
+                continue
+
+            elif op == EOF:
+                if D[2] >= strlen:
+                    D = (eof, None, D[2])
+                    pc += 1
+                    continue
+                err_expected, err_index, err_message = a, D[2], None
+
+            elif op == FAIL:
+                err_expected, err_index, err_message = a, D[2], None
+
+            elif op == CALLPY:
+                try:
+                    D = a(D, string)
+                    pc += 1
+                    continue
+                except CutError as e:
+                    err_expected, err_index, err_message = e.expected, e.index, e.message
+                    fatal = True
+                except ParserError as e:
+                    err_expected, err_index, err_message = e.expected, e.index, e.message
+
+            elif op == CUT:
+                context = ParseContext.current()
+                if context is not None:
+                    for cache in context.caches.values():
+                        cache.prune(D[2])
+                bt.append((K_BARRIER, None, D, len(vals), len(calls), None))
+                D = (Discarded, None, D[2])
+                pc += 1
+                continue
+
+            elif op == ERRMSG:
+                bt.append((K_ERRMSG, None, D, len(vals), len(calls), a))
+                pc += 1
+                continue
+
+            elif op == RECOVER:
+                bt.append((K_RECOVER, a, D, len(vals), len(calls), None))
+                pc += 1
+                continue
+
+            elif op == RESYNC:
+                start = D[2]
+                sync_text, sync_func, consume_sync = a
+                end = _resync(string, max(start, err_index), sync_text, sync_func, consume_sync)
+                if end > start or (not consume_sync and end < strlen):
+                    error = ParserError(err_expected, err_index)
+                    error.message = err_message
+                    D = (RecoveredError(error, start, end), b, end)
+                    fatal = False
+                    pc += 1
+                    continue
+
+            elif op == HALT:
+                return D
+
+            else:
+                raise ValueError(f'invalid opcode {op}')
+
+            # the instruction failed, unwind the backtrack stack
+            while True:
+                if not bt:
+                    error = (CutError if fatal else ParserError)(err_expected, err_index)
+                    error.message = err_message
+                    raise error
+
+                kind, resume_pc, resume_D, vals_len, calls_len, extra = bt.pop()
+
+                if kind == K_CHOICE or kind == K_ECHOICE:
+                    if fatal:
+                        continue
+                    if kind == K_ECHOICE:
+                        bt[-1][5].append(err_expected)
+
+                elif kind == K_EITHER:
+                    if not fatal:
+                        err_expected = extra + [err_expected]
+                        err_index = resume_D[2]
+                        err_message = None
+                    continue
+
+                elif kind == K_BARRIER:
+                    fatal = True
+                    continue
+
+                elif kind == K_ERRMSG:
+                    err_message = extra
+                    continue
+
+                elif kind == K_RECOVER:
+                    # fatal stays as it is, RESYNC clears it once the input is skipped.
+                    # when it cant skip anything the error keeps its type
+                    pass
+
+                pc = resume_pc
+                D = resume_D
+                del vals[vals_len:]
+                del calls[calls_len:]
+                break
+
+
+def compile_grammar(parser):
+    '''
+    lowers parser to a Program, see Parser.parse_vm()
+    '''
+    return Compiler().compile(parser)